@@ -0,0 +1,150 @@
+import os
+import re
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from engine import OCREngine
+from image_buffer import ImageBuffer, load_buffers
+from utils import *
+import cv2
+
+
+# Fields a certificate must yield before the cheap tier's answer is accepted
+REQUIRED_FIELDS = ('family name', 'first name', 'candidate id', 'date of birth', 'band')
+
+
+def looks_valid(field: str, value: str) -> bool:
+    """Cheap plausibility check used as a low-confidence signal for a field value."""
+    value = str(value).strip()
+    if not value:
+        return False
+    if field == 'band':
+        try:
+            band = float(value)
+        except ValueError:
+            return False
+        return 0 <= band <= 9
+    if field in ('date', 'date of birth', 'date end'):
+        return bool(re.search(r'\d', value))
+    if field == 'candidate id':
+        return bool(re.search(r'\d', value))
+    return True
+
+
+class Cascade:
+    """Confidence-driven model cascade over `OCREngine` tiers.
+
+    Every image goes through `tiers[0]`; only images whose extraction misses a
+    required field, reads it below `min_confidence` (per the tier's
+    `last_confidences`) or fails `accept` are sent to the next, more expensive
+    tier. Fields found by an earlier tier are kept when a later one misses them.
+    `tier_counts[i]` counts images run on tier i, `tier_resolved[i]` counts
+    images whose final answer came from tier i.
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[OCREngine],
+        required_fields: Sequence[str] = REQUIRED_FIELDS,
+        min_confidence: float = 0.5,
+        accept: Optional[Callable[[str, Dict[str, str], Dict[str, float]], bool]] = None,
+    ) -> None:
+        if not tiers:
+            raise ValueError("Cascade needs at least one tier")
+        self.tiers = list(tiers)
+        self.required_fields = tuple(required_fields)
+        self.min_confidence = min_confidence
+        self.accept = accept or self.is_confident
+        self.tier_counts = [0] * len(self.tiers)
+        self.tier_resolved = [0] * len(self.tiers)
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def default(cls, runtime_profile: Optional[str] = None, **kwargs) -> "Cascade":
+        """Fast PaddleOCR mobile recognizer first, PaddleOCR det + EasyOCR beamsearch second."""
+        from Paddle import Paddle
+        from PaddleEasy import PaddleEasy
+        return cls([
+            Paddle(text_recognition_model_name="PP-OCRv5_mobile_rec", runtime_profile=runtime_profile),
+            PaddleEasy(decoder="beamsearch", runtime_profile=runtime_profile),
+        ], **kwargs)
+
+    def is_confident(self, img_path: str, extracted: Dict[str, str], confidences: Dict[str, float]) -> bool:
+        return all(
+            looks_valid(f, extracted.get(f, "")) and confidences.get(f, 1.0) >= self.min_confidence
+            for f in self.required_fields
+        )
+
+    @property
+    def decode_max_side(self) -> Optional[int]:
+        """Largest size any tier needs (None if a tier wants full-resolution decodes)."""
+        sides = [getattr(t, "decode_max_side", None) for t in self.tiers]
+        return None if any(s is None for s in sides) else max(sides)
+
+    def tier_usage(self) -> List[float]:
+        """Fraction of all images that needed each tier."""
+        total = self.tier_counts[0]
+        return [n / total if total else 0.0 for n in self.tier_counts]
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        # decode once for every tier; shared, so tiers annotate copies and later tiers see clean pixels
+        all_bufs = load_buffers(image_paths, buffers, max_side=self.decode_max_side)
+        for buf in all_bufs:
+            if buf is not None:
+                buf.shared = True
+        buf_by_path = dict(zip(image_paths, all_bufs))
+        annotated: Dict[str, Optional[np.ndarray]] = {}
+        merged: Dict[str, Dict[str, str]] = {p: {} for p in image_paths}
+        merged_conf: Dict[str, Dict[str, float]] = {p: {} for p in image_paths}
+        resolved_by: Dict[str, int] = {}
+        pending = list(image_paths)
+
+        for tier_idx, tier in enumerate(self.tiers):
+            if not pending:
+                break
+            self.tier_counts[tier_idx] += len(pending)
+            images_annotated, extracted = tier.predict_multi_and_extract(
+                pending, buffers=[buf_by_path[p] for p in pending])
+            tier_conf = getattr(tier, "last_confidences", {})
+
+            still_pending = []
+            for img_path, img in zip(pending, images_annotated):
+                fields = parse_extracted(extracted.get(img_path, ""))
+                conf = tier_conf.get(img_path, {})
+                # a later tier replaces a field only with a plausible reading that is
+                # more confident, or that fixes an implausible earlier one
+                for k, v in fields.items():
+                    c = conf.get(k, 1.0)
+                    if k not in merged[img_path] or (looks_valid(k, v) and (
+                            not looks_valid(k, merged[img_path][k]) or c >= merged_conf[img_path].get(k, 0.0))):
+                        merged[img_path][k] = v
+                        merged_conf[img_path][k] = c
+                if img is not None or img_path not in annotated:
+                    annotated[img_path] = img
+                resolved_by[img_path] = tier_idx
+                if not self.accept(img_path, merged[img_path], merged_conf[img_path]):
+                    still_pending.append(img_path)
+            pending = still_pending
+
+        for tier_idx in resolved_by.values():
+            self.tier_resolved[tier_idx] += 1
+
+        self.last_confidences = merged_conf
+        dict_extracted = {p: str(merged[p]) for p in image_paths}
+        return [annotated.get(p) for p in image_paths], dict_extracted
+
+
+if __name__ == "__main__":
+    cascade = Cascade.default()
+    input_folder = "input"
+    files = os.listdir(input_folder)
+    image_paths = [
+        os.path.join(input_folder, filename)
+        for filename in files
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    images_annotated, dict_extracted = cascade.predict_multi_and_extract(image_paths)
+    print(dict_extracted)
+    print("Tier counts:", cascade.tier_counts, "usage:", cascade.tier_usage())
+    for idx, img in enumerate(images_annotated):
+        if img is not None:
+            cv2.imwrite(f"output_cascade_annotated_{idx}.png", img)
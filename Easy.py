@@ -1,8 +1,18 @@
 import easyocr
 import numpy as np
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from utils import *
+from recognizers import EasyCropRecognizer, recognize_boxes, rerecognize_low_confidence
+from rec_cache import CachedRecognizer, RecognitionCache
+from result_store import ResultStore
+from image_buffer import ImageBuffer, buffer_chunks, load_buffers
+from sinks import ImageSink, DirectorySink
+from linker import extract_fields
+from replay import POLY, ReplayRecorder
+from profiler import add_profile_argument, profiled, stage
+import argparse
+import runtime_profiles
 import cv2
 
 
@@ -16,61 +26,185 @@ class Easy():
         reader_verbose: bool = False,
         low_text: float = 0.3,
         min_size: int = 10,
+        rerec_threshold: Optional[float] = None,
+        rerec_decoder: str = "beamsearch",
+        rerec_beam_width: int = 10,
+        rerec_scale: float = 1.0,
+        rec_cache: Optional[RecognitionCache] = None,
+        result_store: Optional[ResultStore] = None,
+        runtime_profile: Optional[str] = None,
+        field_linker: str = "spatial",
+        decode_max_side: Optional[int] = None,
+        record_to: Optional[str] = None,
+        stream_chunk_size: int = 8,
     ):
+        # CPU profile (torch threads, gpu=False); None -> $OCR_RUNTIME_PROFILE / calibration
+        self.runtime_profile = runtime_profiles.activate(runtime_profile, "Easy")
+        easy_args = runtime_profiles.easy_runtime_args(self.runtime_profile)
         # Initialize EasyOCR reader
-        self.reader = easyocr.Reader(list(easy_langs), verbose=reader_verbose)
+        self.reader = easyocr.Reader(list(easy_langs), verbose=reader_verbose, **easy_args)
         self.decoder = decoder
         self.batch_size = batch_size
         self.blocklist = blocklist
         self.low_text = low_text
         self.min_size = min_size
+        # with `rec_cache`, detection and recognition run as separate steps (what
+        # readtext does internally) so crops can be served from the cache;
+        # without it the public readtext is used as before
+        self.recognizer = None
+        if rec_cache is not None:
+            self.recognizer = CachedRecognizer(
+                EasyCropRecognizer(self.reader, decoder=decoder, batch_size=batch_size, blocklist=blocklist),
+                rec_cache,
+            )
+        # boxes below rerec_threshold get one pooled re-recognition pass with a wider beam
+        self.rerec_threshold = rerec_threshold
+        self.rerecognizer = None
+        if rerec_threshold is not None:
+            self.rerecognizer = EasyCropRecognizer(
+                self.reader,
+                decoder=rerec_decoder,
+                beam_width=rerec_beam_width,
+                batch_size=batch_size,
+                blocklist=blocklist,
+            )
+            if rec_cache is not None:
+                self.rerecognizer = CachedRecognizer(self.rerecognizer, rec_cache)
+        self.rerec_scale = rerec_scale
+        # image path -> {field: confidence of its value box}, from the last call
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        self.last_rerecognized = 0
+        # extractions of every call are bulk-inserted here when set
+        self.result_store = result_store
+        # "spatial": label -> value by box geometry (linker.py); "sequential": texts[ind+1]
+        self.field_linker = field_linker
+        # opt-in: JPEGs >= 2x this long side are decoded at 1/2, 1/4 or 1/8 scale, and boxes /
+        # annotated images stay at that scale (None: full decode)
+        self.decode_max_side = decode_max_side
+        # raw boxes / texts / scores appended per image for replay.Replay
+        self.recorder = ReplayRecorder(record_to, "easyocr") if record_to else None
+        # with a sink, images are decoded, recognized and streamed this many at a time
+        if stream_chunk_size < 1:
+            raise ValueError("stream_chunk_size must be >= 1")
+        self.stream_chunk_size = stream_chunk_size
 
-    def predict_multi_and_extract(self, image_paths: List[str]) -> Tuple[List[np.ndarray], Dict[str, str]]:
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None, sink: Optional[ImageSink] = None) -> Tuple[List[np.ndarray], Dict[str, str]]:
         """Process multiple images (one-by-one) and return annotated images + extracted text dict.
 
-        EasyOCR doesn't support multi-image batch OCR directly here, so we run readtext per image.
+        EasyOCR doesn't support multi-image batch detection directly here, so we detect per image.
+        Each image is decoded once: detection reads the BGR buffer, recognition crops
+        its cached grayscale view, annotations are drawn on the BGR buffer.
+        With a `sink`, images are decoded and processed `stream_chunk_size` at a time.
         """
+        self.last_confidences = {}
+        self.last_rerecognized = 0
+        images_annotated: List[Optional[np.ndarray]] = []
         dict_extracted: Dict[str, str] = {}
-        images_annotated: List[np.ndarray] = []
+        chunk_size = self.stream_chunk_size if sink is not None else None
+        for paths, given in buffer_chunks(image_paths, buffers, chunk_size):
+            annotated, extracted = self._predict_chunk(paths, given, sink)
+            images_annotated.extend(annotated)
+            dict_extracted.update(extracted)
+
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self.result_store is not None:
+            self.result_store.add_many(dict_extracted)
+        return images_annotated, dict_extracted
 
-        for img_path in image_paths:
-            # read image
-            img = cv2.imread(img_path)
-            if img is None:
-                # skip unreadable files but keep key as empty
+    def _predict_chunk(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]], sink: Optional[ImageSink]) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        dict_extracted: Dict[str, str] = {}
+        pages = []
+        with stage("decode"):
+            all_bufs = load_buffers(image_paths, buffers, max_side=self.decode_max_side)
+
+        for img_path, buf in zip(image_paths, all_bufs):
+            if buf is None:
+                # keep key as empty so outputs stay aligned with inputs
                 dict_extracted[img_path] = ""
                 continue
 
-            # EasyOCR returns list of [bbox, text, confidence]
-            results = self.reader.readtext(
-                img_path,
-                detail=1,
-                paragraph=False,
-                decoder=self.decoder,
-                batch_size=1,  # process single image at a time
-                blocklist=self.blocklist,
-                low_text=self.low_text,
-                min_size=self.min_size,
-            )
+            if self.recognizer is None:
+                with stage("ocr"):
+                    results = self.reader.readtext(
+                        buf.bgr,
+                        detail=1,
+                        paragraph=False,
+                        decoder=self.decoder,
+                        batch_size=self.batch_size,
+                        blocklist=self.blocklist,
+                        low_text=self.low_text,
+                        min_size=self.min_size,
+                    )
+                polys = [np.array(r[0]).astype(int).tolist() for r in results]
+                texts = [r[1] for r in results]
+                scores = [float(r[2]) for r in results]
+                pages.append((img_path, buf, polys, texts, scores))
+                continue
 
-            texts = [r[1] for r in results]
+            # EasyOCR detection: axis-aligned [x_min, x_max, y_min, y_max] boxes + rotated polygons
+            # reformat=False: the buffer is already decoded, skip EasyOCR's own gray conversion
+            with stage("detect"):
+                horizontal_list, free_list = self.reader.detect(
+                    buf.bgr,
+                    min_size=self.min_size,
+                    low_text=self.low_text,
+                    reformat=False,
+                )
+            boxes = list(horizontal_list[0]) + list(free_list[0])
+            with stage("recognize"):
+                texts, scores = recognize_boxes(self.recognizer, buf.gray, boxes)
             # convert bboxes to int polygons
-            polys = [np.array(r[0]).astype(int).tolist() for r in results]
+            polys = [to_quad(b).astype(int).tolist() for b in boxes]
+            pages.append((img_path, buf, polys, texts, scores))
+
+        # pre-rerec readings are what gets recorded; replay applies the rerec readings again
+        raw = [(list(texts), list(scores)) for _, _, _, texts, scores in pages] if self.recorder is not None else None
+        rerec_readings: List[Dict[int, Tuple[str, float]]] = [{} for _ in pages]
+        if self.rerec_threshold is not None:
+            with stage("rerecognize"):
+                self.last_rerecognized += rerecognize_low_confidence(
+                    self.rerecognizer,
+                    [(buf.gray, polys, texts, scores) for _, buf, polys, texts, scores in pages],
+                    self.rerec_threshold, self.rerec_scale,
+                    readings_out=rerec_readings if raw is not None else None)
 
+        canvases = {}
+        for k, (img_path, buf, polys, texts, scores) in enumerate(pages):
+            if raw is not None:
+                self.recorder.add(img_path, POLY, polys, raw[k][0], raw[k][1], buf.bgr.shape,
+                                  rerec=rerec_readings[k], rerec_threshold=self.rerec_threshold, scale=buf.scale)
             # post-process and store extracted text (keep same structure as Paddle version)
-            dict_extracted[img_path] = str(post_process(np.array(texts)))
+            with stage("post_process"):
+                fields, conf = extract_fields(polys, texts, scores, self.field_linker)
+            dict_extracted[img_path] = str(fields)
+            self.last_confidences[img_path] = conf
 
             # draw polygons and labels
-            for poly, txt in zip(polys, texts):
-                draw_paddle_poly_with_easy_label(img, poly, txt)
-
-            images_annotated.append(img)
+            with stage("draw"):
+                img = buf.canvas()
+                for poly, txt in zip(polys, texts):
+                    draw_paddle_poly_with_easy_label(img, poly, txt)
+            buf.drop_gray()
+            if sink is None:
+                canvases[id(buf)] = img
+                continue
+            # streamed: encoded in the background, nothing kept for the return value
+            sink.submit(img_path, img)
+            if buffers is None:
+                buf.release()
 
+        # None placeholder for unreadable inputs
+        images_annotated = [canvases.get(id(b)) if b is not None else None for b in all_bufs]
+        dict_extracted = {p: dict_extracted[p] for p in image_paths}
         return images_annotated, dict_extracted
 
 
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EasyOCR demo trên thư mục input/")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
     easy = Easy()
     input_folder = "input"
     files = os.listdir(input_folder)
@@ -79,7 +213,6 @@ if __name__ == "__main__":
         for filename in files 
         if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
     ]
-    images_annotated, dict_extracted = easy.predict_multi_and_extract(image_paths)
+    with profiled(args.profile, args.profile_interval), DirectorySink("output_annotated") as sink:
+        _, dict_extracted = easy.predict_multi_and_extract(image_paths, sink=sink)
     print(dict_extracted)
-    for idx, img in enumerate(images_annotated):
-        cv2.imwrite(f"output_easy_annotated_{idx}.png", img)
@@ -1,8 +1,21 @@
-from paddleocr import PaddleOCR
+from paddleocr import PaddleOCR, TextDetection
 import numpy as np
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from utils import *
+from recognizers import PaddleCropRecognizer, rerecognize_low_confidence
+from rec_cache import CachedRecognizer, RecognitionCache
+from result_store import ResultStore
+import runtime_profiles
+import metrics
+from skew import SkewEstimate, check_orientation
+from image_buffer import ImageBuffer, buffer_chunks, load_buffers
+from sinks import ImageSink, DirectorySink
+from tiling import check_tile_params, detect_tiled
+from linker import extract_fields
+from replay import POLY, ReplayRecorder
+from profiler import add_profile_argument, profiled, stage
+import argparse
 import cv2
 class Paddle():
     def __init__(self, text_detection_model_name = "PP-OCRv5_server_det",
@@ -16,45 +29,312 @@ class Paddle():
         textline_orientation_batch_size = 8,
         text_recognition_batch_size = 8,
         text_det_box_thresh = 0.7,
-        text_det_thresh = 0.3):
-        self.ocr = PaddleOCR(
-            text_detection_model_name = text_detection_model_name,
-            text_recognition_model_name = text_recognition_model_name,
-            text_detection_model_dir = text_detection_model_dir,
-            text_recognition_model_dir = text_recognition_model_dir,
-            use_doc_orientation_classify = use_doc_orientation_classify,
-            use_doc_unwarping = use_doc_unwarping,
-            use_textline_orientation = use_textline_orientation,
-            text_det_unclip_ratio = text_det_unclip_ratio,
-            textline_orientation_batch_size = textline_orientation_batch_size,
-            text_recognition_batch_size = text_recognition_batch_size,
-            text_det_box_thresh = text_det_box_thresh,
-            text_det_thresh = text_det_thresh)
-
-    def predict_multi_and_extract(self, image_paths: List[str]) -> Tuple[List[np.ndarray], Dict[str, str]]:
-        """Xử lý OCR cho nhiều ảnh và trả về kết quả."""
-        results = self.ocr.predict(input=image_paths)
+        text_det_thresh = 0.3,
+        rerec_threshold = None,
+        rerec_model_name = "PP-OCRv5_server_rec",
+        rerec_model_dir = None,
+        rerec_scale = 1.0,
+        rec_cache: Optional[RecognitionCache] = None,
+        result_store: Optional[ResultStore] = None,
+        runtime_profile: Optional[str] = None,
+        orientation_gate = False,
+        gate_fallback_score = 0.5,
+        det_tile_size = None,
+        det_tile_overlap = 128,
+        det_tile_batch = 4,
+        field_linker = "spatial",
+        decode_max_side = None,
+        record_to = None,
+        stream_chunk_size = 8):
+        """`rerec_threshold`: when set, boxes recognized below this confidence are
+        re-recognized in one extra batch with the (stronger) `rerec_model_name`.
+
+        `rec_cache`: when set (and no doc/textline orientation stage is enabled),
+        detection and recognition run as separate models so text-line crops seen
+        before are served from the cache instead of being recognized again.
+
+        `det_tile_size`: when set (and no doc/textline orientation stage is enabled),
+        pages larger than this are detected as overlapping tiles of that size,
+        `det_tile_batch` tiles at a time, with boxes merged across seams.
+
+        `result_store`: when set, every call's extractions are bulk-inserted into it.
+
+        `runtime_profile`: CPU profile from `runtime_profiles.PROFILES` (threads,
+        MKL-DNN, precision); None falls back to $OCR_RUNTIME_PROFILE / calibration.
+
+        `orientation_gate`: the doc orientation / unwarp / textline orientation flags
+        only load those models; a cheap `skew.check_orientation` pre-check decides per
+        image whether they actually run. Images sent the cheap way whose mean
+        recognition score is below `gate_fallback_score` (e.g. upside-down pages)
+        are run again with every enabled stage.
+
+        `field_linker`: "spatial" links each label to its value box by geometry
+        (`linker.py`), "sequential" keeps the old `texts[ind+1]` reading.
+
+        `decode_max_side`: JPEGs at least twice this size are decoded at reduced
+        resolution (1/2, 1/4, 1/8; see `image_buffer.py`), and boxes / annotated
+        images come back at that resolution; None (default) decodes in full.
+
+        `record_to`: archive directory; every image's boxes / texts / scores (before
+        rerec) and its rerec readings are appended there, for `replay.Replay`.
+
+        `stream_chunk_size`: with a `sink`, `predict_multi_and_extract` decodes,
+        recognizes and streams this many images at a time, so peak memory is one
+        chunk of pages rather than the whole list."""
+        if det_tile_size is not None:
+            check_tile_params(det_tile_size, det_tile_overlap, det_tile_batch)
+        self.runtime_profile = runtime_profiles.activate(runtime_profile, "Paddle")
+        runtime_args = runtime_profiles.paddle_runtime_args(self.runtime_profile)
+        self.rec_cache = rec_cache
+        self.result_store = result_store
+        self.field_linker = field_linker
+        self.decode_max_side = decode_max_side
+        if stream_chunk_size < 1:
+            raise ValueError("stream_chunk_size must be >= 1")
+        self.stream_chunk_size = stream_chunk_size
+        self.recorder = ReplayRecorder(record_to, "paddle") if record_to else None
+        self.det_tile_size = det_tile_size
+        self.det_tile_overlap = det_tile_overlap
+        self.det_tile_batch = det_tile_batch
+        split = rec_cache is not None or det_tile_size is not None
+        if split and not (use_doc_orientation_classify or use_doc_unwarping or use_textline_orientation):
+            self.ocr = None
+            # same limits as the PP-OCRv5 pipeline's text detection stage
+            self.det_model = TextDetection(
+                model_name = text_detection_model_name,
+                model_dir = text_detection_model_dir,
+                limit_side_len = 64,
+                limit_type = "min",
+                thresh = text_det_thresh,
+                box_thresh = text_det_box_thresh,
+                unclip_ratio = text_det_unclip_ratio,
+                **runtime_args)
+            self.recognizer = PaddleCropRecognizer(
+                model_name = text_recognition_model_name,
+                model_dir = text_recognition_model_dir,
+                batch_size = text_recognition_batch_size,
+                **runtime_args)
+            if rec_cache is not None:
+                self.recognizer = CachedRecognizer(self.recognizer, rec_cache)
+        else:
+            self.ocr = PaddleOCR(
+                text_detection_model_name = text_detection_model_name,
+                text_recognition_model_name = text_recognition_model_name,
+                text_detection_model_dir = text_detection_model_dir,
+                text_recognition_model_dir = text_recognition_model_dir,
+                use_doc_orientation_classify = use_doc_orientation_classify,
+                use_doc_unwarping = use_doc_unwarping,
+                use_textline_orientation = use_textline_orientation,
+                text_det_unclip_ratio = text_det_unclip_ratio,
+                textline_orientation_batch_size = textline_orientation_batch_size,
+                text_recognition_batch_size = text_recognition_batch_size,
+                text_det_box_thresh = text_det_box_thresh,
+                text_det_thresh = text_det_thresh,
+                **runtime_args)
+        self.heavy_stages = {
+            "use_doc_orientation_classify": use_doc_orientation_classify,
+            "use_doc_unwarping": use_doc_unwarping,
+            "use_textline_orientation": use_textline_orientation,
+        }
+        self.orientation_gate = orientation_gate and self.ocr is not None and any(self.heavy_stages.values())
+        self.gate_fallback_score = gate_fallback_score
+        # image path -> pre-check result, and running totals of stages skipped by the gate
+        self.last_gate: Dict[str, Optional[SkewEstimate]] = {}
+        self.gate_stats = {"images": 0, "stages_skipped": 0, "fallback": 0}
+        self.rerec_threshold = rerec_threshold
+        self.rerec_model_name = rerec_model_name
+        self.rerec_model_dir = rerec_model_dir
+        self.rerec_scale = rerec_scale
+        self._rerecognizer = None
+        # image path -> {field: confidence of its value box}, from the last call
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        self.last_rerecognized = 0
+
+    def _get_rerecognizer(self) -> PaddleCropRecognizer:
+        if self._rerecognizer is None:
+            self._rerecognizer = PaddleCropRecognizer(
+                model_name=self.rerec_model_name,
+                model_dir=self.rerec_model_dir,
+                **runtime_profiles.paddle_runtime_args(self.runtime_profile))
+            if self.rec_cache is not None:
+                self._rerecognizer = CachedRecognizer(self._rerecognizer, self.rec_cache)
+        return self._rerecognizer
+
+    def _detect(self, bufs: List[ImageBuffer]) -> List[List[np.ndarray]]:
+        """Text polygons per image; pages above `det_tile_size` go through tiled detection."""
+        out: List[Optional[List[np.ndarray]]] = [None] * len(bufs)
+        whole = []
+        for i, buf in enumerate(bufs):
+            if self.det_tile_size is not None and max(buf.bgr.shape[:2]) > self.det_tile_size:
+                out[i] = detect_tiled(self.det_model, buf.bgr, self.det_tile_size, self.det_tile_overlap, self.det_tile_batch)
+            else:
+                whole.append(i)
+        if whole:
+            dets = self.det_model.predict([bufs[i].bgr for i in whole], batch_size=1)
+            for i, det in zip(whole, dets):
+                out[i] = [np.array(p) for p in det["dt_polys"]]
+        return out
+
+    def _predict_split(self, bufs: List[ImageBuffer]) -> List[Dict]:
+        """Detection, then one pooled (cached) recognition batch; returns pipeline-shaped results."""
+        results = [{"rec_polys": [], "rec_texts": [], "rec_scores": []} for _ in bufs]
+        crops, owners = [], []
+        with stage("detect"):
+            detections = self._detect(bufs)
+        for i, (buf, polys) in enumerate(zip(bufs, detections)):
+            polys = [polys[j] for j in sort_quads(polys)]
+            results[i]["rec_polys"] = polys
+            for poly in polys:
+                crops.append(self.recognizer.crop(buf.bgr, poly))
+                owners.append(i)
+
+        with stage("recognize"):
+            recognized = self.recognizer.recognize(crops)
+        for i, (text, score) in zip(owners, recognized):
+            results[i]["rec_texts"].append(text)
+            results[i]["rec_scores"].append(score)
+        return results
+
+    def _stages_for(self, est: Optional[SkewEstimate]) -> Tuple[bool, bool, bool]:
+        """Per-call overrides for (doc orientation, unwarping, textline orientation)."""
+        if est is None:
+            return (False, False, False)
+        rotated = est.needs_orientation
+        return (
+            self.heavy_stages["use_doc_orientation_classify"] and rotated,
+            self.heavy_stages["use_doc_unwarping"] and est.needs_unwarp,
+            self.heavy_stages["use_textline_orientation"] and rotated,
+        )
+
+    def _predict_gated(self, bufs: List[ImageBuffer]) -> List[Dict]:
+        """Run the pipeline with the heavy stages switched on only where the pre-check asks for them."""
+        # the pre-check reads the cached grayscale view, no second decode
+        self.last_gate = {b.path: check_orientation(b.gray) for b in bufs}
+        groups: Dict[Tuple[bool, bool, bool], List[int]] = {}
+        for i, b in enumerate(bufs):
+            groups.setdefault(self._stages_for(self.last_gate[b.path]), []).append(i)
+
+        results: List[Optional[Dict]] = [None] * len(bufs)
+        for stages, idx in groups.items():
+            overrides = dict(zip(self.heavy_stages, stages))
+            for i, result in zip(idx, self.ocr.predict(input=[bufs[i].bgr for i in idx], **overrides)):
+                results[i] = result
+
+        # a clean-looking page that reads badly is most likely upside down: retry with everything on
+        cheap = groups.get((False, False, False), [])
+        retry = [
+            i for i in cheap
+            if self.gate_fallback_score is not None
+            and float(np.mean(results[i]["rec_scores"] or [0.0])) < self.gate_fallback_score
+        ]
+        if retry:
+            for i, result in zip(retry, self.ocr.predict(input=[bufs[i].bgr for i in retry], **self.heavy_stages)):
+                results[i] = result
+
+        enabled = sum(self.heavy_stages.values())
+        skipped = sum(enabled - sum(self._stages_for(self.last_gate[b.path])) for b in bufs) - enabled * len(retry)
+        self.gate_stats["images"] += len(bufs)
+        self.gate_stats["stages_skipped"] += skipped
+        self.gate_stats["fallback"] += len(retry)
+        metrics.inc("orientation_gate.images", len(bufs))
+        metrics.inc("orientation_gate.stages_skipped", skipped)
+        metrics.inc("orientation_gate.fallback", len(retry))
+        return results
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None, sink: Optional[ImageSink] = None) -> Tuple[List[np.ndarray], Dict[str, str]]:
+        """Xử lý OCR cho nhiều ảnh và trả về kết quả.
+
+        Mỗi ảnh chỉ decode một lần (hoặc dùng `buffers` đã decode sẵn); detection,
+        recognition và vẽ annotation đều đọc cùng buffer đó.
+
+        Có `sink`: ảnh annotate được đẩy vào sink ngay khi vẽ xong (danh sách trả về chỉ chứa None);
+        ảnh được decode và xử lý theo từng nhóm `stream_chunk_size` ảnh, nên bộ nhớ chỉ giữ một nhóm."""
+        self.last_confidences = {}
+        self.last_rerecognized = 0
+        images_annotated: List[Optional[np.ndarray]] = []
+        dict_extracted: Dict[str, str] = {}
+        chunk_size = self.stream_chunk_size if sink is not None else None
+        for paths, given in buffer_chunks(image_paths, buffers, chunk_size):
+            annotated, extracted = self._predict_chunk(paths, given, sink)
+            images_annotated.extend(annotated)
+            dict_extracted.update(extracted)
+
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self.result_store is not None:
+            self.result_store.add_many(dict_extracted)
+        return images_annotated, dict_extracted
+
+    def _predict_chunk(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]], sink: Optional[ImageSink]) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        with stage("decode"):
+            all_bufs = load_buffers(image_paths, buffers, max_side=self.decode_max_side)
+        bufs = [b for b in all_bufs if b is not None]
+        with stage("ocr"):
+            if not bufs:
+                results = []
+            elif self.ocr is None:
+                results = self._predict_split(bufs)
+            elif self.orientation_gate:
+                results = self._predict_gated(bufs)
+            else:
+                results = self.ocr.predict(input=[b.bgr for b in bufs])
         
         dict_extracted = {}
-        images_annotated = []
-        for img_path, result in zip(image_paths, results):
-            polys = result["dt_polys"]
+        pages = []
+        for buf, result in zip(bufs, results):
+            # rec_polys stays aligned with rec_texts / rec_scores
+            polys = result["rec_polys"]
             # ensure each polygon is a list of int points
             polys = [np.array(p).astype(int).tolist() for p in polys]
-            img = cv2.imread(img_path)
-            texts = result['rec_texts']
-            dict_extracted[result["input_path"]] = str(post_process(np.array(texts)))
+            texts = list(result['rec_texts'])
+            scores = [float(s) for s in result['rec_scores']]
+            # crops must come from the image the pipeline actually recognized
+            src = (result.get("doc_preprocessor_res") or {}).get("output_img", buf.bgr)
+            pages.append((buf, src, polys, texts, scores))
+
+        # pre-rerec readings are what gets recorded; replay applies the rerec readings again
+        raw = [(list(texts), list(scores)) for _, _, _, texts, scores in pages] if self.recorder is not None else None
+        rerec_readings: List[Dict[int, Tuple[str, float]]] = [{} for _ in pages]
+        if self.rerec_threshold is not None:
+            with stage("rerecognize"):
+                self.last_rerecognized += rerecognize_low_confidence(
+                    self._get_rerecognizer(),
+                    [(src, polys, texts, scores) for _, src, polys, texts, scores in pages],
+                    self.rerec_threshold, self.rerec_scale,
+                    readings_out=rerec_readings if raw is not None else None)
+
+        annotated_by_path = {}
+        for k, (buf, _, polys, texts, scores) in enumerate(pages):
+            if raw is not None:
+                self.recorder.add(buf.path, POLY, polys, raw[k][0], raw[k][1], buf.bgr.shape,
+                                  rerec=rerec_readings[k], rerec_threshold=self.rerec_threshold, scale=buf.scale)
+            with stage("post_process"):
+                fields, conf = extract_fields(polys, texts, scores, self.field_linker)
+            dict_extracted[buf.path] = str(fields)
+            self.last_confidences[buf.path] = conf
 
             # Draw each polygon with its corresponding text label
-            for poly, txt in zip(polys, texts):
-                draw_paddle_poly_with_easy_label(img, poly, txt)
+            with stage("draw"):
+                img = buf.canvas()
+                for poly, txt in zip(polys, texts):
+                    draw_paddle_poly_with_easy_label(img, poly, txt)
+            buf.drop_gray()
+            if sink is None:
+                annotated_by_path[buf.path] = img
+                continue
+            sink.submit(buf.path, img)
+            if buffers is None:
+                buf.release()
 
-            images_annotated.append(img)
-        
+        images_annotated = [annotated_by_path.get(p) for p in image_paths]
+        dict_extracted = {p: dict_extracted.get(p, "") for p in image_paths}
         return images_annotated, dict_extracted
 
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paddle OCR demo trên thư mục input/")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
     paddle = Paddle()
     input_folder = "input"
     files = os.listdir(input_folder)
@@ -64,7 +344,7 @@ if __name__ == "__main__":
         if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
     ]
         
-    images_annotated, dict_extracted =  paddle.predict_multi_and_extract(image_paths)
-    print(dict_extracted)
-    for idx, img in enumerate(images_annotated):
-        cv2.imwrite(f"output_annotated_{idx}.png", img)
\ No newline at end of file
+    # annotated images are encoded in the background as they are drawn
+    with profiled(args.profile, args.profile_interval), DirectorySink("output_annotated") as sink:
+        _, dict_extracted = paddle.predict_multi_and_extract(image_paths, sink=sink)
+    print(dict_extracted)
\ No newline at end of file
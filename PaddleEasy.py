@@ -3,8 +3,19 @@ import cv2
 import numpy as np
 import easyocr
 from paddleocr import TextDetection
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from utils import *
+from recognizers import EasyCropRecognizer, rerecognize_low_confidence
+from rec_cache import CachedRecognizer, RecognitionCache
+from result_store import ResultStore
+from image_buffer import ImageBuffer, buffer_chunks, load_buffers
+from sinks import ImageSink, DirectorySink
+from tiling import check_tile_params, detect_tiled
+from linker import extract_fields
+from replay import XXYY, ReplayRecorder
+from profiler import add_profile_argument, profiled, stage
+import argparse
+import runtime_profiles
 
 
 class PaddleEasy:
@@ -20,7 +31,29 @@ class PaddleEasy:
         batch_size: int = 8,
         blocklist: str = "~`'!@#$%^&*_+-={}[]|;:\"<>,?\\",
         reader_verbose: bool = False,
+        group_threshold: float = 13,
+        rerec_threshold: Optional[float] = None,
+        rerec_decoder: str = "beamsearch",
+        rerec_beam_width: int = 10,
+        rerec_scale: float = 1.0,
+        rec_cache: Optional[RecognitionCache] = None,
+        result_store: Optional[ResultStore] = None,
+        runtime_profile: Optional[str] = None,
+        tile_size: Optional[int] = None,
+        tile_overlap: int = 128,
+        tile_batch: int = 4,
+        det_batch_size: int = 4,
+        field_linker: str = "spatial",
+        decode_max_side: Optional[int] = None,
+        record_to: Optional[str] = None,
+        stream_chunk_size: int = 8,
     ) -> None:
+        if tile_size is not None:
+            check_tile_params(tile_size, tile_overlap, tile_batch)
+        # CPU profile for both halves: Paddle det threads/MKL-DNN + torch threads
+        self.runtime_profile = runtime_profiles.activate(runtime_profile, "PaddleEasy")
+        easy_args = runtime_profiles.easy_runtime_args(self.runtime_profile)
+
         # Initialize models
         self.det_model = TextDetection(
             model_dir=det_model_dir,
@@ -28,53 +61,228 @@ class PaddleEasy:
             unclip_ratio= unclip_ratio,
             thresh=thresh,
             box_thresh=box_thresh,
+            **runtime_profiles.paddle_runtime_args(self.runtime_profile),
         )
-        self.reader = easyocr.Reader(list(easy_langs), verbose=reader_verbose)
+        self.reader = easyocr.Reader(list(easy_langs), verbose=reader_verbose, **easy_args)
 
         # Runtime configs
         self.decoder = decoder
         self.batch_size = batch_size
         self.blocklist = blocklist
+        # max center-y gap for two boxes to be read as one line
+        self.group_threshold = group_threshold
+        # pages larger than tile_size are detected as overlapping tiles (no downscaling,
+        # at most tile_batch tiles in memory); None = whole-page detection
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_batch = tile_batch
+        # same-size images per detection call; recognition pools the crops of the whole call
+        self.det_batch_size = det_batch_size
+        # crops from every box go through one recognizer; with `rec_cache` only
+        # crops not seen before (e.g. after tuning det thresholds) are recognized
+        self.recognizer = EasyCropRecognizer(
+            self.reader,
+            decoder=decoder,
+            batch_size=batch_size,
+            blocklist=blocklist,
+        )
+        if rec_cache is not None:
+            self.recognizer = CachedRecognizer(self.recognizer, rec_cache)
 
-    def predict_single(self, image_path: str) -> List[Tuple[str, float]]:
-        img = cv2.imread(image_path)
-
-        det = self.det_model.predict(img, batch_size=self.batch_size)
-        polys_np = det[0].get("dt_polys", [])  
-        polys = [np.array(p).astype(int).tolist() for p in polys_np][::-1]
-        easy_boxes = [poly_to_easyocr_box(p) for p in polys]
-        
-        results = self.reader.recognize(
-            img_cv_grey= img,
-            horizontal_list=easy_boxes,
-            free_list=[],  # must be [] (not None)
-            decoder=self.decoder,
-            batch_size=self.batch_size,
-            blocklist=self.blocklist,
-            detail=1,   
+        # boxes below rerec_threshold get one pooled re-recognition pass with a wider beam
+        self.rerec_threshold = rerec_threshold
+        self.rerecognizer = EasyCropRecognizer(
+            self.reader,
+            decoder=rerec_decoder,
+            beam_width=rerec_beam_width,
+            batch_size=batch_size,
+            blocklist=blocklist,
         )
+        if rec_cache is not None:
+            self.rerecognizer = CachedRecognizer(self.rerecognizer, rec_cache)
+        self.rerec_scale = rerec_scale
+        # image path -> {field: confidence of its value box}, from the last call
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        self.last_rerecognized = 0
+        # extractions of every call are bulk-inserted here when set
+        self.result_store = result_store
+        # "spatial": label -> value by box geometry (linker.py); "sequential": texts[ind+1]
+        self.field_linker = field_linker
+        # opt-in: JPEGs >= 2x this long side are decoded at 1/2, 1/4 or 1/8 scale, and boxes /
+        # annotated images stay at that scale (None: full decode)
+        self.decode_max_side = decode_max_side
+        # raw boxes / texts / scores appended per image for replay.Replay
+        self.recorder = ReplayRecorder(record_to, "paddleeasy") if record_to else None
+        # with a sink, images are decoded, recognized and streamed this many at a time
+        if stream_chunk_size < 1:
+            raise ValueError("stream_chunk_size must be >= 1")
+        self.stream_chunk_size = stream_chunk_size
 
-        # Save texts (align by index with polys)
-        texts = [str(t) for (_, t, s) in results]
-        
-        easy_boxes, texts = group_and_flatten_boxes_texts(easy_boxes, texts, threshold= 13, sort_within_line= True)
+    def detect_many(self, bufs: List[ImageBuffer]) -> List[List[np.ndarray]]:
+        """Text polygons per image, up to `det_batch_size` images per detection call.
+
+        Only pages of the same size share a call: the detector resizes each input
+        to its limit, so padding a small page up to a larger one would detect it
+        at a lower resolution than on its own. Same-size pages (scanner batches,
+        phone photos) get exactly the resize they'd get alone.
+        Pages above `tile_size` are detected tile by tile instead.
+        """
+        out: List[List[np.ndarray]] = [[] for _ in bufs]
+        by_shape: Dict[Tuple[int, ...], List[int]] = {}
+        for i, buf in enumerate(bufs):
+            if self.tile_size is not None and max(buf.bgr.shape[:2]) > self.tile_size:
+                out[i] = detect_tiled(self.det_model, buf.bgr, self.tile_size, self.tile_overlap, self.tile_batch)
+            else:
+                by_shape.setdefault(buf.bgr.shape, []).append(i)
+        for same in by_shape.values():
+            for start in range(0, len(same), self.det_batch_size):
+                group = same[start:start + self.det_batch_size]
+                batch = [bufs[i].bgr for i in group]
+                for i, det in zip(group, self.det_model.predict(batch, batch_size=len(batch))):
+                    out[i] = list(det.get("dt_polys", []))
+        return out
+
+    def recognize_many(self, bufs: List[ImageBuffer]) -> List[Tuple[List[List[List[int]]], List[str], List[float]]]:
+        """Batched detection, then one pooled recognition over the crops of every image.
+
+        Returns per image `(polys, texts, scores)` in detection order, before
+        grouping (what `record_to` archives).
+        """
+        pages_polys = []
+        crops, owners = [], []
+        with stage("detect"):
+            detections = self.detect_many(bufs)
+        for i, (buf, polys_np) in enumerate(zip(bufs, detections)):
+            polys = [np.array(p).astype(int).tolist() for p in polys_np][::-1]
+            pages_polys.append(polys)
+            easy_boxes = [poly_to_easyocr_box(p) for p in polys]
+            # crops are cut from the grayscale view EasyOCR's recognizer needs
+            for box in easy_boxes:
+                crops.append(self.recognizer.crop(buf.gray, box))
+                owners.append(i)
+
+        texts: List[List[str]] = [[] for _ in bufs]
+        scores: List[List[float]] = [[] for _ in bufs]
+        with stage("recognize"):
+            recognized = self.recognizer.recognize(crops)
+        for i, (text, score) in zip(owners, recognized):
+            texts[i].append(text)
+            scores[i].append(score)
+
+        return list(zip(pages_polys, texts, scores))
+
+    def detect_and_recognize_many(self, bufs: List[ImageBuffer]) -> List[Tuple[List[List[int]], List[str], List[float]]]:
+        """`recognize_many`, with each image's `(easy_boxes, texts, scores)` grouped into reading order."""
+        out = []
+        for polys, page_texts, page_scores in self.recognize_many(bufs):
+            # group indices instead of texts so scores follow the same order
+            easy_boxes, order = group_reading_order(polys, self.group_threshold)
+            out.append((easy_boxes, [page_texts[j] for j in order], [page_scores[j] for j in order]))
+        return out
+
+    def detect_and_recognize(self, img: Union[np.ndarray, ImageBuffer]) -> Tuple[List[List[int]], List[str], List[float]]:
+        """Run detection (on BGR) + recognition (on the cached gray view) for one image, grouped into reading order."""
+        buf = img if isinstance(img, ImageBuffer) else ImageBuffer("", img)
+        return self.detect_and_recognize_many([buf])[0]
+
+    def predict_single(self, image_path: str, buffer: Optional[ImageBuffer] = None) -> Tuple[List[str], Optional[np.ndarray]]:
+        buf = buffer or ImageBuffer.load(image_path, max_side=self.decode_max_side)
+        if buf is None:
+            return [], None
+
+        easy_boxes, texts, _ = self.detect_and_recognize(buf)
         
+        img = buf.canvas()
+        buf.drop_gray()
         for i, text in enumerate(texts):
             if i < len(easy_boxes):
                 draw_bbox_with_label(img, easy_boxes[i], text, fmt="xxyy")
         return texts, img
-    def predict_multi_and_extract(self, image_paths: List[str]) -> Tuple[List[np.ndarray], Dict[str, str]]:
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None, sink: Optional[ImageSink] = None) -> Tuple[List[np.ndarray], Dict[str, str]]:
+        """Batched detection and pooled recognition over `image_paths`; with a `sink`,
+        images are decoded and processed `stream_chunk_size` at a time."""
+        self.last_confidences = {}
+        self.last_rerecognized = 0
+        images_annotated: List[Optional[np.ndarray]] = []
+        dict_extracted: Dict[str, str] = {}
+        chunk_size = self.stream_chunk_size if sink is not None else None
+        for paths, given in buffer_chunks(image_paths, buffers, chunk_size):
+            annotated, extracted = self._predict_chunk(paths, given, sink)
+            images_annotated.extend(annotated)
+            dict_extracted.update(extracted)
+
+        if self.recorder is not None:
+            self.recorder.flush()
+        if self.result_store is not None:
+            self.result_store.add_many(dict_extracted)
+        return images_annotated, dict_extracted
+
+    def _predict_chunk(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]], sink: Optional[ImageSink]) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
         dict_extracted: Dict[str, str] = {}
-        images_annotated: List[np.ndarray] = []
+        pages = []
+        with stage("decode"):
+            all_bufs = load_buffers(image_paths, buffers, max_side=self.decode_max_side)
+
+        readable = []
+        for img_path, buf in zip(image_paths, all_bufs):
+            if buf is None:
+                dict_extracted[img_path] = ""
+                continue
+            readable.append((img_path, buf))
+
+        # detection in batches of images, recognition pooled across all of them
+        raw = self.recognize_many([buf for _, buf in readable])
+        for (img_path, buf), (polys, raw_texts, raw_scores) in zip(readable, raw):
+            easy_boxes, order = group_reading_order(polys, self.group_threshold)
+            texts, scores = [raw_texts[j] for j in order], [raw_scores[j] for j in order]
+            pages.append((img_path, buf, easy_boxes, texts, scores, (polys, raw_texts, raw_scores, order)))
 
-        for img_path in image_paths:
-            texts, annotated_img = self.predict_single(img_path)
-            dict_extracted[img_path] = str(post_process(np.array([t for t in texts])))
-            images_annotated.append(annotated_img)
+        rerec_readings: List[Dict[int, Tuple[str, float]]] = [{} for _ in pages]
+        if self.rerec_threshold is not None:
+            with stage("rerecognize"):
+                self.last_rerecognized += rerecognize_low_confidence(
+                    self.rerecognizer,
+                    [(buf.gray, boxes, texts, scores) for _, buf, boxes, texts, scores, _ in pages],
+                    self.rerec_threshold, self.rerec_scale,
+                    readings_out=rerec_readings if self.recorder is not None else None)
 
+        canvases = {}
+        for (img_path, buf, easy_boxes, texts, scores, source), readings in zip(pages, rerec_readings):
+            if self.recorder is not None:
+                # raw detection order and pre-rerec readings: replay re-runs grouping and rerec
+                polys, raw_texts, raw_scores, order = source
+                self.recorder.add(img_path, XXYY, polys, raw_texts, raw_scores, buf.bgr.shape,
+                                  rerec={order[j]: r for j, r in readings.items()},
+                                  rerec_threshold=self.rerec_threshold,
+                                  scale=buf.scale, group_threshold=self.group_threshold)
+            with stage("post_process"):
+                fields, conf = extract_fields(easy_boxes, texts, scores, self.field_linker)
+            dict_extracted[img_path] = str(fields)
+            self.last_confidences[img_path] = conf
+            with stage("draw"):
+                img = buf.canvas()
+                for i, text in enumerate(texts):
+                    if i < len(easy_boxes):
+                        draw_bbox_with_label(img, easy_boxes[i], text, fmt="xxyy")
+            buf.drop_gray()
+            if sink is None:
+                canvases[id(buf)] = img
+                continue
+            # streamed: encoded in the background, nothing kept for the return value
+            sink.submit(img_path, img)
+            if buffers is None:
+                buf.release()
+
+        images_annotated = [canvases.get(id(b)) if b is not None else None for b in all_bufs]
+        dict_extracted = {p: dict_extracted[p] for p in image_paths}
         return images_annotated, dict_extracted
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PaddleEasy OCR demo trên thư mục input/")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
     paddle_easy = PaddleEasy()
     input_folder = "input"
     files = os.listdir(input_folder)
@@ -83,8 +291,6 @@ if __name__ == "__main__":
         for filename in files 
         if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
     ]
-    images_annotated, dict_extracted = paddle_easy.predict_multi_and_extract(image_paths)
+    with profiled(args.profile, args.profile_interval), DirectorySink("output_annotated") as sink:
+        _, dict_extracted = paddle_easy.predict_multi_and_extract(image_paths, sink=sink)
     print(dict_extracted)
-    for idx, img in enumerate(images_annotated):
-        cv2.imwrite(f"output_easy_annotated_{idx}.png", img)
-
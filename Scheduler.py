@@ -0,0 +1,265 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import metrics
+from engine import OCREngine
+from image_buffer import ImageBuffer, read_header
+
+
+def image_megapixels(image_path: str, buffer: Optional[ImageBuffer] = None) -> Optional[float]:
+    """Pixel count in megapixels, from the buffer or the PNG/JPEG header (no decode)."""
+    if buffer is not None and buffer.bgr is not None:
+        return buffer.bgr.shape[0] * buffer.bgr.shape[1] / 1e6
+    header = read_header(image_path)
+    return header[1] * header[2] / 1e6 if header else None
+
+
+class _Job:
+    __slots__ = ("path", "buf", "weight", "estimate", "future")
+
+    def __init__(self, path: str, buf: Optional[ImageBuffer], weight: float, estimate: float) -> None:
+        self.path = path
+        self.buf = buf
+        self.weight = weight
+        self.estimate = estimate
+        self.future: Future = Future()
+
+
+class Lane:
+    """One engine instance, its queue and its moving-average cost per unit of work."""
+
+    def __init__(self, name: str, engine: OCREngine, max_batch: int, alpha: float) -> None:
+        self.name = name
+        self.engine = engine
+        self.max_batch = max_batch
+        self.alpha = alpha
+        # seconds per unit of work (image, or megapixel with size weights); None until measured
+        self.latency: Optional[float] = None
+        self.images = 0
+        self.depth = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, lock: threading.Lock) -> None:
+        """Fresh queue and worker thread (also after a fork, which keeps no threads)."""
+        self.scheduler_lock = lock
+        self.queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self.depth = 0              # images queued or running
+        self.backlog = 0.0          # estimated seconds of queued work
+        self.running_estimate = 0.0
+        self.running_since = 0.0
+        self.thread = threading.Thread(target=self._work, name=f"lane-{self.name}", daemon=True)
+        self.thread.start()
+
+    def expected_wait(self, now: float) -> float:
+        left = max(0.0, self.running_estimate - (now - self.running_since)) if self.running_estimate else 0.0
+        return self.backlog + left
+
+    def _take_batch(self) -> List[Optional[_Job]]:
+        jobs = [self.queue.get()]
+        while jobs[-1] is not None and len(jobs) < self.max_batch:
+            try:
+                jobs.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _work(self) -> None:
+        while True:
+            jobs = self._take_batch()
+            stop = jobs[-1] is None
+            jobs = [j for j in jobs if j is not None]
+            if jobs:
+                self._run(jobs)
+            if stop:
+                return
+
+    def _buffers(self, jobs: List[_Job]) -> Optional[List[Optional[ImageBuffer]]]:
+        """None when no job came with a buffer (the engine decodes), else one per job.
+
+        A None entry would mean "unreadable" to the engine, so jobs without a
+        buffer in a mixed batch are decoded here.
+        """
+        if all(j.buf is None for j in jobs):
+            return None
+        max_side = getattr(self.engine, "decode_max_side", None)
+        return [j.buf if j.buf is not None else ImageBuffer.load(j.path, max_side=max_side) for j in jobs]
+
+    def _run(self, jobs: List[_Job]) -> None:
+        estimate = sum(j.estimate for j in jobs)
+        with self.scheduler_lock:
+            self.backlog = max(0.0, self.backlog - estimate)
+            self.running_estimate = estimate
+            self.running_since = time.perf_counter()
+        start = time.perf_counter()
+        ok = False
+        try:
+            paths = [j.path for j in jobs]
+            images_annotated, extracted = self.engine.predict_multi_and_extract(paths, buffers=self._buffers(jobs))
+            conf = getattr(self.engine, "last_confidences", {})
+            for job, img in zip(jobs, images_annotated):
+                job.future.set_result((img, extracted.get(job.path, ""), conf.get(job.path, {})))
+            ok = True
+        except BaseException as e:
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+        elapsed = time.perf_counter() - start
+
+        per_unit = elapsed / max(sum(j.weight for j in jobs), 1e-6)
+        with self.scheduler_lock:
+            # a batch that failed fast says nothing about the lane's speed; counting it
+            # would make a broken engine look cheapest and draw most of the traffic
+            if ok:
+                self.latency = per_unit if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * per_unit
+            self.depth -= len(jobs)
+            self.running_estimate = 0.0
+            self.images += len(jobs)
+        metrics.inc(f"scheduler.{self.name}.images", len(jobs))
+        metrics.set_gauge(f"scheduler.{self.name}.latency", self.latency)
+
+
+class Scheduler:
+    """Routes images across several engine instances as one `OCREngine`.
+
+    Each engine gets its own worker thread and queue. Every incoming image goes
+    to the lane with the lowest expected completion time: the lane's queued work
+    plus what is left of its running batch, plus this image's cost at the
+    lane's moving-average latency (`alpha` = EWMA weight of the newest batch).
+
+    `size_weights=True` measures latency per megapixel (read from the buffer or
+    the file header) so large scans count for more than small photos.
+    A lane drains up to `max_batch` queued images per engine call.
+    A lane with no measurement yet is costed like the fastest measured lane
+    (`initial_latency` before any), so every engine gets tried early.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[OCREngine],
+        names: Optional[Sequence[str]] = None,
+        alpha: float = 0.2,
+        size_weights: bool = True,
+        max_batch: int = 4,
+        initial_latency: float = 1.0,
+        weight_fn: Callable[[str, Optional[ImageBuffer]], Optional[float]] = image_megapixels,
+    ) -> None:
+        if not engines:
+            raise ValueError("Scheduler needs at least one engine")
+        names = list(names) if names is not None else [f"{type(e).__name__}-{i}" for i, e in enumerate(engines)]
+        self.lanes = [Lane(n, e, max_batch, alpha) for n, e in zip(names, engines)]
+        # lanes start on first use, per process: a pre-fork server's workers get their own threads
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.size_weights = size_weights
+        self.initial_latency = initial_latency
+        self.weight_fn = weight_fn
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        # image path -> lane name, from the last call
+        self.last_assignment: Dict[str, str] = {}
+
+    @classmethod
+    def default(cls, runtime_profile: Optional[str] = None, **kwargs) -> "Scheduler":
+        """PaddleOCR (mobile rec) next to PaddleOCR det + EasyOCR rec."""
+        from Paddle import Paddle
+        from PaddleEasy import PaddleEasy
+        return cls(
+            [Paddle(text_recognition_model_name="PP-OCRv5_mobile_rec", runtime_profile=runtime_profile),
+             PaddleEasy(runtime_profile=runtime_profile)],
+            names=["paddle-mobile", "paddleeasy"],
+            **kwargs,
+        )
+
+    def _weight(self, path: str, buf: Optional[ImageBuffer]) -> float:
+        if not self.size_weights:
+            return 1.0
+        w = self.weight_fn(path, buf)
+        return max(w, 0.01) if w else 1.0
+
+    def _assign(self, job: _Job) -> Lane:
+        now = time.perf_counter()
+        with self._lock:
+            known = [l.latency for l in self.lanes if l.latency is not None]
+            fallback = min(known) if known else self.initial_latency
+            best, best_eta, best_cost = None, None, 0.0
+            for lane in self.lanes:
+                cost = (lane.latency if lane.latency is not None else fallback) * job.weight
+                eta = lane.expected_wait(now) + cost
+                if best_eta is None or eta < best_eta:
+                    best, best_eta, best_cost = lane, eta, cost
+            job.estimate = best_cost
+            best.backlog += best_cost
+            best.depth += 1
+        best.queue.put(job)
+        return best
+
+    def _ensure_started(self) -> None:
+        if self._pid != os.getpid():
+            # shared with the lanes, which update their fields under it
+            self._lock = threading.Lock()
+            for lane in self.lanes:
+                lane.start(self._lock)
+            self._pid = os.getpid()
+
+    def submit(self, image_path: str, buffer: Optional[ImageBuffer] = None) -> Future:
+        """Queue one image; the future resolves to `(annotated, extracted_str, confidences)`."""
+        self._ensure_started()
+        job = _Job(image_path, buffer, self._weight(image_path, buffer), 0.0)
+        lane = self._assign(job)
+        self.last_assignment[image_path] = lane.name
+        return job.future
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        self.last_assignment = {}
+        futures = [self.submit(p, buffers[i] if buffers is not None else None) for i, p in enumerate(image_paths)]
+        images_annotated, dict_extracted, confidences = [], {}, {}
+        for path, fut in zip(image_paths, futures):
+            img, extracted, conf = fut.result()
+            images_annotated.append(img)
+            dict_extracted[path] = extracted
+            confidences[path] = conf
+        self.last_confidences = confidences
+        return images_annotated, dict_extracted
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Per lane: moving-average latency, queue depth and images served."""
+        with self._lock:
+            return [
+                {"name": l.name, "latency": l.latency, "depth": l.depth, "images": l.images,
+                 "unit": "s/MP" if self.size_weights else "s/image"}
+                for l in self.lanes
+            ]
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        for lane in self.lanes:
+            lane.queue.put(None)
+        for lane in self.lanes:
+            lane.thread.join()
+        self._pid = None
+
+    def __enter__(self) -> "Scheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    scheduler = Scheduler.default()
+    input_folder = "input"
+    files = os.listdir(input_folder)
+    image_paths = [
+        os.path.join(input_folder, filename)
+        for filename in files
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    with scheduler:
+        _, dict_extracted = scheduler.predict_multi_and_extract(image_paths)
+        print(dict_extracted)
+        for row in scheduler.stats():
+            print(row)
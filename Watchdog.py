@@ -0,0 +1,338 @@
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+import metrics
+from engine import ENGINE_NAMES, OCREngine, create_engine
+from image_buffer import ImageBuffer
+
+logger = logging.getLogger(__name__)
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process from /proc (None where there is no /proc)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reduced_buffer(path: str, bgr: Optional[np.ndarray], max_side: int) -> Optional[ImageBuffer]:
+    """Buffer no larger than `max_side` on its long side, with `scale` set for drawing."""
+    buf = ImageBuffer(path, bgr) if bgr is not None else ImageBuffer.load(path, max_side=max_side)
+    if buf is None:
+        return None
+    h, w = buf.bgr.shape[:2]
+    if max(h, w) > max_side:
+        f = max_side / max(h, w)
+        buf = ImageBuffer(path, cv2.resize(buf.bgr, (max(1, round(w * f)), max(1, round(h * f))), interpolation=cv2.INTER_AREA),
+                          scale=buf.scale * f)
+    return buf
+
+
+def _worker_main(conn, engine: Optional[OCREngine], name: str, engine_kwargs: Dict[str, Any], annotate: bool) -> None:
+    """One image at a time: receives (path, bgr, max_side), replies ("ok", img, extracted, conf) or ("error", msg)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if engine is None:
+        engine = create_engine(name, **engine_kwargs)
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        path, bgr, max_side = msg
+        try:
+            if max_side is not None:
+                buffers = [reduced_buffer(path, bgr, max_side)]
+            else:
+                buffers = [ImageBuffer(path, bgr)] if bgr is not None else None
+            images_annotated, extracted = engine.predict_multi_and_extract([path], buffers=buffers)
+            conf = getattr(engine, "last_confidences", {}).get(path, {})
+            conn.send(("ok", images_annotated[0] if annotate else None, extracted.get(path, ""), conf))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Task:
+    __slots__ = ("index", "path", "bgr", "max_side")
+
+    def __init__(self, index: int, path: str, bgr: Optional[np.ndarray], max_side: Optional[int] = None) -> None:
+        self.index = index
+        self.path = path
+        self.bgr = bgr
+        self.max_side = max_side
+
+
+class _Worker:
+    def __init__(self, slot: int) -> None:
+        self.slot = slot
+        self.process = None
+        self.conn = None
+        self.state = "dead"  # starting | idle | busy | dead
+        self.task: Optional[_Task] = None
+        self.deadline = 0.0
+        self.images = 0
+        self.restarts = -1
+        self.rss_mb: Optional[float] = None
+
+
+class Watchdog:
+    """Runs an engine in supervised worker processes with a per-image time and memory budget.
+
+    Each worker OCRs one image at a time. An image that runs past `timeout`
+    seconds, or whose worker grows beyond `memory_mb` of resident memory
+    (models included), gets its worker killed and is reported in
+    `last_failures` (path -> reason) with an empty result; the worker is
+    restarted and the rest of the batch carries on. With `retry_max_side`
+    set, such an image is first tried once more at that resolution.
+
+    With fork (Linux / macOS) the engine is loaded once in this process and
+    workers are forked from it, so a restart doesn't reload the models;
+    `preload=False` makes every worker load its own (slower restarts, but
+    safe with OpenMP runtimes that don't survive a fork, see prefork_server.py).
+
+    Metrics: `watchdog.images`, `.timeouts`, `.memory_kills`, `.crashes`,
+    `.errors`, `.reduced_retries`, `.restarts`, gauges `watchdog.workers_alive`
+    and `watchdog.worker<slot>.rss_mb`; `stats()` gives per-worker health.
+    """
+
+    def __init__(
+        self,
+        engine: str = "paddle",
+        workers: int = 1,
+        timeout: Optional[float] = 60.0,
+        memory_mb: Optional[float] = None,
+        retry_max_side: Optional[int] = None,
+        annotate: bool = True,
+        preload: bool = True,
+        start_timeout: float = 600.0,
+        tick: float = 0.1,
+        **engine_kwargs,
+    ) -> None:
+        self.engine_name = engine
+        self.engine_kwargs = engine_kwargs
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.retry_max_side = retry_max_side
+        self.annotate = annotate
+        self.start_timeout = start_timeout
+        self.tick = tick
+        self._ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        self.preload = preload and self._ctx.get_start_method() == "fork"
+        self._engine: Optional[OCREngine] = None
+        self.workers = [_Worker(i) for i in range(max(1, workers))]
+        self._pid: Optional[int] = None
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        self.last_failures: Dict[str, str] = {}
+
+    def _spawn(self, w: _Worker) -> None:
+        if self.preload and self._engine is None:
+            self._engine = create_engine(self.engine_name, **self.engine_kwargs)
+        parent, child = self._ctx.Pipe()
+        w.process = self._ctx.Process(
+            target=_worker_main,
+            args=(child, self._engine, self.engine_name, self.engine_kwargs, self.annotate),
+            name=f"watchdog-{w.slot}",
+            daemon=True,
+        )
+        w.process.start()
+        child.close()
+        w.conn = parent
+        w.state = "starting"
+        w.task = None
+        w.deadline = time.monotonic() + self.start_timeout
+        w.rss_mb = None
+        w.restarts += 1
+        if w.restarts:
+            metrics.inc("watchdog.restarts")
+
+    def _kill(self, w: _Worker) -> None:
+        if w.process is not None and w.process.is_alive():
+            w.process.kill()
+        if w.process is not None:
+            w.process.join(timeout=5)
+        if w.conn is not None:
+            w.conn.close()
+        w.process, w.conn, w.state = None, None, "dead"
+
+    def _ensure_started(self) -> None:
+        if self._pid != os.getpid():
+            # worker handles inherited over a fork belong to the parent
+            for w in self.workers:
+                w.process, w.conn, w.state, w.restarts = None, None, "dead", -1
+            for w in self.workers:
+                self._spawn(w)
+            self._pid = os.getpid()
+
+    def _alive(self) -> int:
+        n = sum(w.state != "dead" for w in self.workers)
+        metrics.set_gauge("watchdog.workers_alive", n)
+        return n
+
+    def _lost(self, w: _Worker, reason: str, counter: str, pending: Deque[_Task], failures: Dict[int, str],
+              retry: bool) -> None:
+        """Worker killed or dead while on `w.task`: retry smaller or record the failure, then restart."""
+        task = w.task
+        self._kill(w)
+        metrics.inc(f"watchdog.{counter}")
+        if task is not None:
+            logger.warning("%s: %s (worker %d)", task.path, reason, w.slot)
+            if retry and self.retry_max_side is not None and task.max_side is None:
+                metrics.inc("watchdog.reduced_retries")
+                pending.appendleft(_Task(task.index, task.path, task.bgr, self.retry_max_side))
+            else:
+                failures[task.index] = reason
+        self._spawn(w)
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        self._ensure_started()
+        n = len(image_paths)
+        images_annotated: List[Optional[np.ndarray]] = [None] * n
+        extracted: List[str] = [""] * n
+        confidences: Dict[str, Dict[str, float]] = {}
+        failures: Dict[int, str] = {}
+        pending: Deque[_Task] = deque()
+        for i, p in enumerate(image_paths):
+            buf = buffers[i] if buffers is not None else None
+            if buffers is not None and (buf is None or buf.bgr is None):
+                continue  # unreadable, like the engines
+            pending.append(_Task(i, p, buf.bgr if buf is not None else None))
+        start_failures = 0
+
+        while pending or any(w.state == "busy" for w in self.workers):
+            for w in self.workers:
+                if w.state == "idle" and pending:
+                    task = pending.popleft()
+                    try:
+                        w.conn.send((task.path, task.bgr, task.max_side))
+                    except (OSError, ValueError):
+                        pending.appendleft(task)
+                        self._lost(w, "worker pipe closed", "crashes", pending, failures, retry=False)
+                        continue
+                    w.task, w.state = task, "busy"
+                    w.deadline = time.monotonic() + self.timeout if self.timeout else float("inf")
+
+            conns = {w.conn: w for w in self.workers if w.conn is not None}
+            for conn in wait(list(conns), timeout=self.tick):
+                w = conns[conn]
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    w.process.join(timeout=1)
+                    code = w.process.exitcode
+                    if w.state == "starting":
+                        start_failures += 1
+                        if start_failures > 2 * len(self.workers):
+                            self.close()
+                            raise RuntimeError(f"watchdog workers for {self.engine_name!r} keep dying at start (exit code {code})")
+                    self._lost(w, f"worker died (exit code {code})", "crashes", pending, failures, retry=False)
+                    continue
+                if msg[0] == "ready":
+                    w.state, w.task = "idle", None
+                    continue
+                task, w.task, w.state = w.task, None, "idle"
+                w.images += 1
+                metrics.inc("watchdog.images")
+                if msg[0] == "ok":
+                    _, img, text, conf = msg
+                    images_annotated[task.index] = img
+                    extracted[task.index] = text
+                    confidences[task.path] = conf
+                else:
+                    metrics.inc("watchdog.errors")
+                    failures[task.index] = msg[1]
+
+            now = time.monotonic()
+            for w in self.workers:
+                if w.state == "starting" and now > w.deadline:
+                    self._lost(w, f"worker did not start in {self.start_timeout:.0f}s", "crashes", pending, failures, retry=False)
+                if w.state != "busy":
+                    continue
+                if now > w.deadline:
+                    self._lost(w, f"timeout after {self.timeout:g}s", "timeouts", pending, failures, retry=True)
+                    continue
+                w.rss_mb = rss_mb(w.process.pid)
+                if w.rss_mb is not None:
+                    metrics.set_gauge(f"watchdog.worker{w.slot}.rss_mb", w.rss_mb)
+                    if self.memory_mb and w.rss_mb > self.memory_mb:
+                        self._lost(w, f"memory {w.rss_mb:.0f} MB > {self.memory_mb:g} MB", "memory_kills", pending, failures, retry=True)
+            self._alive()
+
+        self.last_confidences = confidences
+        self.last_failures = {image_paths[i]: reason for i, reason in failures.items()}
+        return images_annotated, {p: extracted[i] for i, p in enumerate(image_paths)}
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Per worker: pid, state, images served, restarts and last resident memory."""
+        return [
+            {"slot": w.slot, "pid": w.process.pid if w.process is not None else None, "state": w.state,
+             "images": w.images, "restarts": max(w.restarts, 0), "rss_mb": w.rss_mb}
+            for w in self.workers
+        ]
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        for w in self.workers:
+            if w.conn is not None:
+                try:
+                    w.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+        for w in self.workers:
+            if w.process is not None:
+                w.process.join(timeout=5)
+            self._kill(w)
+        self._alive()
+        self._pid = None
+
+    def __enter__(self) -> "Watchdog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="OCR each image in a supervised worker with a time / memory budget")
+    p.add_argument("input_folder", nargs="?", default="input", help="Thư mục chứa ảnh")
+    p.add_argument("--engine", default="paddle", choices=ENGINE_NAMES, help="Engine chạy trong worker")
+    p.add_argument("--workers", type=int, default=1, help="Số worker process")
+    p.add_argument("--timeout", type=float, default=60.0, help="Giới hạn thời gian mỗi ảnh (giây)")
+    p.add_argument("--memory-mb", type=float, default=None, help="Giới hạn RSS mỗi worker (MB, tính cả model)")
+    p.add_argument("--retry-max-side", type=int, default=None, help="Thử lại ảnh quá giới hạn ở cạnh dài này")
+    return p
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = _build_parser().parse_args()
+    files = os.listdir(args.input_folder)
+    image_paths = [
+        os.path.join(args.input_folder, filename)
+        for filename in files
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    with Watchdog(args.engine, workers=args.workers, timeout=args.timeout, memory_mb=args.memory_mb,
+                  retry_max_side=args.retry_max_side, annotate=False) as watchdog:
+        _, dict_extracted = watchdog.predict_multi_and_extract(image_paths)
+        print(dict_extracted)
+        for path, reason in watchdog.last_failures.items():
+            print(f"failed: {path} ({reason})", file=sys.stderr)
+        for row in watchdog.stats():
+            print(row)
+        print(metrics.snapshot())
@@ -0,0 +1,127 @@
+"""Asyncio façade over the blocking OCR engines.
+
+Inference (and the file reads / decodes the engines do) runs in a managed
+thread pool with one worker per engine instance, so the event loop never
+blocks and no thread is spawned per request. Any number of requests can be
+awaited at once; they queue for a free engine without holding a thread.
+
+Example:
+    async with AsyncEngine([Paddle(), Paddle()], max_pending=1000) as ocr:
+        img, extracted = await ocr.predict("input/1.jpg", timeout=30)
+        async for path, img, extracted in ocr.iter_results(paths):
+            ...
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Optional, Sequence, Tuple, Union
+import numpy as np
+from engine import OCREngine
+
+Result = Tuple[Optional[np.ndarray], str]
+
+
+class AsyncEngine:
+    """Bounded-concurrency async API for `OCREngine` instances.
+
+    - concurrency equals the number of engine instances (engines are not
+      thread-safe, so each one serves a single call at a time)
+    - `max_pending` caps requests admitted at once; later callers wait
+    - `timeout` on a call raises `asyncio.TimeoutError`; a timed-out or
+      cancelled call releases its slot immediately, while its engine returns to
+      the pool only once the running inference actually finishes
+    """
+
+    def __init__(self, engines: Union[OCREngine, Sequence[OCREngine]], max_pending: Optional[int] = None) -> None:
+        if not isinstance(engines, (list, tuple)):
+            engines = [engines]
+        if not engines:
+            raise ValueError("AsyncEngine needs at least one engine")
+        self.engines = list(engines)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="ocr")
+        # created inside the running loop (asyncio primitives bind to a loop on older Pythons)
+        self._idle: Optional[asyncio.Queue] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+
+    def _ensure_started(self) -> None:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for engine in self.engines:
+                self._idle.put_nowait(engine)
+            if self.max_pending:
+                self._pending = asyncio.Semaphore(self.max_pending)
+
+    async def _run(self, image_path: str) -> Result:
+        engine = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._executor, engine.predict_multi_and_extract, [image_path])
+        # hand the engine back only when its thread is done, even if the caller gave up
+        fut.add_done_callback(lambda _: self._idle.put_nowait(engine))
+        # shield: cancelling the caller must not mark the still-running future done
+        images_annotated, dict_extracted = await asyncio.shield(fut)
+        img = images_annotated[0] if images_annotated else None
+        return img, dict_extracted.get(image_path, "")
+
+    async def predict(self, image_path: str, timeout: Optional[float] = None) -> Result:
+        """OCR one image; returns `(annotated_image, extracted_str)`."""
+        self._ensure_started()
+        if self._pending is None:
+            return await asyncio.wait_for(self._run(image_path), timeout)
+        async with self._pending:
+            return await asyncio.wait_for(self._run(image_path), timeout)
+
+    async def predict_many(self, image_paths: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Union[Result, BaseException]]:
+        """OCR many images concurrently; failures/timeouts are returned as exception values."""
+        image_paths = list(image_paths)
+        results = await asyncio.gather(
+            *(self.predict(p, timeout) for p in image_paths), return_exceptions=True
+        )
+        return dict(zip(image_paths, results))
+
+    async def iter_results(
+        self, image_paths: Iterable[str], timeout: Optional[float] = None, window: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Optional[np.ndarray], Union[str, BaseException]]]:
+        """Yield `(path, annotated_image, extracted_str_or_exception)` as results complete.
+
+        At most `window` tasks exist at a time (default: `max_pending`, or 4x the
+        engine count), so arbitrarily long inputs use constant memory.
+        """
+        window = window or self.max_pending or 4 * len(self.engines)
+        paths = iter(image_paths)
+        in_flight: Dict[asyncio.Task, str] = {}
+
+        def refill() -> None:
+            while len(in_flight) < window:
+                path = next(paths, None)
+                if path is None:
+                    return
+                in_flight[asyncio.ensure_future(self.predict(path, timeout))] = path
+
+        refill()
+        try:
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path = in_flight.pop(task)
+                    if task.cancelled():
+                        yield path, None, asyncio.CancelledError()
+                    elif task.exception() is not None:
+                        yield path, None, task.exception()
+                    else:
+                        img, extracted = task.result()
+                        yield path, img, extracted
+                refill()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def close(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> "AsyncEngine":
+        self._ensure_started()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # don't block the loop while in-flight inference drains
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
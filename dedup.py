@@ -0,0 +1,181 @@
+import os
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from image_buffer import ImageBuffer, load_buffers
+
+
+def phash(img: np.ndarray, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """Compute a DCT perceptual hash of an image as a `hash_size * hash_size`-bit int.
+
+    The hash survives re-encoding, resizing and small crops, so near-identical
+    uploads land within a small Hamming distance of each other.
+    """
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    side = hash_size * highfreq_factor
+    small = cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    # compare against the median, ignoring the DC term which only encodes brightness
+    bits = (low > np.median(low.flatten()[1:])).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_usable(result: str) -> bool:
+    """Whether an extraction is worth reusing: not a failure ("") and not an empty field dict."""
+    return result not in ("", "{}")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance.
+
+    Each node is `[hash, value, {distance: child}]`; radius queries only visit
+    children whose edge distance lies within `d - radius .. d + radius`.
+    """
+
+    def __init__(self) -> None:
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, h: int, value: Any) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [h, value, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1] = value
+                self.size -= 1
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, value, {}]
+                return
+            node = child
+
+    def nearest(self, h: int, radius: int) -> Optional[Tuple[int, Any]]:
+        """Return `(distance, value)` of the closest stored hash within `radius`, or None."""
+        if self.root is None:
+            return None
+        best: Optional[Tuple[int, Any]] = None
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius and (best is None or d < best[0]):
+                best = (d, node[1])
+                if d == 0:
+                    break
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return best
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class Deduplicator:
+    """Dedup stage in front of `Paddle` / `Easy` / `PaddleEasy`.
+
+    Every image is hashed with `phash`; images within `threshold` bits of a
+    previously processed one (or of an earlier image in the same batch) reuse
+    the stored extraction instead of running OCR again. Reused images are
+    returned un-annotated since no boxes are kept for them.
+
+    Only usable extractions are indexed: unreadable images, empty results and
+    images the engine reports in `last_failures` / `last_rejections` are run
+    again next time. Failures are passed on in `last_failures`, together with
+    the same-batch duplicates that would have reused them.
+    """
+
+    def __init__(self, engine, threshold: int = 5, hash_size: int = 8) -> None:
+        self.engine = engine
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.index = BKTree()
+        self.batch_stats: List[Dict[str, int]] = []
+        self.last_failures: Dict[str, str] = {}
+
+    @property
+    def last_skipped(self) -> int:
+        return self.batch_stats[-1]["skipped"] if self.batch_stats else 0
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        dict_extracted: Dict[str, str] = {}
+        self.last_failures = {}
+        # decoded once here and handed to the engine, which then skips its own decode
+        decoded: Dict[str, ImageBuffer] = {}
+        hashes: Dict[str, int] = {}
+        # image path -> path of the representative whose result it reuses
+        reuse_from: Dict[str, str] = {}
+        to_run: List[str] = []
+        batch_index = BKTree()
+
+        for img_path, buf in zip(image_paths, load_buffers(image_paths, buffers, max_side=getattr(self.engine, "decode_max_side", None))):
+            if buf is None:
+                dict_extracted[img_path] = ""
+                continue
+            decoded[img_path] = buf
+            h = phash(buf.gray, self.hash_size)
+            hashes[img_path] = h
+
+            hit = self.index.nearest(h, self.threshold)
+            if hit is not None:
+                dict_extracted[img_path] = hit[1]
+                continue
+            hit = batch_index.nearest(h, self.threshold)
+            if hit is not None:
+                reuse_from[img_path] = hit[1]
+                continue
+            batch_index.add(h, img_path)
+            to_run.append(img_path)
+
+        annotated_by_path: Dict[str, np.ndarray] = {}
+        if to_run:
+            images_annotated, extracted = self.engine.predict_multi_and_extract(
+                to_run, buffers=[decoded[p] for p in to_run])
+            annotated_by_path = dict(zip(to_run, images_annotated))
+            self.last_failures = dict(getattr(self.engine, "last_failures", {}))
+            rejected = getattr(self.engine, "last_rejections", {})
+            for img_path in to_run:
+                result = extracted.get(img_path, "")
+                dict_extracted[img_path] = result
+                if is_usable(result) and img_path not in self.last_failures and img_path not in rejected:
+                    self.index.add(hashes[img_path], result)
+        for img_path, rep in reuse_from.items():
+            dict_extracted[img_path] = dict_extracted[rep]
+            if rep in self.last_failures:
+                self.last_failures[img_path] = self.last_failures[rep]
+
+        images_annotated = [
+            annotated_by_path[p] if p in annotated_by_path else (decoded[p].bgr if p in decoded else None)
+            for p in image_paths
+        ]
+        self.batch_stats.append({
+            "total": len(image_paths),
+            "skipped": len(decoded) - len(to_run),
+        })
+        # keep the caller's ordering of keys
+        return images_annotated, {p: dict_extracted[p] for p in image_paths}
+
+
+if __name__ == "__main__":
+    from Paddle import Paddle
+
+    dedup = Deduplicator(Paddle())
+    input_folder = "input"
+    files = os.listdir(input_folder)
+    image_paths = [
+        os.path.join(input_folder, filename)
+        for filename in files
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    images_annotated, dict_extracted = dedup.predict_multi_and_extract(image_paths)
+    print(dict_extracted)
+    print(f"Skipped {dedup.last_skipped}/{len(image_paths)} near-duplicate images")
@@ -0,0 +1,70 @@
+import numpy as np
+from typing import Dict, List, Optional, Protocol, Tuple, runtime_checkable
+from image_buffer import ImageBuffer
+
+
+@runtime_checkable
+class OCREngine(Protocol):
+    """Interface shared by `Paddle`, `Easy`, `PaddleEasy` and the wrappers built on them.
+
+    `predict_multi_and_extract` returns `(images_annotated, dict_extracted)`:
+      - images_annotated: one BGR image per input path, in input order
+        (None for inputs that could not be read)
+      - dict_extracted: input path -> stringified dict from `post_process`
+        ("" for inputs that could not be read)
+
+    `buffers`, when given, are already-decoded `ImageBuffer`s aligned with
+    `image_paths` (None = unreadable); engines then skip decoding entirely.
+
+    `Paddle`, `Easy` and `PaddleEasy` also take `sink=` (see `sinks.py`) to stream
+    annotated images out as they are drawn instead of returning them.
+    """
+
+    def predict_multi_and_extract(
+        self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None
+    ) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        ...
+
+
+ENGINE_NAMES = ("paddle", "easyocr", "paddleeasy", "cascade", "scheduler")
+
+# What the CLI (main.py) builds by default: the original `PaddleOCR(use_doc_*=False, ...)`
+# with the library's models (PP-OCRv5 server det + server rec, downloaded on first use)
+# and thresholds, rather than `Paddle()`'s local model directories and mobile recognizer.
+CLI_ENGINE_KWARGS: Dict[str, Dict[str, object]] = {
+    "paddle": {
+        "text_detection_model_name": None,
+        "text_recognition_model_name": None,
+        "text_detection_model_dir": None,
+        "text_recognition_model_dir": None,
+        "text_det_unclip_ratio": None,
+        "text_det_box_thresh": None,
+        "text_det_thresh": None,
+    },
+}
+
+
+def cli_engine_kwargs(name: str) -> Dict[str, object]:
+    """Constructor kwargs main.py passes for engine `name` (empty: the engine's own defaults)."""
+    return dict(CLI_ENGINE_KWARGS.get(name.lower(), {}))
+
+
+def create_engine(name: str = "paddle", **kwargs) -> OCREngine:
+    """Build an engine by name; imports are lazy so only the needed backend is loaded."""
+    name = name.lower()
+    if name == "paddle":
+        from Paddle import Paddle
+        return Paddle(**kwargs)
+    if name in ("easyocr", "easy"):
+        from Easy import Easy
+        return Easy(**kwargs)
+    if name == "paddleeasy":
+        from PaddleEasy import PaddleEasy
+        return PaddleEasy(**kwargs)
+    if name == "cascade":
+        from Cascade import Cascade
+        return Cascade.default(**kwargs)
+    if name == "scheduler":
+        from Scheduler import Scheduler
+        return Scheduler.default(**kwargs)
+    raise ValueError(f"Unknown engine '{name}'. Use one of: {', '.join(ENGINE_NAMES)}")
@@ -0,0 +1,180 @@
+"""Streaming columnar export of extraction results (CSV / Parquet).
+
+One typed column per field instead of a stringified dict per image:
+dates as ISO dates, band as a number, plus a confidence column per field
+and the per-image OCR time. Rows are written as they arrive (CSV) or in
+row groups of `row_group_size` (Parquet, needs `pyarrow`), so memory stays
+constant whatever the number of records.
+
+Usage:
+  python export.py results.db results.parquet        # from a ResultStore
+  python export.py output.json results.csv           # from the legacy JSON output
+  python main.py input output.json --export results.parquet
+"""
+import os
+import csv
+import json
+import argparse
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from result_store import ResultStore, is_store_path, normalize_date
+from utils import FIELDS, parse_extracted
+
+# field -> (column name, type): "date" | "float" | "str"
+FIELD_COLUMNS = {
+    "date": ("date", "date"),
+    "family name": ("family_name", "str"),
+    "first name": ("first_name", "str"),
+    "candidate id": ("candidate_id", "str"),
+    "date of birth": ("date_of_birth", "date"),
+    "sex (m/f)": ("sex", "str"),
+    "band": ("band", "float"),
+    "date end": ("date_end", "date"),
+}
+COLUMNS: List[Tuple[str, str]] = (
+    [("image_path", "str")]
+    + [FIELD_COLUMNS[f] for f in FIELDS]
+    + [(f"conf_{FIELD_COLUMNS[f][0]}", "float") for f in FIELDS]
+    + [("seconds", "float")]
+)
+
+Record = Tuple[str, Any, Optional[Dict[str, float]], Optional[float]]
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def to_row(image_path: str, extracted: Any, confidences: Optional[Dict[str, float]] = None,
+           seconds: Optional[float] = None) -> Dict[str, Any]:
+    """Typed row for one image; values that don't parse (dates, band) become None."""
+    fields = parse_extracted(extracted)
+    confidences = confidences or {}
+    row: Dict[str, Any] = {"image_path": image_path, "seconds": seconds}
+    for f in FIELDS:
+        name, kind = FIELD_COLUMNS[f]
+        value = fields.get(f)
+        if value is None:
+            row[name] = None
+        elif kind == "date":
+            iso = normalize_date(value)
+            row[name] = date.fromisoformat(iso) if iso else None
+        elif kind == "float":
+            row[name] = _to_float(value)
+        else:
+            row[name] = str(value)
+        row[f"conf_{name}"] = _to_float(confidences[f]) if f in confidences else None
+    return row
+
+
+class CsvWriter:
+    def __init__(self, path: str) -> None:
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow([name for name, _ in COLUMNS])
+        self.rows = 0
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self._writer.writerow([
+            "" if row.get(name) is None else (row[name].isoformat() if kind == "date" else row[name])
+            for name, kind in COLUMNS
+        ])
+        self.rows += 1
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "CsvWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ParquetWriter:
+    """Buffers `row_group_size` rows column-wise, then writes them as one row group."""
+
+    def __init__(self, path: str, row_group_size: int = 10000) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+        self._pa = pa
+        types = {"str": pa.string(), "date": pa.date32(), "float": pa.float64()}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.row_group_size = row_group_size
+        self._columns: Dict[str, List[Any]] = {name: [] for name, _ in COLUMNS}
+        self._pending = 0
+        self.rows = 0
+
+    def write(self, row: Dict[str, Any]) -> None:
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        self._pending += 1
+        self.rows += 1
+        if self._pending >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        table = self._pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._columns = {name: [] for name in self._columns}
+        self._pending = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ParquetWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_writer(path: str, row_group_size: int = 10000):
+    """`.parquet` / `.pq` -> ParquetWriter, anything else -> CsvWriter."""
+    if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+        return ParquetWriter(path, row_group_size)
+    return CsvWriter(path)
+
+
+def export_records(records: Iterable[Record], out_path: str, row_group_size: int = 10000) -> int:
+    """Write `(image_path, extracted, confidences, seconds)` records; returns the row count."""
+    with open_writer(out_path, row_group_size) as writer:
+        for image_path, extracted, confidences, seconds in records:
+            writer.write(to_row(image_path, extracted, confidences, seconds))
+        return writer.rows
+
+
+def iter_source(path: str) -> Iterable[Record]:
+    """Records of a ResultStore (streamed) or of a legacy `save_output` JSON file."""
+    if is_store_path(path):
+        with ResultStore(path) as store:
+            for r in store.iter_records():
+                yield r["image_path"], r["fields"], None, None
+        return
+    with open(path, encoding="utf-8") as f:
+        for image_path, extracted in json.load(f).items():
+            yield image_path, extracted, None, None
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Export OCR results as typed columns (CSV / Parquet)")
+    p.add_argument("source", help="ResultStore (.db/.sqlite) or legacy output JSON")
+    p.add_argument("output", help="Output .csv or .parquet")
+    p.add_argument("--row-group-size", type=int, default=10000, help="Rows per Parquet row group (default: 10000)")
+    return p
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
+    n = export_records(iter_source(args.source), args.output, args.row_group_size)
+    print(f"exported {n} rows to {args.output}")
@@ -0,0 +1,162 @@
+"""Decode-once image buffers shared by detection, recognition and annotation.
+
+Each input is decoded exactly once into an `ImageBuffer`; the grayscale view
+EasyOCR recognition and the skew pre-check need is computed on first use and
+cached. Wrappers that run several engines on the same images (Cascade,
+Deduplicator) decode up front and pass the buffers down with
+`predict_multi_and_extract(image_paths, buffers=...)`.
+
+JPEGs much larger than `max_side` are decoded at 1/2, 1/4 or 1/8 resolution
+(`IMREAD_REDUCED_*`, libjpeg's DCT scaling): the header gives the size first,
+and the reduced decode does a fraction of the work and memory of a full one.
+Engines only do this when given a `decode_max_side` (off by default): boxes
+and annotated images then come back at the decoded resolution, and
+`ImageBuffer.scale` says by how much.
+
+With a sink, engines walk the inputs with `buffer_chunks` and decode one chunk
+at a time, so a long list never has every decoded page in memory at once.
+"""
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+
+_REDUCED = {1: (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE),
+            2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+            4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+            8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8)}
+
+
+def read_header(path: str) -> Optional[Tuple[str, int, int]]:
+    """`(format, width, height)` from a PNG / JPEG header without decoding; None if unknown."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64 * 1024)
+    except OSError:
+        return None
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) >= 24:
+        w, h = struct.unpack(">II", head[16:24])
+        return "png", w, h
+    if head[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(head):
+            if head[i] != 0xFF:
+                i += 1
+                continue
+            marker = head[i + 1]
+            # SOF0..SOF15 carry the frame size; C4 / C8 / CC are DHT / JPG / DAC
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack(">HH", head[i + 5:i + 9])
+                return "jpeg", w, h
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            i += 2 + struct.unpack(">H", head[i + 2:i + 4])[0]
+    return None
+
+
+def reduction_factor(path: str, max_side: Optional[int]) -> int:
+    """Largest of 1/2/4/8 that keeps the decoded long side >= `max_side` (JPEG only)."""
+    if not max_side:
+        return 1
+    header = read_header(path)
+    # PNG and others: OpenCV would decode fully and resize, nothing saved
+    if header is None or header[0] != "jpeg":
+        return 1
+    long_side = max(header[1], header[2])
+    factor = 1
+    while factor < 8 and long_side // (factor * 2) >= max_side:
+        factor *= 2
+    return factor
+
+
+def imread_reduced(path: str, max_side: Optional[int] = None, gray: bool = False) -> Tuple[Optional[np.ndarray], float]:
+    """`cv2.imread` at the smallest JPEG scale still >= `max_side`; returns `(img, scale)`."""
+    factor = reduction_factor(path, max_side)
+    img = cv2.imread(path, _REDUCED[factor][1 if gray else 0])
+    return img, 1.0 / factor
+
+
+class ImageBuffer:
+    """BGR pixels of one input plus a lazily cached grayscale view.
+
+    `shared=True` marks a buffer that other consumers will read after this
+    engine; drawing then goes to a copy (`canvas()`) instead of the pixels.
+
+    `scale` is decoded pixels per original pixel (0.5 after a 1/2 reduced
+    decode).
+    """
+
+    __slots__ = ("path", "bgr", "shared", "scale", "_gray")
+
+    def __init__(self, path: str, bgr: np.ndarray, shared: bool = False, scale: float = 1.0) -> None:
+        self.path = path
+        self.bgr = bgr
+        self.shared = shared
+        self.scale = scale
+        self._gray: Optional[np.ndarray] = None
+
+    @classmethod
+    def load(cls, path: str, shared: bool = False, max_side: Optional[int] = None) -> Optional["ImageBuffer"]:
+        bgr, scale = imread_reduced(path, max_side)
+        return cls(path, bgr, shared, scale) if bgr is not None else None
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = self.bgr if self.bgr.ndim == 2 else cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def drop_gray(self) -> None:
+        """Free the cached grayscale view once no crop needs it anymore."""
+        self._gray = None
+
+    def release(self) -> None:
+        """Drop every reference to the pixels (the annotated copy may live on in a sink)."""
+        self.bgr = None
+        self._gray = None
+
+    def canvas(self) -> np.ndarray:
+        """Image to draw annotations on: the pixels themselves unless the buffer is shared."""
+        return self.bgr.copy() if self.shared else self.bgr
+
+    @property
+    def nbytes(self) -> int:
+        return self.bgr.nbytes + (self._gray.nbytes if self._gray is not None and self._gray is not self.bgr else 0)
+
+
+def load_buffers(
+    image_paths: Sequence[str],
+    buffers: Optional[Sequence[Optional[ImageBuffer]]] = None,
+    shared: bool = False,
+    max_side: Optional[int] = None,
+) -> List[Optional[ImageBuffer]]:
+    """Caller-provided buffers (aligned with `image_paths`) if given, else decode each path once
+    (reduced for JPEGs well above `max_side`).
+
+    None entries mark unreadable inputs.
+    """
+    if buffers is not None:
+        if len(buffers) != len(image_paths):
+            raise ValueError("buffers must be aligned with image_paths")
+        return list(buffers)
+    return [ImageBuffer.load(p, shared, max_side) for p in image_paths]
+
+
+def buffer_chunks(
+    image_paths: Sequence[str],
+    buffers: Optional[Sequence[Optional[ImageBuffer]]] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[Tuple[List[str], Optional[List[Optional[ImageBuffer]]]]]:
+    """Aligned `(paths, buffers)` slices of at most `chunk_size` inputs (None: a single slice).
+
+    Nothing is decoded here: pass each slice to `load_buffers` when it is reached.
+    """
+    if buffers is not None and len(buffers) != len(image_paths):
+        raise ValueError("buffers must be aligned with image_paths")
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    step = chunk_size or max(len(image_paths), 1)
+    for start in range(0, len(image_paths), step):
+        yield (list(image_paths[start:start + step]),
+               list(buffers[start:start + step]) if buffers is not None else None)
@@ -19,6 +19,8 @@ from typing import Optional
 import cv2
 import numpy as np
 import argparse
+from profiler import add_profile_argument, profiled, stage
+from image_buffer import imread_reduced
 
 
 def threshold_dark_to_white(img: np.ndarray, threshold: int = 30) -> np.ndarray:
@@ -43,12 +45,14 @@ def threshold_dark_to_white(img: np.ndarray, threshold: int = 30) -> np.ndarray:
     return out
 
 
-def process_path(input_path: str, output_path: Optional[str], threshold: int = 30, inplace: bool = False) -> None:
+def process_path(input_path: str, output_path: Optional[str], threshold: int = 30, inplace: bool = False,
+                 max_side: Optional[int] = None) -> None:
     """Process a single file or a directory.
 
     - If `input_path` is a file: process and save to `output_path` (or overwrite if inplace True).
     - If `input_path` is a directory: process all image files and save into `output_path` directory
       (or overwrite files in-place when `inplace=True`).
+    - `max_side`: JPEGs at least twice this size are decoded (and written) at 1/2, 1/4 or 1/8 scale.
     """
     if os.path.isdir(input_path):
         # directory mode
@@ -62,12 +66,17 @@ def process_path(input_path: str, output_path: Optional[str], threshold: int = 3
                 continue
             src = os.path.join(input_path, fn)
             dst = os.path.join(out_dir, fn) if not inplace else src
-            img = cv2.imread(src)
+            with stage("decode"):
+                img, scale = imread_reduced(src, max_side)
             if img is None:
                 print(f"Warning: cannot read {src}, skipping")
                 continue
-            proc = threshold_dark_to_white(img, threshold=threshold)
-            ok = cv2.imwrite(dst, proc)
+            if scale != 1.0:
+                print(f"{src}: decoded at scale {scale:g}")
+            with stage("threshold"):
+                proc = threshold_dark_to_white(img, threshold=threshold)
+            with stage("encode"):
+                ok = cv2.imwrite(dst, proc)
             if not ok:
                 print(f"Failed to write {dst}")
     else:
@@ -75,9 +84,11 @@ def process_path(input_path: str, output_path: Optional[str], threshold: int = 3
         if not os.path.exists(input_path):
             raise FileNotFoundError(input_path)
         dst = input_path if inplace or output_path is None else output_path
-        img = cv2.imread(input_path)
+        img, scale = imread_reduced(input_path, max_side)
         if img is None:
             raise RuntimeError(f"Cannot read image: {input_path}")
+        if scale != 1.0:
+            print(f"{input_path}: decoded at scale {scale:g}")
         proc = threshold_dark_to_white(img, threshold=threshold)
         ok = cv2.imwrite(dst, proc)
         if not ok:
@@ -90,11 +101,14 @@ def _build_parser() -> argparse.ArgumentParser:
     p.add_argument("--output", required=False, help="Output file or directory (optional)")
     p.add_argument("--threshold", type=int, default=30, help="Intensity threshold (0-255). Pixels with intensity < threshold become white")
     p.add_argument("--inplace", action="store_true", help="Overwrite input files (file or directory)")
+    p.add_argument("--max-side", type=int, default=None, help="Decode large JPEGs at reduced scale, keeping the long side >= this")
+    add_profile_argument(p)
     return p
 
 
 if __name__ == "__main__":
     parser = _build_parser()
     args = parser.parse_args()
-    process_path(args.input, args.output, threshold=args.threshold, inplace=args.inplace)
+    with profiled(args.profile, args.profile_interval):
+        process_path(args.input, args.output, threshold=args.threshold, inplace=args.inplace, max_side=args.max_side)
     print("Processing complete")
@@ -0,0 +1,147 @@
+"""Geometry-aware key -> value linking.
+
+`utils.post_process` reads a field's value as the next string of a flat text
+list, which only works once boxes are grouped into lines in reading order and
+breaks on two-column layouts. Here a uniform grid is built over the page's
+boxes once; for each label box the value is the nearest non-label box on the
+same line to its right, or else the nearest one below it. Each query only
+visits the grid cells in that direction, so it does not scan the page.
+
+Works on raw boxes from every engine: polygons (Paddle / Easy) or
+`[x_min, x_max, y_min, y_max]` boxes (PaddleEasy), in any order.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from utils import FIELDS, is_equivalent, post_process_with_scores, pre, to_quad
+
+
+def _matches(key: str, text: str) -> bool:
+    """Same label test as `post_process_with_scores`."""
+    if abs(len(text) - len(key)) >= 10:
+        return False
+    return key in text or is_equivalent(key, text)
+
+
+class BoxIndex:
+    """Uniform grid over axis-aligned box extents; cell size ~ 2x the median text height."""
+
+    def __init__(self, boxes: Sequence) -> None:
+        quads = [to_quad(b) for b in boxes]
+        if quads:
+            pts = np.stack(quads)
+            self.aabb = np.concatenate([pts.min(axis=1), pts.max(axis=1)], axis=1)  # x0, y0, x1, y1
+        else:
+            self.aabb = np.zeros((0, 4), np.float32)
+        heights = self.aabb[:, 3] - self.aabb[:, 1]
+        self.cell = float(max(np.median(heights) * 2, 1.0)) if len(heights) else 1.0
+        self.grid: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x0, y0, x1, y1) in enumerate(self.aabb):
+            for gy in range(self._c(y0), self._c(y1) + 1):
+                for gx in range(self._c(x0), self._c(x1) + 1):
+                    self.grid.setdefault((gx, gy), []).append(i)
+
+    def _c(self, v: float) -> int:
+        return int(v // self.cell)
+
+    def _collect(self, x0: float, y0: float, x1: float, y1: float) -> set:
+        found = set()
+        for gy in range(self._c(y0), self._c(y1) + 1):
+            for gx in range(self._c(x0), self._c(x1) + 1):
+                found.update(self.grid.get((gx, gy), ()))
+        return found
+
+    def right_of(self, i: int, max_gap: float, exclude: set) -> Optional[int]:
+        """Nearest box starting right of box `i` that shares its text line."""
+        x0, y0, x1, y1 = self.aabb[i]
+        h = y1 - y0
+        best, best_gap = None, max_gap
+        for j in self._collect(x1 - 0.25 * h, y0, x1 + max_gap, y1):
+            if j == i or j in exclude:
+                continue
+            bx0, by0, bx1, by1 = self.aabb[j]
+            overlap = min(y1, by1) - max(y0, by0)
+            if overlap < 0.5 * min(h, by1 - by0) or bx0 < x1 - 0.25 * h:
+                continue
+            gap = bx0 - x1
+            if gap < best_gap:
+                best, best_gap = j, gap
+        return best
+
+    def below(self, i: int, max_gap: float, exclude: set) -> Optional[int]:
+        """Nearest box under box `i` that overlaps its column (left edges count more than gaps)."""
+        x0, y0, x1, y1 = self.aabb[i]
+        h = y1 - y0
+        slack = h
+        best, best_cost = None, None
+        for j in self._collect(x0 - slack, y1 - 0.25 * h, x1 + slack, y1 + max_gap):
+            if j == i or j in exclude:
+                continue
+            bx0, by0, bx1, by1 = self.aabb[j]
+            if by0 < y1 - 0.25 * h or by0 - y1 > max_gap:
+                continue
+            if bx1 < x0 - slack or bx0 > x1 + slack:
+                continue
+            cost = (by0 - y1) + 0.5 * abs(bx0 - x0)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = j, cost
+        return best
+
+
+def link_fields(boxes: Sequence, texts: Sequence[str], scores: Optional[Sequence[float]] = None,
+                right_gap: float = 8.0, below_gap: float = 3.0) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Link every field label to its value box; gaps are in multiples of the label's height.
+
+    Returns `(fields, confidences)` like `post_process_with_scores`; fields whose
+    label or value is not found are left out.
+    """
+    if scores is None:
+        scores = [1.0] * len(texts)
+    index = BoxIndex(boxes)
+    normalized = [pre(str(t)) for t in texts]
+    # top-to-bottom, left-to-right: "first matching label" means the same thing as in reading order
+    order = sorted(range(len(texts)), key=lambda i: (index.aabb[i, 1], index.aabb[i, 0]))
+
+    labels: Dict[str, int] = {}
+    for k in FIELDS:
+        if k == "date end":
+            continue
+        key = pre(k)
+        for i in order:
+            if _matches(key, normalized[i]):
+                labels[k] = i
+                break
+    # like post_process: "date end" is the value of the last box mentioning a date
+    last_date = [i for i in order if "date" in normalized[i]]
+    if last_date:
+        labels["date end"] = last_date[-1]
+
+    # a value is never another field's label
+    label_boxes = {i for i in range(len(texts)) if any(_matches(pre(k), normalized[i]) for k in FIELDS)}
+
+    out, conf = {}, {}
+    for k, i in labels.items():
+        h = float(index.aabb[i, 3] - index.aabb[i, 1]) or 1.0
+        j = index.right_of(i, right_gap * h, label_boxes)
+        if j is None:
+            j = index.below(i, below_gap * h, label_boxes)
+        if j is not None:
+            out[k] = str(texts[j])
+            conf[k] = float(scores[j])
+    return out, conf
+
+
+def extract_fields(boxes: Sequence, texts: Sequence[str], scores: Optional[Sequence[float]] = None,
+                   linker: str = "spatial") -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Engine entry point: `linker="spatial"` links by geometry and falls back to the
+    sequential `texts[ind+1]` reading for fields it could not link; `"sequential"` is the old behaviour."""
+    seq_out, seq_conf = post_process_with_scores(np.array(texts), scores)
+    if linker == "sequential":
+        return seq_out, seq_conf
+    out, conf = link_fields(boxes, texts, scores)
+    for k, v in seq_out.items():
+        if k not in out:
+            out[k] = v
+            conf[k] = seq_conf[k]
+    # keep the FIELDS order the rest of the code prints in
+    ordered = {k: out[k] for k in FIELDS if k in out}
+    return ordered, {k: conf[k] for k in ordered}
@@ -0,0 +1,308 @@
+"""Load test with synthetic IELTS-style certificates and latency SLO checks.
+
+Renders randomized certificates (names, IDs, dates, bands, noise, rotation)
+with OpenCV, then replays them as open-loop Poisson arrivals at a fixed rate,
+either against in-process engines or against a running OCR server. Reports
+throughput, p50/p95/p99/max latency, queueing delay, error rate, field
+accuracy and RSS over time; exits non-zero when an SLO is breached.
+
+Usage:
+  python loadtest.py --engine paddle --instances 2 --rate 1.5 --duration 60 --slo-p95 3
+  python loadtest.py --endpoint 127.0.0.1:8765 --concurrency 8 --rate 4 --duration 120 --slo-p99 5
+  python loadtest.py --generate-only synthetic --count 200   # also writes labels.json for sweep.py
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from utils import parse_extracted
+from sweep import field_accuracy
+
+FAMILY_NAMES = ["NGUYEN", "TRAN", "LE", "PHAM", "HOANG", "HUYNH", "PHAN", "VU", "VO", "DANG", "BUI", "DO", "SMITH", "GARCIA"]
+FIRST_NAMES = ["VAN AN", "THI BINH", "MINH CHAU", "DUC DUNG", "THU HA", "QUOC HUY", "NGOC LAN", "HOANG LONG", "JOHN", "MARIA"]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+def _fmt_date(d: date) -> str:
+    return f"{d.day:02d}/{MONTHS[d.month - 1]}/{d.year}"
+
+
+def random_fields(rng: random.Random) -> Dict[str, str]:
+    test_date = date(2020, 1, 1) + timedelta(days=rng.randrange(0, 365 * 5))
+    birth = date(1980, 1, 1) + timedelta(days=rng.randrange(0, 365 * 25))
+    return {
+        "date": _fmt_date(test_date),
+        "family name": rng.choice(FAMILY_NAMES),
+        "first name": rng.choice(FIRST_NAMES),
+        "candidate id": f"{rng.randrange(0, 10**6):06d}",
+        "date of birth": _fmt_date(birth),
+        "sex (m/f)": rng.choice("MF"),
+        "band": f"{rng.randrange(8, 19) / 2:.1f}",
+        "date end": _fmt_date(test_date + timedelta(days=13)),
+    }
+
+
+# label text on the form, in reading order, for every field in utils.FIELDS
+FORM_LABELS = [
+    ("date", "Date"),
+    ("family name", "Family Name"),
+    ("first name", "First Name"),
+    ("candidate id", "Candidate ID"),
+    ("date of birth", "Date of Birth"),
+    ("sex (m/f)", "Sex (M/F)"),
+    ("band", "Overall Band Score"),
+    ("date end", "Date End"),
+]
+
+
+def render_certificate(rng: random.Random, width: int = 1240, height: int = 1754,
+                       max_rotation: float = 4.0, noise: float = 8.0) -> Tuple[np.ndarray, Dict[str, str]]:
+    """One synthetic Test Report Form page (BGR) and its ground-truth fields."""
+    fields = random_fields(rng)
+    img = np.full((height, width, 3), 250, np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    cv2.putText(img, "IELTS", (80, 140), font, 2.4, (30, 30, 140), 5)
+    cv2.putText(img, "Test Report Form", (420, 140), font, 1.6, (20, 20, 20), 3)
+    cv2.line(img, (80, 190), (width - 80, 190), (120, 120, 120), 2)
+
+    y = 300
+    for key, label in FORM_LABELS:
+        x = 100 + rng.randrange(-10, 10)
+        cv2.putText(img, label, (x, y), font, 1.0, (60, 60, 60), 2)
+        # value on the next text line, like the real form's value boxes
+        cv2.putText(img, fields[key], (x + 20, y + 60), font, 1.3, (0, 0, 0), 3)
+        y += 160 + rng.randrange(-10, 10)
+
+    if noise:
+        img = np.clip(img + np.random.default_rng(rng.randrange(2**32)).normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+    if rng.random() < 0.5:
+        img = cv2.GaussianBlur(img, (3, 3), 0)
+    if max_rotation:
+        angle = rng.uniform(-max_rotation, max_rotation)
+        M = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        img = cv2.warpAffine(img, M, (width, height), borderValue=(250, 250, 250))
+    return img, fields
+
+
+def generate(out_dir: str, count: int, seed: int = 0, **render_kwargs) -> Tuple[List[str], Dict[str, Dict[str, str]]]:
+    """Write `count` certificates as JPEGs plus `labels.json` (the format sweep.py reads)."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths, labels = [], {}
+    for i in range(count):
+        img, fields = render_certificate(rng, **render_kwargs)
+        name = f"synthetic_{i:05d}.jpg"
+        path = os.path.join(out_dir, name)
+        cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        paths.append(path)
+        labels[name] = fields
+    with open(os.path.join(out_dir, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump(labels, f, indent=2)
+    return paths, labels
+
+
+def rss_mb(pid: Optional[int] = None, include_children: bool = False) -> float:
+    """Resident set size from /proc (Linux); 0.0 where unavailable."""
+    pid = pid or os.getpid()
+    pids = [pid]
+    if include_children:
+        try:
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    pids += [int(c) for c in f.read().split()]
+        except OSError:
+            pass
+    total = 0.0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) / 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class InProcessTarget:
+    """A pool of engine instances; each request waits for an idle one."""
+
+    def __init__(self, engines: List[Any]) -> None:
+        self.concurrency = len(engines)
+        self._idle: "queue.Queue" = queue.Queue()
+        for e in engines:
+            self._idle.put(e)
+
+    def __call__(self, path: str) -> str:
+        engine = self._idle.get()
+        try:
+            _, extracted = engine.predict_multi_and_extract([path])
+            return extracted.get(path, "")
+        finally:
+            self._idle.put(engine)
+
+
+class EndpointTarget:
+    """One `PreforkClient` connection per load-generator thread."""
+
+    def __init__(self, address: str, concurrency: int, timeout: Optional[float] = None) -> None:
+        self.address = address
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self, path: str) -> str:
+        from prefork_server import PreforkClient
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = PreforkClient(self.address, timeout=self.timeout, annotate=False)
+        _, extracted = client.predict_multi_and_extract([path])
+        return extracted.get(path, "")
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_load(target: Callable[[str], str], image_paths: List[str], labels: Dict[str, Dict[str, str]],
+             rate: float, duration: float, seed: int = 0, rss_interval: float = 1.0,
+             rss_pid: Optional[int] = None) -> Dict[str, Any]:
+    """Open-loop Poisson arrivals at `rate` req/s for `duration` s; returns the report dict."""
+    rng = random.Random(seed)
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    rss_samples: List[Tuple[float, float]] = []
+    stop = threading.Event()
+    t0 = time.perf_counter()
+
+    def sample_rss() -> None:
+        while not stop.is_set():
+            rss_samples.append((round(time.perf_counter() - t0, 2), rss_mb(rss_pid, include_children=rss_pid is not None)))
+            stop.wait(rss_interval)
+
+    def one(path: str, arrival: float) -> None:
+        start = time.perf_counter()
+        rec = {"arrival": arrival - t0, "queue_s": start - arrival, "ok": True, "correct": 0, "total": 0}
+        try:
+            extracted = parse_extracted(target(path))
+            rec["correct"], rec["total"] = field_accuracy(extracted, labels.get(os.path.basename(path), {}))
+        except Exception as e:
+            rec["ok"] = False
+            rec["error"] = f"{type(e).__name__}: {e}"
+        rec["latency_s"] = time.perf_counter() - arrival
+        with lock:
+            records.append(rec)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    # the executor queue is unbounded on purpose: arrivals never wait for the system under test
+    with ThreadPoolExecutor(max_workers=target.concurrency) as pool:
+        next_arrival = t0
+        i = 0
+        while next_arrival - t0 < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, image_paths[i % len(image_paths)], next_arrival)
+            i += 1
+            next_arrival += rng.expovariate(rate)
+    wall = time.perf_counter() - t0
+    stop.set()
+    sampler.join()
+
+    ok = [r for r in records if r["ok"]]
+    lat = [r["latency_s"] for r in ok]
+    qd = [r["queue_s"] for r in records]
+    total_fields = sum(r["total"] for r in ok)
+    return {
+        "requests": len(records),
+        "offered_rate": rate,
+        "throughput": len(ok) / wall if wall else 0.0,
+        "latency_s": {
+            "p50": percentile(lat, 50), "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99), "max": max(lat) if lat else 0.0,
+        },
+        "queue_s": {"mean": float(np.mean(qd)) if qd else 0.0, "p95": percentile(qd, 95), "max": max(qd) if qd else 0.0},
+        "error_rate": 1 - len(ok) / len(records) if records else 0.0,
+        "errors": sorted({r["error"] for r in records if not r["ok"]})[:10],
+        "field_accuracy": sum(r["correct"] for r in ok) / total_fields if total_fields else None,
+        "rss_mb": {"peak": max((m for _, m in rss_samples), default=0.0), "samples": rss_samples},
+        "wall_s": wall,
+    }
+
+
+def check_slo(report: Dict[str, Any], p95: Optional[float] = None, p99: Optional[float] = None,
+              max_error_rate: Optional[float] = None) -> List[str]:
+    """Human-readable list of breached SLOs (empty when all hold)."""
+    breaches = []
+    if p95 is not None and report["latency_s"]["p95"] > p95:
+        breaches.append(f"p95 latency {report['latency_s']['p95']:.2f}s > {p95:.2f}s")
+    if p99 is not None and report["latency_s"]["p99"] > p99:
+        breaches.append(f"p99 latency {report['latency_s']['p99']:.2f}s > {p99:.2f}s")
+    if max_error_rate is not None and report["error_rate"] > max_error_rate:
+        breaches.append(f"error rate {report['error_rate']:.3f} > {max_error_rate:.3f}")
+    return breaches
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Synthetic-certificate load test with latency SLOs")
+    p.add_argument("--engine", default="paddle", help="In-process engine (see engine.ENGINE_NAMES)")
+    p.add_argument("--instances", type=int, default=1, help="In-process engine instances (= concurrency)")
+    p.add_argument("--endpoint", default=None, help="Load a running server instead (host:port or unix:/path)")
+    p.add_argument("--concurrency", type=int, default=4, help="Client connections when using --endpoint")
+    p.add_argument("--server-pid", type=int, default=None, help="Sample RSS of this server (and its workers)")
+    p.add_argument("--rate", type=float, default=1.0, help="Arrival rate, requests per second")
+    p.add_argument("--duration", type=float, default=60.0, help="Seconds of arrivals")
+    p.add_argument("--count", type=int, default=50, help="Distinct synthetic certificates to render")
+    p.add_argument("--images-dir", default="synthetic", help="Where synthetic certificates are written")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--generate-only", metavar="DIR", help="Only render certificates + labels.json into DIR")
+    p.add_argument("--slo-p95", type=float, default=None, help="Fail if p95 latency exceeds this (seconds)")
+    p.add_argument("--slo-p99", type=float, default=None, help="Fail if p99 latency exceeds this (seconds)")
+    p.add_argument("--max-error-rate", type=float, default=0.0, help="Fail above this error rate")
+    p.add_argument("--report", default=None, help="Write the full JSON report here")
+    return p
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
+    if args.generate_only:
+        paths, _ = generate(args.generate_only, args.count, args.seed)
+        print(f"Wrote {len(paths)} certificates and labels.json to {args.generate_only}")
+        sys.exit(0)
+
+    image_paths, labels = generate(args.images_dir, args.count, args.seed)
+    if args.endpoint:
+        target = EndpointTarget(args.endpoint, args.concurrency)
+    else:
+        from engine import create_engine
+        target = InProcessTarget([create_engine(args.engine) for _ in range(args.instances)])
+        # warm every instance so model init doesn't count as latency
+        for _ in range(args.instances):
+            target(image_paths[0])
+
+    report = run_load(target, image_paths, labels, args.rate, args.duration, args.seed, rss_pid=args.server_pid)
+    lat, qd = report["latency_s"], report["queue_s"]
+    print(f"requests {report['requests']}  throughput {report['throughput']:.2f}/s (offered {args.rate:.2f}/s)")
+    print(f"latency p50 {lat['p50']:.2f}s  p95 {lat['p95']:.2f}s  p99 {lat['p99']:.2f}s  max {lat['max']:.2f}s")
+    print(f"queueing mean {qd['mean']:.2f}s  p95 {qd['p95']:.2f}s  error rate {report['error_rate']:.3f}")
+    if report["field_accuracy"] is not None:
+        print(f"field accuracy {report['field_accuracy']:.3f}  peak RSS {report['rss_mb']['peak']:.0f}MB")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    breaches = check_slo(report, args.slo_p95, args.slo_p99, args.max_error_rate)
+    for b in breaches:
+        print(f"SLO BREACHED: {b}")
+    sys.exit(1 if breaches else 0)
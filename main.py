@@ -1,28 +1,95 @@
-from paddleocr import PaddleOCR
-import easyocr
-import numpy as np
 import os
+import time
 import argparse
-from typing import List, Dict
+import logging
+from contextlib import ExitStack
+from typing import List, Dict, Optional
 from json import dumps
+from engine import ENGINE_NAMES, OCREngine, cli_engine_kwargs
+from ocr_daemon import get_engine
+from runtime_profiles import PROFILES
+from result_store import ResultStore, is_store_path
+from sinks import open_sink, stream_annotated
+from profiler import add_profile_argument, profiled, stage
+from work_queue import WorkQueue, config_fingerprint, queue_path_for
+from export import export_records
+from Watchdog import Watchdog
+from prefilter import Prefilter
 from utils import *
 
-ocr = PaddleOCR(
-    use_doc_orientation_classify=False,
-    use_doc_unwarping=False,
-    use_textline_orientation=False)
+logger = logging.getLogger(__name__)
 
-def process_ocr(image_paths: List[str]) -> Dict[str, str]:
+
+def process_ocr(image_paths: List[str], engine: OCREngine) -> Dict[str, str]:
     """Xử lý OCR cho nhiều ảnh và trả về kết quả."""
-    results = ocr.predict(input=image_paths)
-    ocr_results = {}
-    for result in results:
-        ocr_results[result["input_path"]] = str(post_process(np.array(result['rec_texts'])))
+    _, ocr_results = engine.predict_multi_and_extract(image_paths)
     return ocr_results
 
 
-def ocr_and_save(input_folder: str, output_filepath: str = "output.json", type: str = "paddle") -> Dict[str, str]:
-    """Thực hiện OCR trên tất cả ảnh trong thư mục và lưu kết quả vào file JSON."""
+def run_queue(engine: OCREngine, wq: WorkQueue, chunk_size: int = 16, sink=None, store: Optional[ResultStore] = None) -> None:
+    """Chạy hết hàng đợi: mỗi nhóm `chunk_size` ảnh được commit ngay khi xong.
+
+    Nhóm bị lỗi được đưa lại hàng đợi (backoff), sau đó thử lại từng ảnh một.
+    Ảnh bị engine báo lỗi riêng (`last_failures`, vd. Watchdog hết giờ) cũng vậy,
+    phần còn lại của nhóm vẫn được lưu."""
+    while True:
+        chunk = wq.claim(chunk_size)
+        if not chunk:
+            wait = wq.next_due()
+            if wait is None:
+                return
+            time.sleep(wait)
+            continue
+        start = time.perf_counter()
+        try:
+            if sink is not None:
+                extracted = stream_annotated(engine, chunk, sink, chunk_size)
+            else:
+                extracted = process_ocr(chunk, engine)
+        except Exception as e:
+            logger.warning("chunk of %d failed: %s", len(chunk), e)
+            wq.fail(chunk, f"{type(e).__name__}: {e}")
+            continue
+        seconds = (time.perf_counter() - start) / len(chunk)
+        failures = getattr(engine, "last_failures", {})
+        for path in failures:
+            extracted.pop(path, None)
+            wq.fail([path], failures[path])
+        with stage("save"):
+            wq.complete(extracted, getattr(engine, "last_confidences", {}), seconds)
+            if store is not None:
+                store.add_many(extracted)
+        logger.info("checkpoint: %s", wq.counts())
+
+
+def ocr_and_save(input_folder: str, output_filepath: str = "output.json", type: str = "paddle", runtime_profile: Optional[str] = None,
+                 annotated_output: Optional[str] = None, chunk_size: int = 16, queue_path: Optional[str] = None,
+                 restart: bool = False, retry_failed: bool = False, max_attempts: int = 3,
+                 export_path: Optional[str] = None, timeout: Optional[float] = None, memory_mb: Optional[float] = None,
+                 workers: int = 1, retry_max_side: Optional[int] = None, prefilter: bool = False) -> Dict[str, str]:
+    """Thực hiện OCR trên tất cả ảnh trong thư mục và lưu kết quả vào file JSON.
+
+    Nếu `output_filepath` có đuôi .db/.sqlite, kết quả được ghi vào ResultStore (SQLite)
+    theo từng nhóm ảnh thay vì ghi lại toàn bộ file JSON.
+
+    `annotated_output` (thư mục hoặc file .zip): ảnh annotate được ghi dần theo từng
+    nhóm `chunk_size` ảnh, không giữ toàn bộ ảnh trong RAM.
+
+    Trạng thái từng ảnh nằm trong hàng đợi SQLite `queue_path` (mặc định
+    `<output>.queue.db`): chạy lại cùng lệnh sau khi bị dừng giữa chừng sẽ tiếp tục
+    từ checkpoint cuối, không làm lại ảnh đã xong. `restart=True` bắt đầu lại từ đầu;
+    `retry_failed=True` thử lại các ảnh đã hết `max_attempts` lần.
+    Hàng đợi tạo với engine / thiết lập khác thì báo ValueError thay vì trả kết quả cũ.
+
+    `export_path` (.csv / .parquet): xuất thêm kết quả dạng cột (mỗi trường một cột,
+    kèm confidence và thời gian), đọc dần từ hàng đợi nên bộ nhớ không đổi.
+
+    `timeout` / `memory_mb`: mỗi ảnh chạy trong worker process có giám sát (`Watchdog`,
+    `workers` process); ảnh vượt giới hạn bị dừng và ghi lỗi, các ảnh khác chạy tiếp.
+    `retry_max_side`: thử lại ảnh vượt giới hạn một lần ở độ phân giải này.
+
+    `prefilter=True`: ảnh không giống IELTS TRF (selfie, trang trắng, tài liệu khác)
+    bị loại trước khi OCR (`prefilter.py`), kết quả rỗng, lý do ghi trong log."""
     files = os.listdir(input_folder)
     image_paths = [
         os.path.join(input_folder, filename) 
@@ -30,8 +97,56 @@ def ocr_and_save(input_folder: str, output_filepath: str = "output.json", type:
         if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
     ]
     
-    ocr_results = process_ocr(image_paths)
-    save_output(ocr_results, output_filepath)
+    queue_path = queue_path or queue_path_for(output_filepath)
+    if restart and os.path.exists(queue_path):
+        os.remove(queue_path)
+    resumed = os.path.exists(queue_path)
+    # kết quả trong hàng đợi chỉ dùng lại được khi cùng engine / thiết lập
+    config = config_fingerprint(engine=type, runtime_profile=runtime_profile, prefilter=prefilter,
+                                retry_max_side=retry_max_side)
+    with WorkQueue(queue_path, max_attempts=max_attempts, config=config) as wq:
+        wq.add(image_paths)
+        requeued = wq.recover(retry_failed)
+        if resumed:
+            logger.info("resuming %s: %s (%d requeued)", queue_path, wq.counts(), requeued)
+
+        if wq.next_due() is not None:
+            with stage("load_model"):
+                # paddle: model / ngưỡng mặc định của thư viện, như PaddleOCR(...) ban đầu
+                engine_kwargs = cli_engine_kwargs(type)
+                if timeout or memory_mb:
+                    engine = Watchdog(type, workers=workers, timeout=timeout, memory_mb=memory_mb,
+                                      retry_max_side=retry_max_side, annotate=bool(annotated_output),
+                                      runtime_profile=runtime_profile, **engine_kwargs)
+                else:
+                    # daemon đang chạy: dùng model đã nạp sẵn; không thì load trong process
+                    engine = get_engine(type, annotate=bool(annotated_output), runtime_profile=runtime_profile,
+                                        **engine_kwargs)
+            with ExitStack() as stack:
+                if isinstance(engine, Watchdog):
+                    stack.callback(engine.close)
+                sink = stack.enter_context(open_sink(annotated_output, append=resumed)) if annotated_output else None
+                store = stack.enter_context(ResultStore(output_filepath)) if is_store_path(output_filepath) else None
+                gate = Prefilter(engine) if prefilter else None
+                run_queue(gate or engine, wq, chunk_size, sink, store)
+                if isinstance(engine, Watchdog):
+                    logger.info("watchdog: %s", engine.stats())
+                if gate is not None:
+                    logger.info("prefilter: %s", gate.stats())
+
+        failures = wq.failures()
+        for path, error in failures.items():
+            logger.warning("failed: %s (%s)", path, error)
+        ocr_results = wq.results(image_paths)
+        if export_path:
+            with stage("export"):
+                wanted = set(image_paths)
+                n = export_records((r for r in wq.iter_done() if r[0] in wanted), export_path)
+            logger.info("exported %d rows to %s", n, export_path)
+
+    if not is_store_path(output_filepath):
+        with stage("save"):
+            save_output(ocr_results, output_filepath)
     return ocr_results
 
 
@@ -49,16 +164,97 @@ if __name__ == "__main__":
         type=str,
         nargs='?',
         default="output.json",
-        help="Đường dẫn đến file JSON đầu ra (mặc định: output.json)"
+        help="Đường dẫn đến file JSON đầu ra, hoặc file .db/.sqlite để lưu vào SQLite (mặc định: output.json)"
     )
     parser.add_argument(
         "type",
         type=str,
         nargs='?',
         default="paddle",
-        help="Loại OCR sử dụng: 'paddle' hoặc 'easyocr' (mặc định: paddle)"
+        choices=ENGINE_NAMES,
+        help="Loại OCR sử dụng: 'paddle', 'easyocr', 'paddleeasy', 'cascade' hoặc 'scheduler' (mặc định: paddle)"
+    )
+    parser.add_argument(
+        "--runtime-profile",
+        choices=list(PROFILES),
+        default=None,
+        help="CPU runtime profile (threads, MKL-DNN, precision); mặc định: $OCR_RUNTIME_PROFILE hoặc runtime_profile.json"
+    )
+    parser.add_argument(
+        "--save-annotated",
+        default=None,
+        help="Thư mục hoặc file .zip để lưu ảnh đã annotate (ghi dần, bộ nhớ giới hạn)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16,
+        help="Số ảnh mỗi nhóm: mỗi lần lấy từ hàng đợi, chạy OCR rồi commit/checkpoint cùng nhau "
+             "(chạy lại sau khi bị dừng chỉ làm lại tối đa một nhóm), cũng là số ảnh mỗi lần khi lưu ảnh annotate "
+             "(mặc định: 16)"
+    )
+    parser.add_argument(
+        "--queue",
+        default=None,
+        help="File hàng đợi SQLite để tiếp tục khi bị dừng giữa chừng (mặc định: <output_file>.queue.db)"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Bỏ hàng đợi cũ, xử lý lại toàn bộ ảnh"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Thử lại các ảnh đã lỗi hết số lần cho phép ở lần chạy trước"
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="Số lần thử tối đa cho mỗi ảnh (mặc định: 3)"
+    )
+    parser.add_argument(
+        "--export",
+        default=None,
+        help="Xuất thêm kết quả dạng cột: file .csv hoặc .parquet (cần pyarrow)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Giới hạn thời gian mỗi ảnh (giây); ảnh chạy trong worker process có giám sát"
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=float,
+        default=None,
+        help="Giới hạn RSS mỗi worker (MB, tính cả model); bật worker process có giám sát"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Số worker process khi dùng --timeout / --memory-mb (mặc định: 1)"
+    )
+    parser.add_argument(
+        "--retry-max-side",
+        type=int,
+        default=None,
+        help="Thử lại ảnh vượt giới hạn một lần với cạnh dài tối đa này (px)"
+    )
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="Loại nhanh ảnh không phải IELTS TRF (selfie, trang trắng, tài liệu khác) trước khi OCR"
     )
+    add_profile_argument(parser)
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     
-    ocr_results = ocr_and_save(args.input_folder, args.output_file, args.type)
+    with profiled(args.profile, args.profile_interval):
+        ocr_results = ocr_and_save(args.input_folder, args.output_file, args.type, args.runtime_profile,
+                                   args.save_annotated, args.chunk_size, args.queue, args.restart,
+                                   args.retry_failed, args.max_attempts, args.export, args.timeout,
+                                   args.memory_mb, args.workers, args.retry_max_side, args.prefilter)
     print(dumps(ocr_results, indent=4)) 
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""Process-wide counters, gauges and info labels.
+
+Kept deliberately small: components call `inc` / `set_gauge` / `set_info`
+and anything that reports (CLI summaries, Streamlit, servers) reads
+`snapshot()`.
+"""
+import threading
+from typing import Any, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_info: Dict[str, Any] = {}
+
+
+def inc(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def set_info(name: str, value: Any) -> None:
+    with _lock:
+        _info[name] = value
+
+
+def get(name: str, default: float = 0) -> float:
+    with _lock:
+        return _counters.get(name, _gauges.get(name, default))
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "info": dict(_info)}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _info.clear()
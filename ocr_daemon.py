@@ -0,0 +1,233 @@
+"""Local OCR daemon: warm engines shared by every CLI run and Streamlit replica.
+
+A long-running process owns loaded `Paddle` / `Easy` / `PaddleEasy` instances
+and answers OCR requests on a Unix domain socket (wire protocol: `wire.py`).
+Short-lived callers connect instead of loading models, so a `python main.py`
+call costs inference time only. Files are sent as their bytes; images the
+caller already decoded travel as raw BGR in a shared-memory block.
+
+Engines are keyed by name + constructor kwargs (JSON values only), loaded on
+first request and kept warm, at most `max_engines` at a time (least recently
+used is dropped). Requests for different engines run in parallel; one engine
+serves one request at a time.
+
+Usage:
+  python ocr_daemon.py --engines paddle,easyocr
+  python ocr_daemon.py --socket /run/ocr.sock --runtime-profile latency
+
+Callers:
+  engine = get_engine("paddle")   # DaemonClient if the daemon answers, else in-process engine
+  OCR_DAEMON=0 disables the daemon lookup; OCR_DAEMON_SOCKET sets the socket path.
+"""
+import os
+import sys
+import json
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import metrics
+from engine import ENGINE_NAMES, OCREngine, create_engine
+from image_buffer import ImageBuffer
+from prefork_server import PreforkClient, handle_predict, warmup_image
+from wire import recv_msg, send_msg
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.environ.get("OCR_DAEMON_SOCKET", os.path.join(tempfile.gettempdir(), "ocr_daemon.sock"))
+
+
+def engine_key(name: str, kwargs: Dict[str, Any]) -> str:
+    """Canonical key for an engine configuration; None-valued kwargs mean "default"."""
+    return json.dumps([name.lower(), {k: v for k, v in sorted(kwargs.items()) if v is not None}])
+
+
+class EngineRegistry:
+    """Warm engines by configuration, each with its own lock, LRU-capped."""
+
+    def __init__(self, max_engines: int = 4, defaults: Optional[Dict[str, Any]] = None, warmup: bool = True) -> None:
+        self.max_engines = max_engines
+        self.defaults = defaults or {}
+        self.warmup = warmup
+        self._engines: "OrderedDict[str, Tuple[OCREngine, threading.Lock]]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, kwargs: Optional[Dict[str, Any]] = None) -> Tuple[OCREngine, threading.Lock]:
+        kwargs = dict(self.defaults, **{k: v for k, v in (kwargs or {}).items() if v is not None})
+        key = engine_key(name, kwargs)
+        with self._lock:
+            if key in self._engines:
+                self._engines.move_to_end(key)
+                return self._engines[key]
+            loading = self._loading.setdefault(key, threading.Lock())
+        # one load per configuration; other configurations keep serving meanwhile
+        with loading:
+            with self._lock:
+                if key in self._engines:
+                    return self._engines[key]
+            logger.info("loading %s", key)
+            engine = create_engine(name, **{k: v for k, v in kwargs.items() if v is not None})
+            if self.warmup:
+                engine.predict_multi_and_extract(["<warmup>"], buffers=[ImageBuffer("<warmup>", warmup_image())])
+            with self._lock:
+                self._engines[key] = (engine, threading.Lock())
+                self._loading.pop(key, None)
+                while len(self._engines) > self.max_engines:
+                    dropped, _ = self._engines.popitem(last=False)
+                    logger.info("dropped %s", dropped)
+                metrics.set_gauge("daemon.engines", len(self._engines))
+                return self._engines[key]
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._engines)
+
+
+class OCRDaemon:
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, engines: Sequence[str] = ("paddle",),
+                 max_engines: int = 4, warmup: bool = True, **engine_defaults) -> None:
+        self.socket_path = socket_path
+        self.preload = list(engines)
+        self.registry = EngineRegistry(max_engines, engine_defaults, warmup)
+        self.sock: Optional[socket.socket] = None
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            while True:
+                try:
+                    header, payload = recv_msg(conn)
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    if header.get("op") == "ping":
+                        response, body = {"ok": True, "worker": os.getpid(), "engines": self.registry.names()}, b""
+                    elif header.get("op") == "predict":
+                        engine, lock = self.registry.get(header.get("engine", "paddle"), header.get("engine_kwargs"))
+                        with lock:
+                            response, body = handle_predict(engine, header, payload)
+                        metrics.inc("daemon.images", len(header.get("images", [])))
+                    else:
+                        raise ValueError(f"unknown op {header.get('op')!r}")
+                except Exception as e:
+                    logger.exception("request failed")
+                    response, body = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+                try:
+                    send_msg(conn, response, body)
+                except OSError:
+                    return
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.socket_path):
+            if daemon_available(self.socket_path):
+                raise RuntimeError(f"a daemon is already serving {self.socket_path}")
+            os.unlink(self.socket_path)  # stale socket of a dead daemon
+        for name in self.preload:
+            self.registry.get(name)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        self.sock.listen(64)
+        logger.info("serving %s on %s", self.registry.names(), self.socket_path)
+        try:
+            while True:
+                conn, _ = self.sock.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.sock.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class DaemonClient(PreforkClient):
+    """`OCREngine` served by the daemon; decoded buffers go through shared memory."""
+
+    def __init__(self, engine: str = "paddle", socket_path: str = DEFAULT_SOCKET, annotate: bool = True,
+                 timeout: Optional[float] = None, use_shm: bool = True, **engine_kwargs) -> None:
+        super().__init__("unix:" + socket_path, timeout=timeout, annotate=annotate)
+        self.engine = engine
+        self.engine_kwargs = engine_kwargs
+        self.use_shm = use_shm
+        self._blocks: List[shared_memory.SharedMemory] = []
+
+    def _predict_header(self) -> Dict[str, Any]:
+        return dict(super()._predict_header(), engine=self.engine, engine_kwargs=self.engine_kwargs)
+
+    def _pack(self, path: str, buf: Optional[ImageBuffer], has_buffers: bool) -> Tuple[Dict[str, Any], bytes]:
+        if not self.use_shm or buf is None or buf.bgr is None:
+            return super()._pack(path, buf, has_buffers)
+        img = np.ascontiguousarray(buf.bgr)
+        shm = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+        self._blocks.append(shm)
+        np.ndarray(img.shape, np.uint8, buffer=shm.buf)[...] = img
+        return {"path": path, "size": 0, "shm": shm.name, "shape": list(img.shape)}, b""
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        try:
+            return super().predict_multi_and_extract(image_paths, buffers)
+        finally:
+            for shm in self._blocks:
+                shm.close()
+                shm.unlink()
+            self._blocks = []
+
+
+def daemon_available(socket_path: str = DEFAULT_SOCKET) -> bool:
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return False
+    client = PreforkClient("unix:" + socket_path, timeout=2.0)
+    try:
+        return client.ping()
+    finally:
+        client.close()
+
+
+def connect_daemon(name: str = "paddle", socket_path: Optional[str] = None, annotate: bool = True, **kwargs) -> Optional[DaemonClient]:
+    """A client for the running daemon, or None (no daemon, OCR_DAEMON=0, or kwargs that can't be sent)."""
+    if os.environ.get("OCR_DAEMON", "1") == "0":
+        return None
+    socket_path = socket_path or DEFAULT_SOCKET
+    try:
+        json.dumps(kwargs)
+    except TypeError:
+        return None
+    if not daemon_available(socket_path):
+        return None
+    return DaemonClient(name, socket_path, annotate=annotate, **kwargs)
+
+
+def get_engine(name: str = "paddle", socket_path: Optional[str] = None, annotate: bool = True, **kwargs) -> OCREngine:
+    """Daemon-backed engine when the daemon is running, in-process engine otherwise."""
+    client = connect_daemon(name, socket_path, annotate, **kwargs)
+    if client is not None:
+        logger.info("using OCR daemon at %s", client.address)
+        return client
+    return create_engine(name, **kwargs)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Local OCR daemon keeping engines warm on a Unix socket")
+    p.add_argument("--engines", default="paddle", help=f"Comma-separated engines to preload ({', '.join(ENGINE_NAMES)})")
+    p.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    p.add_argument("--max-engines", type=int, default=4, help="Engine configurations kept warm at once")
+    p.add_argument("--runtime-profile", default=None, help="CPU runtime profile for every engine (see runtime_profiles.py)")
+    p.add_argument("--no-warmup", action="store_true", help="Skip the warm-up inference after loading")
+    return p
+
+
+if __name__ == "__main__":
+    if not hasattr(socket, "AF_UNIX"):
+        sys.exit("ocr_daemon.py needs Unix domain sockets")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = _build_parser().parse_args()
+    OCRDaemon(
+        args.socket,
+        engines=[e for e in args.engines.split(",") if e],
+        max_engines=args.max_engines,
+        warmup=not args.no_warmup,
+        runtime_profile=args.runtime_profile,
+    ).serve_forever()
@@ -0,0 +1,356 @@
+"""Pre-fork OCR server: load models once, share them copy-on-write across workers.
+
+The parent process builds the engine (weights loaded and warmed up), freezes
+the GC so the shared heap is not dirtied by collections, binds the listening
+socket and forks N workers that `accept()` on it. Workers inherit the loaded
+models without reloading; a worker that crashes is re-forked from the parent,
+again without reloading.
+
+Usage:
+  python prefork_server.py --engine paddle --workers 4 --bind 127.0.0.1:8765
+  python prefork_server.py --engine paddleeasy --workers 2 --bind unix:/tmp/ocr.sock
+
+Client:
+  engine = PreforkClient("127.0.0.1:8765")
+  images_annotated, dict_extracted = engine.predict_multi_and_extract(paths)
+
+Note: some OpenMP runtimes do not survive a fork after their thread pool has
+started. If workers hang on their first request, start with `--no-warmup`
+(weights are still shared; only the first request per worker pays the lazy init).
+"""
+import os
+import gc
+import sys
+import time
+import select
+import signal
+import socket
+import logging
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+import metrics
+from engine import ENGINE_NAMES, OCREngine, create_engine
+from image_buffer import ImageBuffer
+from wire import connect, parse_address, recv_msg, send_msg, split_payload
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_image() -> np.ndarray:
+    """Small synthetic page so the first real request doesn't pay lazy initialization."""
+    img = np.full((256, 640, 3), 255, np.uint8)
+    cv2.putText(img, "Family Name WARMUP", (20, 90), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    cv2.putText(img, "Candidate ID 123456", (20, 180), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return img
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """Open a client's block without adopting it (the client unlinks it, not us)."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def request_image(im: Dict[str, Any], data: Optional[bytes]) -> Optional[np.ndarray]:
+    """Pixels of one request entry: raw BGR in a shared-memory block, or encoded file bytes."""
+    if im.get("shm"):
+        shm = _attach_shm(im["shm"])
+        try:
+            # one memcpy out of the block; no encode / decode on either side
+            return np.ndarray(tuple(im["shape"]), np.uint8, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+
+
+def handle_predict(engine: OCREngine, header: Dict[str, Any], payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Decode the request's image bytes once, run the engine, encode annotations if asked."""
+    images = header.get("images", [])
+    paths = [im["path"] for im in images]
+    buffers: List[Optional[ImageBuffer]] = []
+    for im, data in zip(images, split_payload(payload, [im["size"] for im in images])):
+        img = request_image(im, data)
+        buffers.append(ImageBuffer(im["path"], img) if img is not None else None)
+
+    images_annotated, dict_extracted = engine.predict_multi_and_extract(paths, buffers=buffers)
+
+    sizes, parts = [], []
+    for img in images_annotated:
+        if header.get("annotate") and img is not None:
+            ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            if ok:
+                parts.append(data.tobytes())
+                sizes.append(len(parts[-1]))
+                continue
+        sizes.append(None)
+    response = {
+        "ok": True,
+        "extracted": dict_extracted,
+        "confidences": getattr(engine, "last_confidences", {}),
+        "annotated": sizes,
+        "worker": os.getpid(),
+    }
+    return response, b"".join(parts)
+
+
+def serve_connection(engine: OCREngine, conn: socket.socket) -> None:
+    """Answer requests on one connection until the client closes it."""
+    with conn:
+        while True:
+            try:
+                header, payload = recv_msg(conn)
+            except (ConnectionError, OSError):
+                return
+            try:
+                if header.get("op") == "ping":
+                    send_msg(conn, {"ok": True, "worker": os.getpid()})
+                    continue
+                if header.get("op") != "predict":
+                    raise ValueError(f"unknown op {header.get('op')!r}")
+                response, body = handle_predict(engine, header, payload)
+            except Exception as e:
+                logger.exception("request failed")
+                response, body = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+            try:
+                send_msg(conn, response, body)
+            except OSError:
+                return
+
+
+class PreforkServer:
+    def __init__(self, engine_name: str = "paddle", workers: int = 2, bind: str = "127.0.0.1:8765",
+                 warmup: bool = True, backlog: int = 64, **engine_kwargs) -> None:
+        self.engine_name = engine_name
+        self.workers = workers
+        self.bind = bind
+        self.warmup = warmup
+        self.backlog = backlog
+        self.engine_kwargs = engine_kwargs
+        self.engine: Optional[OCREngine] = None
+        self.sock: Optional[socket.socket] = None
+        self.children: Dict[int, int] = {}  # pid -> worker slot
+        self.restarts = 0
+        self._stopping = False
+
+    def load(self) -> None:
+        start = time.perf_counter()
+        self.engine = create_engine(self.engine_name, **self.engine_kwargs)
+        if self.warmup:
+            img = warmup_image()
+            self.engine.predict_multi_and_extract(["<warmup>"], buffers=[ImageBuffer("<warmup>", img)])
+        metrics.set_gauge("prefork.load_seconds", time.perf_counter() - start)
+        logger.info("loaded %s in %.1fs", self.engine_name, time.perf_counter() - start)
+
+    def _listen(self) -> socket.socket:
+        family, addr = parse_address(self.bind)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        sock.listen(self.backlog)
+        return sock
+
+    def _worker_loop(self) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except InterruptedError:
+                continue
+            serve_connection(self.engine, conn)
+
+    def _spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_loop()
+            except BaseException:
+                logger.exception("worker %d died", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        logger.info("worker %d started in slot %d", pid, slot)
+
+    def _stop(self, *_) -> None:
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self) -> None:
+        if self.engine is None:
+            self.load()
+        self.sock = self._listen()
+        # everything allocated so far (models included) stays out of GC passes,
+        # so workers don't touch -- and copy -- those pages
+        gc.collect()
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        logger.info("serving %s on %s with %d workers", self.engine_name, self.bind, self.workers)
+
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self._stopping:
+                continue
+            logger.warning("worker %d exited (status %d), re-forking slot %d", pid, status, slot)
+            self.restarts += 1
+            metrics.inc("prefork.restarts")
+            self._spawn(slot)
+
+        self.sock.close()
+        family, addr = parse_address(self.bind)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
+
+
+def _peer_closed(sock: socket.socket) -> bool:
+    """An idle kept-alive connection the server has since closed (EOF or reset waiting to be read)."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+class PreforkClient:
+    """`OCREngine` backed by a running server; sends file bytes, never decodes locally."""
+
+    def __init__(self, address: str = "127.0.0.1:8765", timeout: Optional[float] = None, annotate: bool = True) -> None:
+        self.address = address
+        self.timeout = timeout
+        self.annotate = annotate
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+        self._sock: Optional[socket.socket] = None
+
+    def _conn(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = connect(self.address, self.timeout)
+        return self._sock
+
+    def _send(self, header: Dict[str, Any], payload: bytes) -> socket.socket:
+        """Send on the kept connection, or on a fresh one if the server closed it (worker restarted)."""
+        if self._sock is not None and _peer_closed(self._sock):
+            self.close()
+        reused = self._sock is not None
+        sock = self._conn()
+        try:
+            send_msg(sock, header, payload)
+            return sock
+        except socket.timeout:
+            self.close()
+            raise
+        except (ConnectionError, OSError):
+            self.close()
+            if not reused:
+                raise
+        sock = self._conn()
+        try:
+            send_msg(sock, header, payload)
+        except (ConnectionError, OSError):
+            self.close()
+            raise
+        return sock
+
+    def _request(self, header: Dict[str, Any], payload: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        # only a send that fails on a stale connection is retried: once the request is
+        # out, a failure (read timeout, worker killed by this request) is raised as is
+        sock = self._send(header, payload)
+        try:
+            return recv_msg(sock)
+        except (ConnectionError, OSError):
+            self.close()
+            raise
+
+    def ping(self) -> bool:
+        try:
+            header, _ = self._request({"op": "ping"})
+            return bool(header.get("ok"))
+        except (ConnectionError, OSError):
+            return False
+
+    def _pack(self, path: str, buf: Optional[ImageBuffer], has_buffers: bool) -> Tuple[Dict[str, Any], bytes]:
+        """Request entry + payload bytes for one image: the file as is, or a decoded buffer re-encoded."""
+        data = b""
+        if buf is not None:
+            ok, enc = cv2.imencode(".png", buf.bgr)
+            data = enc.tobytes() if ok else b""
+        elif not has_buffers:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = b""
+        return {"path": path, "size": len(data)}, data
+
+    def _predict_header(self) -> Dict[str, Any]:
+        return {"op": "predict", "annotate": self.annotate}
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        images, parts = [], []
+        for i, path in enumerate(image_paths):
+            im, data = self._pack(path, buffers[i] if buffers is not None else None, buffers is not None)
+            images.append(im)
+            parts.append(data)
+
+        header, payload = self._request(dict(self._predict_header(), images=images), b"".join(parts))
+        if not header.get("ok"):
+            raise RuntimeError(f"OCR server error: {header.get('error')}")
+        self.last_confidences = header.get("confidences", {})
+        images_annotated = [
+            cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
+            for data in split_payload(payload, header.get("annotated", []))
+        ]
+        extracted = header.get("extracted", {})
+        return images_annotated, {p: extracted.get(p, "") for p in image_paths}
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Pre-fork OCR server sharing loaded models across workers")
+    p.add_argument("--engine", default="paddle", choices=ENGINE_NAMES, help="Engine to load once in the parent")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Number of forked workers")
+    p.add_argument("--bind", default="127.0.0.1:8765", help="host:port or unix:/path/to.sock")
+    p.add_argument("--runtime-profile", default=None, help="CPU runtime profile for the engine (see runtime_profiles.py)")
+    p.add_argument("--no-warmup", action="store_true", help="Skip the warm-up inference before forking")
+    return p
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        sys.exit("prefork_server.py needs os.fork (Linux/macOS)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s")
+    args = _build_parser().parse_args()
+    PreforkServer(
+        args.engine,
+        workers=args.workers,
+        bind=args.bind,
+        warmup=not args.no_warmup,
+        runtime_profile=args.runtime_profile,
+    ).serve_forever()
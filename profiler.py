@@ -0,0 +1,173 @@
+"""Low-overhead sampling profiler for batch runs, tagged by pipeline stage.
+
+A background thread wakes every `interval` seconds, grabs every thread's
+Python stack (`sys._current_frames()`) and counts it under the stage that
+thread is in. Stages are marked in the code with `with stage("detect"): ...`;
+outside a profiling run `stage()` only checks a flag.
+
+Time spent inside native calls (Paddle inference, torch, OpenCV decode) is
+charged to the Python frame that made the call, which is what tells these apart.
+
+Output (`<prefix>.collapsed`, `<prefix>.txt`):
+  - collapsed stacks `thread;[stage];frame;...;frame count`, readable by
+    flamegraph.pl / speedscope / inferno
+  - a summary: samples per stage, top functions by self and total samples
+
+Usage:
+  python main.py input output.json paddle --profile run1
+  python Paddle.py --profile
+"""
+import os
+import sys
+import time
+import threading
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_active = False
+# thread ident -> stack of stage names currently open in that thread
+_stages: Dict[int, List[str]] = {}
+
+# waiting in these files is an idle worker thread, not work
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Tag samples taken inside the block with `name` (nested stages join with '/')."""
+    if not _active:
+        yield
+        return
+    stack = _stages.setdefault(threading.get_ident(), [])
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 128) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        # (thread name, stage, code objects root -> leaf) -> samples
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self.wall = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self, names: Dict[int, str]) -> None:
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stages = _stages.get(ident)
+            tag = "/".join(stages) if stages else "-"
+            codes = []
+            f = frame
+            while f is not None and len(codes) < self.max_depth:
+                codes.append(f.f_code)
+                f = f.f_back
+            if tag == "-" and codes and codes[0].co_filename.endswith(_IDLE_FILES):
+                continue
+            codes.reverse()
+            self.samples[(names.get(ident, str(ident)), tag, tuple(codes))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample(names)
+            self.ticks += 1
+
+    def start(self) -> None:
+        global _active
+        _active = True
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        global _active
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        _active = False
+        self.wall = time.perf_counter() - self._t0
+
+    def collapsed(self) -> List[str]:
+        merged: Counter = Counter()
+        for (thread, tag, codes), n in self.samples.items():
+            merged[";".join([thread, f"[{tag}]"] + [_frame_label(c) for c in codes])] += n
+        return [f"{stack} {n}" for stack, n in sorted(merged.items())]
+
+    def summary(self, top: int = 30) -> str:
+        total = sum(self.samples.values()) or 1
+        by_stage: Counter = Counter()
+        self_time: Counter = Counter()
+        total_time: Counter = Counter()
+        for (_, tag, codes), n in self.samples.items():
+            by_stage[tag] += n
+            if codes:
+                self_time[_frame_label(codes[-1])] += n
+            # recursion counts once per sample
+            for label in {_frame_label(c) for c in codes}:
+                total_time[label] += n
+
+        lines = [
+            f"wall {self.wall:.2f}s, {self.ticks} ticks every {self.interval * 1000:.1f} ms, {total} samples",
+            "",
+            "samples by stage:",
+        ]
+        for tag, n in by_stage.most_common():
+            lines.append(f"  {n:8d} {100 * n / total:6.1f}%  {tag}")
+        for title, counter in (("top functions (self):", self_time), ("top functions (total):", total_time)):
+            lines += ["", title]
+            for label, n in counter.most_common(top):
+                lines.append(f"  {n:8d} {100 * n / total:6.1f}%  {label}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, prefix: str) -> Tuple[str, str]:
+        folder = os.path.dirname(prefix)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        collapsed_path, summary_path = prefix + ".collapsed", prefix + ".txt"
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(self.summary())
+        return collapsed_path, summary_path
+
+
+@contextmanager
+def profiled(prefix: Optional[str], interval: float = 0.005) -> Iterator[Optional[SamplingProfiler]]:
+    """Profile the block and write `<prefix>.collapsed` / `<prefix>.txt`; no-op when prefix is None."""
+    if prefix is None:
+        yield None
+        return
+    prof = SamplingProfiler(interval)
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        collapsed_path, summary_path = prof.write(prefix)
+        print(f"profile: {collapsed_path}, {summary_path}", file=sys.stderr)
+
+
+def add_profile_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        default=None,
+        metavar="PREFIX",
+        help="Sampling profile of the run -> PREFIX.collapsed (flamegraph) + PREFIX.txt (default prefix: profile)",
+    )
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="Sampling interval in seconds (default: 0.005)")
@@ -0,0 +1,129 @@
+"""Crop-level recognition cache shared by `Paddle`, `Easy` and `PaddleEasy`.
+
+Entries are keyed by a hash of the exact normalized crop (the rectified
+text-line the recognizer would see) plus the recognizer config, so re-running
+with slightly different detection settings only recognizes the crops that
+actually changed. No downscaling or quantization: two crops that differ in a
+single digit must never share an entry.
+"""
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+def crop_key(crop: np.ndarray, config_key: str) -> str:
+    crop = np.ascontiguousarray(crop)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(config_key.encode("utf-8"))
+    digest.update(f"{crop.dtype}{crop.shape}".encode("ascii"))
+    digest.update(crop.tobytes())
+    return digest.hexdigest()
+
+
+class RecognitionCache:
+    """Thread-safe LRU of `key -> (text, confidence)` bounded to `max_entries`.
+
+    With `spill_path`, entries evicted from memory are written to a SQLite file
+    and promoted back on their next hit, so the cache also survives restarts.
+    """
+
+    def __init__(self, max_entries: int = 50000, spill_path: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if spill_path:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rec_cache (key TEXT PRIMARY KEY, text TEXT, score REAL)"
+            )
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return value
+            if self._db is not None:
+                row = self._db.execute("SELECT text, score FROM rec_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = (row[0], float(row[1]))
+                    self._put_locked(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Tuple[str, float]) -> None:
+        with self._lock:
+            self._put_locked(key, value)
+
+    def _put_locked(self, key: str, value: Tuple[str, float]) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        evicted = []
+        while len(self._mem) > self.max_entries:
+            evicted.append(self._mem.popitem(last=False))
+        if evicted and self._db is not None:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rec_cache (key, text, score) VALUES (?, ?, ?)",
+                [(k, t, s) for k, (t, s) in evicted],
+            )
+            self._db.commit()
+
+    def flush(self) -> None:
+        """Write all in-memory entries to the spill file (no-op without one)."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rec_cache (key, text, score) VALUES (?, ?, ?)",
+                [(k, t, s) for k, (t, s) in self._mem.items()],
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+
+class CachedRecognizer:
+    """Wraps a crop recognizer (see `recognizers.py`) so only cache misses are recognized."""
+
+    def __init__(self, recognizer, cache: RecognitionCache) -> None:
+        self.recognizer = recognizer
+        self.cache = cache
+        self.last_misses = 0
+
+    def config_key(self) -> str:
+        return self.recognizer.config_key()
+
+    def crop(self, img: np.ndarray, box, scale: float = 1.0) -> Optional[np.ndarray]:
+        return self.recognizer.crop(img, box, scale)
+
+    def recognize(self, crops: Sequence[Optional[np.ndarray]]) -> List[Tuple[str, float]]:
+        config = self.recognizer.config_key()
+        readings: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        keys: List[Optional[str]] = [None] * len(crops)
+        missing = []
+        for i, crop in enumerate(crops):
+            if crop is None or not crop.size:
+                continue
+            keys[i] = crop_key(crop, config)
+            hit = self.cache.get(keys[i])
+            if hit is None:
+                missing.append(i)
+            else:
+                readings[i] = hit
+        self.last_misses = len(missing)
+        if missing:
+            fresh = self.recognizer.recognize([crops[i] for i in missing])
+            for i, reading in zip(missing, fresh):
+                readings[i] = reading
+                self.cache.put(keys[i], reading)
+        return readings
@@ -0,0 +1,195 @@
+"""Crop-level text recognizers shared by the engines.
+
+Both recognizers expose the same two steps so callers can pool crops from
+many boxes (and many images) into one recognition batch:
+  - `crop(img, box, scale)` turns a polygon / xxyy box into a normalized crop
+  - `recognize(crops)` returns one `(text, confidence)` per crop
+"""
+import math
+import inspect
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils import crop_quad
+
+# EasyOCR's recognizer input height (easyocr.config.imgH)
+EASY_MODEL_HEIGHT = 64
+
+# parameters of easyocr.recognition.get_text (private API, easyocr 1.6 / 1.7) used below
+_GET_TEXT_PARAMS = ("character", "imgH", "imgW", "recognizer", "converter", "image_list", "ignore_char",
+                    "decoder", "beamWidth", "batch_size", "contrast_ths", "adjust_contrast", "filter_ths",
+                    "workers", "device")
+
+
+def _easy_get_text():
+    """`easyocr.recognition.get_text`, checked against the signature this module calls."""
+    import easyocr
+    from easyocr.recognition import get_text
+    missing = set(_GET_TEXT_PARAMS) - set(inspect.signature(get_text).parameters)
+    if missing:
+        raise ImportError(
+            f"easyocr {getattr(easyocr, '__version__', '?')}: recognition.get_text has no {sorted(missing)}; "
+            "crop-level recognition (rec_cache / rerec_threshold) needs easyocr 1.6-1.7"
+        )
+    return get_text
+
+
+class EasyCropRecognizer:
+    """Batch recognition over crops with an already loaded `easyocr.Reader`.
+
+    `Reader.recognize` handles one box at a time on CPU; calling `get_text`
+    directly lets us recognize crops from any number of images in one batch.
+    `get_text` is EasyOCR-internal: its signature is checked on construction.
+    """
+
+    def __init__(
+        self,
+        reader,
+        decoder: str = "greedy",
+        beam_width: int = 5,
+        batch_size: int = 8,
+        blocklist: str = "",
+        margin: float = 0.0,
+    ) -> None:
+        self._get_text = _easy_get_text()
+        self.reader = reader
+        self.decoder = decoder
+        self.beam_width = beam_width
+        self.batch_size = batch_size
+        self.blocklist = blocklist
+        self.margin = margin
+
+    def config_key(self) -> str:
+        return f"easy|{self.reader.model_lang}|{self.decoder}|{self.beam_width}|{self.blocklist}|{self.margin}"
+
+    def crop(self, img: np.ndarray, box, scale: float = 1.0) -> Optional[np.ndarray]:
+        from easyocr.utils import compute_ratio_and_resize
+        if np.ndim(box) == 1:
+            # axis-aligned box: slice like easyocr.utils.get_image_list does
+            x_min, x_max, y_min, y_max = [int(v) for v in box[:4]]
+            pad = int(round(self.margin * (y_max - y_min)))
+            crop = img[max(0, y_min - pad):max(0, y_max + pad), max(0, x_min - pad):max(0, x_max + pad)]
+        else:
+            crop = crop_quad(img, box, margin=self.margin)
+        if crop is None or not crop.size:
+            return None
+        if crop.ndim == 3:
+            # convert only the crop, never the whole page
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        h, w = crop.shape[:2]
+        crop, _ = compute_ratio_and_resize(crop, w, h, EASY_MODEL_HEIGHT)
+        return crop
+
+    def recognize(self, crops: Sequence[Optional[np.ndarray]]) -> List[Tuple[str, float]]:
+        readings: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        valid = [i for i, c in enumerate(crops) if c is not None and c.size]
+        if not valid:
+            return readings
+        image_list = [([[0, 0]] * 4, crops[i]) for i in valid]
+        max_ratio = max(max(c.shape[1] / c.shape[0], 1.0) for _, c in image_list)
+        max_width = math.ceil(max_ratio) * EASY_MODEL_HEIGHT
+        # mirror Reader.recognize: blocklist chars are ignored by the decoder
+        ignore_char = "".join(set(self.blocklist)) if self.blocklist else \
+            "".join(set(self.reader.character) - set(self.reader.lang_char))
+        results = self._get_text(
+            character=self.reader.character, imgH=EASY_MODEL_HEIGHT, imgW=int(max_width),
+            recognizer=self.reader.recognizer, converter=self.reader.converter, image_list=image_list,
+            ignore_char=ignore_char, decoder=self.decoder, beamWidth=self.beam_width, batch_size=self.batch_size,
+            contrast_ths=0.1, adjust_contrast=0.5, filter_ths=0.003, workers=0, device=self.reader.device,
+        )
+        for i, (_, text, conf) in zip(valid, results):
+            readings[i] = (str(text), float(conf))
+        return readings
+
+
+class PaddleCropRecognizer:
+    """Batch recognition over crops with a standalone PaddleOCR `TextRecognition` model."""
+
+    def __init__(
+        self,
+        model_name: str = "PP-OCRv5_server_rec",
+        model_dir: Optional[str] = None,
+        batch_size: int = 8,
+        margin: float = 0.0,
+        **common_args,
+    ) -> None:
+        from paddleocr import TextRecognition
+        self.model = TextRecognition(model_name=model_name, model_dir=model_dir, **common_args)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.margin = margin
+
+    def config_key(self) -> str:
+        return f"paddle|{self.model_name}|{self.margin}"
+
+    def crop(self, img: np.ndarray, box, scale: float = 1.0) -> Optional[np.ndarray]:
+        crop = crop_quad(img, box, margin=self.margin)
+        if crop is None:
+            return None
+        if scale != 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        return np.ascontiguousarray(crop)
+
+    def recognize(self, crops: Sequence[Optional[np.ndarray]]) -> List[Tuple[str, float]]:
+        readings: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        valid = [i for i, c in enumerate(crops) if c is not None and c.size]
+        if not valid:
+            return readings
+        results = self.model.predict(input=[crops[i] for i in valid], batch_size=self.batch_size)
+        for i, res in zip(valid, results):
+            readings[i] = (str(res["rec_text"]), float(res["rec_score"]))
+        return readings
+
+
+def recognize_boxes(recognizer, img: np.ndarray, boxes) -> Tuple[List[str], List[float]]:
+    """Crop every box of one image and recognize them in a single batch."""
+    readings = recognizer.recognize([recognizer.crop(img, box) for box in boxes])
+    return [t for t, _ in readings], [s for _, s in readings]
+
+
+def rerecognize_low_confidence(recognizer, pages, threshold: float, scale: float = 1.0,
+                               readings_out: Optional[List[Dict[int, Tuple[str, float]]]] = None) -> int:
+    """Re-run only the boxes scoring below `threshold`, pooled across all pages.
+
+    `pages` is a list of `(image, boxes, texts, scores)`; `texts` and `scores`
+    are updated in place wherever the new reading is more confident (see
+    `apply_rerecognized`). With `readings_out`, it is filled with one
+    `{box index: (text, score)}` per page holding every new reading, kept or
+    not, so a replay can apply them again. Returns the number of crops re-recognized.
+    """
+    jobs = []
+    for page_idx, (img, boxes, texts, scores) in enumerate(pages):
+        if img is None:
+            continue
+        for i, score in enumerate(scores):
+            if score < threshold:
+                jobs.append((page_idx, i, recognizer.crop(img, boxes[i], scale)))
+    if readings_out is not None:
+        readings_out[:] = [{} for _ in pages]
+    if not jobs:
+        return 0
+
+    readings = recognizer.recognize([crop for _, _, crop in jobs])
+    for (page_idx, i, _), (text, score) in zip(jobs, readings):
+        _, _, texts, scores = pages[page_idx]
+        apply_rerecognized(texts, scores, {i: (text, score)})
+        if readings_out is not None:
+            readings_out[page_idx][i] = (text, float(score))
+    return len(jobs)
+
+
+def apply_rerecognized(texts: List[str], scores: List[float], readings: Dict[int, Tuple[str, float]],
+                       threshold: Optional[float] = None) -> None:
+    """Keep each new reading `{box index: (text, score)}` that is non-empty and more confident.
+
+    With `threshold`, only boxes that scored below it are considered (replaying
+    recorded readings at a lower threshold than they were taken at).
+    """
+    for i, (text, score) in readings.items():
+        if threshold is not None and not scores[i] < threshold:
+            continue
+        if text and score > scores[i]:
+            texts[i] = text
+            scores[i] = score
@@ -0,0 +1,242 @@
+"""Record raw engine outputs once, replay post-processing without any model.
+
+Recording (`Paddle(record_to="runs/a")`, same for `Easy` / `PaddleEasy`)
+appends, per image, the raw detector boxes (detection order) with the texts
+and scores of the first recognition pass, plus every low-confidence
+re-reading. The archive is a directory of flat, append-only files:
+
+  boxes.f32     float32 quads, 8 values per box
+  scores.f32    float32, one per box
+  texts.bin     UTF-8 texts back to back
+  texts.i64     int64 end offset of each text in texts.bin
+  index.jsonl   one line per image: path, kind, box range, image shape, engine,
+                group / rerec thresholds and the rerec readings
+
+Reading memory-maps the binary files, so an archive of thousands of
+documents opens instantly. `Replay` is an `OCREngine` that runs the same
+steps as the engine after recognition: grouping into lines (PaddleEasy,
+`group_reading_order`), the rerec readings (`apply_rerecognized`), then
+`extract_fields` and the drawing helpers. Grouping and the rerec threshold
+can be changed at replay time; re-readings exist only for boxes below the
+threshold they were recorded with, so a higher one re-reads nothing more.
+
+Usage:
+  python replay.py runs/a                          # time post-processing over the archive
+  python replay.py runs/a --expect output.json     # regression check against saved extractions
+  python replay.py runs/a --linker sequential --draw
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from image_buffer import ImageBuffer, load_buffers
+from linker import extract_fields
+from recognizers import apply_rerecognized
+from utils import *
+
+POLY = "poly"  # Paddle / Easy: 4-point polygons
+XXYY = "xxyy"  # PaddleEasy: detector polygons, grouped into [x_min, x_max, y_min, y_max] lines on replay
+
+
+class ReplayRecorder:
+    """Append-only writer of an archive; safe to share between threads of one engine."""
+
+    def __init__(self, path: str, engine: str = "") -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._boxes = open(os.path.join(path, "boxes.f32"), "ab")
+        self._scores = open(os.path.join(path, "scores.f32"), "ab")
+        self._texts = open(os.path.join(path, "texts.bin"), "ab")
+        self._offsets = open(os.path.join(path, "texts.i64"), "ab")
+        self._index = open(os.path.join(path, "index.jsonl"), "a", encoding="utf-8")
+        # resume numbering after what an earlier run appended
+        self._n_boxes = self._boxes.tell() // (8 * 4)
+        self._text_end = self._texts.tell()
+
+    def add(self, image_path: str, kind: str, boxes: Sequence, texts: Sequence[str], scores: Sequence[float],
+            shape: Optional[Tuple[int, ...]] = None, rerec: Optional[Dict[int, Tuple[str, float]]] = None,
+            **meta) -> None:
+        """`boxes` / `texts` / `scores` before grouping and rerec; `rerec` maps box index -> re-reading."""
+        quads = np.stack([to_quad(b) for b in boxes]).astype(np.float32) if len(boxes) else np.zeros((0, 4, 2), np.float32)
+        encoded = [str(t).encode("utf-8") for t in texts]
+        ends = self._text_end + np.cumsum([len(t) for t in encoded], dtype=np.int64)
+        with self._lock:
+            start = self._n_boxes
+            self._boxes.write(quads.tobytes())
+            self._scores.write(np.asarray(scores, dtype=np.float32).tobytes())
+            self._texts.write(b"".join(encoded))
+            self._offsets.write(ends.tobytes())
+            self._n_boxes += len(encoded)
+            self._text_end = int(ends[-1]) if len(ends) else self._text_end
+            entry = {"path": image_path, "kind": kind, "start": start, "count": len(encoded),
+                     "shape": list(shape) if shape is not None else None, "engine": self.engine, "raw": True,
+                     "rerec": [[i, t, float(sc)] for i, (t, sc) in sorted((rerec or {}).items())], **meta}
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            for f in (self._boxes, self._scores, self._texts, self._offsets, self._index):
+                f.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for f in (self._boxes, self._scores, self._texts, self._offsets, self._index):
+            f.close()
+
+
+class ReplayArchive:
+    """Memory-mapped read side; the last record of a path wins."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        with open(os.path.join(path, "index.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["path"]] = entry
+        self.boxes = self._map("boxes.f32", np.float32).reshape(-1, 4, 2)
+        self.scores = self._map("scores.f32", np.float32)
+        self.texts = self._map("texts.bin", np.uint8)
+        self.text_ends = self._map("texts.i64", np.int64)
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        file = os.path.join(self.path, name)
+        if os.path.getsize(file) == 0:
+            return np.zeros(0, dtype)
+        return np.memmap(file, dtype=dtype, mode="r")
+
+    def paths(self) -> List[str]:
+        return list(self.entries)
+
+    def get(self, image_path: str) -> Optional[Tuple[Dict, np.ndarray, List[str], List[float]]]:
+        """`(entry, quads, texts, scores)` for one image, or None if it wasn't recorded."""
+        entry = self.entries.get(image_path)
+        if entry is None:
+            return None
+        a, n = entry["start"], entry["count"]
+        ends = self.text_ends[a:a + n]
+        begin = int(self.text_ends[a - 1]) if a > 0 else 0
+        texts = []
+        for end in ends:
+            texts.append(bytes(self.texts[begin:int(end)]).decode("utf-8"))
+            begin = int(end)
+        return entry, np.asarray(self.boxes[a:a + n]), texts, self.scores[a:a + n].tolist()
+
+
+class Replay:
+    """`OCREngine` over a recorded archive: post-processing and drawing only, no model.
+
+    `draw=True` decodes the image (if the file is still there) and draws the
+    recorded boxes on it like the engine did; otherwise annotated images are None.
+    `group_threshold` / `rerec_threshold` override the recorded ones (None: as recorded).
+    """
+
+    def __init__(self, archive: str, field_linker: str = "spatial", draw: bool = False,
+                 group_threshold: Optional[float] = None, rerec_threshold: Optional[float] = None) -> None:
+        self.archive = ReplayArchive(archive)
+        self.field_linker = field_linker
+        self.draw = draw
+        self.group_threshold = group_threshold
+        self.rerec_threshold = rerec_threshold
+        self.last_confidences: Dict[str, Dict[str, float]] = {}
+
+    def _boxes(self, entry: Dict, quads: np.ndarray, texts: List[str], scores: List[float]):
+        if not entry.get("raw"):
+            # older archives hold post-processing input as is: grouped, rerec applied
+            if entry["kind"] == XXYY:
+                return [poly_to_easyocr_box(q) for q in quads], texts, scores
+            return [q.astype(int).tolist() for q in quads], texts, scores
+        readings = {int(i): (t, sc) for i, t, sc in entry.get("rerec", [])}
+        if entry["kind"] == XXYY:
+            threshold = self.group_threshold if self.group_threshold is not None else entry.get("group_threshold", 9.0)
+            boxes, order = group_reading_order(quads, threshold)
+            texts, scores = [texts[j] for j in order], [scores[j] for j in order]
+            position = {j: k for k, j in enumerate(order)}
+            readings = {position[i]: r for i, r in readings.items()}
+        else:
+            boxes = [q.astype(int).tolist() for q in quads]
+        rerec_threshold = self.rerec_threshold if self.rerec_threshold is not None else entry.get("rerec_threshold")
+        if rerec_threshold is not None:
+            apply_rerecognized(texts, scores, readings, rerec_threshold)
+        return boxes, texts, scores
+
+    def predict_multi_and_extract(self, image_paths: List[str], buffers: Optional[List[Optional[ImageBuffer]]] = None) -> Tuple[List[Optional[np.ndarray]], Dict[str, str]]:
+        all_bufs = load_buffers(image_paths, buffers) if self.draw else [None] * len(image_paths)
+        images_annotated, dict_extracted = [], {}
+        self.last_confidences = {}
+        for img_path, buf in zip(image_paths, all_bufs):
+            record = self.archive.get(img_path)
+            if record is None:
+                images_annotated.append(None)
+                dict_extracted[img_path] = ""
+                continue
+            entry, quads, texts, scores = record
+            boxes, texts, scores = self._boxes(entry, quads, texts, scores)
+            fields, conf = extract_fields(boxes, texts, scores, self.field_linker)
+            dict_extracted[img_path] = str(fields)
+            self.last_confidences[img_path] = conf
+
+            img = None
+            if buf is not None:
+                img = buf.canvas()
+                # recorded coordinates are in the engine's decode; this one may be another scale
+                factor = buf.scale / entry.get("scale", 1.0)
+                if factor != 1.0:
+                    boxes = [(np.asarray(b, dtype=np.float32) * factor).astype(int).tolist() for b in boxes]
+                for box, txt in zip(boxes, texts):
+                    if entry["kind"] == XXYY:
+                        draw_bbox_with_label(img, box, txt, fmt="xxyy")
+                    else:
+                        draw_paddle_poly_with_easy_label(img, box, txt)
+            images_annotated.append(img)
+        return images_annotated, dict_extracted
+
+
+def compare(expected: Dict[str, str], actual: Dict[str, str]) -> List[Tuple[str, str, str, str]]:
+    """`(path, field, expected, actual)` for every field that changed."""
+    diffs = []
+    for path, exp in expected.items():
+        if path not in actual:
+            continue
+        a, e = parse_extracted(actual[path]), parse_extracted(exp)
+        for k in sorted(set(a) | set(e)):
+            if str(a.get(k, "")) != str(e.get(k, "")):
+                diffs.append((path, k, str(e.get(k, "")), str(a.get(k, ""))))
+    return diffs
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Replay recorded engine outputs through post-processing")
+    p.add_argument("archive", help="Archive directory written with record_to=")
+    p.add_argument("--linker", default="spatial", choices=["spatial", "sequential"], help="Field linker to replay with")
+    p.add_argument("--draw", action="store_true", help="Also decode images and draw annotations")
+    p.add_argument("--repeat", type=int, default=1, help="Timed passes over the archive")
+    p.add_argument("--expect", default=None, help="JSON output (path -> extraction) to diff against")
+    p.add_argument("--group-threshold", type=float, default=None, help="PaddleEasy line grouping threshold (default: as recorded)")
+    p.add_argument("--rerec-threshold", type=float, default=None, help="Apply recorded re-readings below this score (default: as recorded)")
+    return p
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
+    engine = Replay(args.archive, field_linker=args.linker, draw=args.draw,
+                    group_threshold=args.group_threshold, rerec_threshold=args.rerec_threshold)
+    paths = engine.archive.paths()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        _, dict_extracted = engine.predict_multi_and_extract(paths)
+    elapsed = (time.perf_counter() - start) / max(args.repeat, 1)
+    print(f"{len(paths)} images in {elapsed * 1000:.1f} ms ({elapsed / max(len(paths), 1) * 1e6:.0f} us/image)")
+    if args.expect:
+        with open(args.expect, encoding="utf-8") as f:
+            diffs = compare(json.load(f), dict_extracted)
+        for path, field, exp, got in diffs:
+            print(f"{path}\t{field}\t{exp!r} -> {got!r}")
+        print(f"{len(diffs)} field(s) differ")
+        raise SystemExit(1 if diffs else 0)
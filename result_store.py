@@ -0,0 +1,232 @@
+"""SQLite-backed store for extraction results.
+
+One row per image, indexed by image hash, candidate id, family name and
+test date, so point lookups and date-range queries stay fast on archives
+with millions of records. JSON / JSONL export keeps the old formats available.
+
+Usage:
+  python result_store.py results.db --candidate-id 123456
+  python result_store.py results.db --from 2024-01-01 --to 2024-12-31
+  python result_store.py results.db --export-json output.json
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
+from utils import parse_extracted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    image_hash TEXT NOT NULL UNIQUE,
+    image_path TEXT NOT NULL,
+    candidate_id TEXT,
+    family_name TEXT COLLATE NOCASE,
+    first_name TEXT,
+    test_date TEXT,
+    fields TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_candidate_id ON results (candidate_id);
+CREATE INDEX IF NOT EXISTS idx_results_family_name ON results (family_name);
+CREATE INDEX IF NOT EXISTS idx_results_test_date ON results (test_date);
+"""
+
+DATE_FORMATS = ("%d/%m/%Y", "%d/%b/%Y", "%d %b %Y", "%d-%m-%Y", "%d-%b-%Y", "%d.%m.%Y", "%Y-%m-%d")
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """ISO `YYYY-MM-DD` for the date formats seen on certificates, else None."""
+    if not value:
+        return None
+    value = " ".join(str(value).split())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _date_bound(value: str, name: str) -> str:
+    iso = normalize_date(value)
+    if iso is None:
+        raise ValueError(f"{name} date {value!r} is not in a known format (e.g. 2024-01-31 or 31/01/2024)")
+    return iso
+
+
+def file_hash(path: str) -> str:
+    """SHA-1 of the file contents (falls back to the path for missing files)."""
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        h.update(path.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path: str = "results.db") -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def add_many(self, dict_extracted: Dict[str, Union[str, Dict[str, str]]], hashes: Optional[Dict[str, str]] = None) -> int:
+        """Upsert one row per image in a single transaction; returns the row count.
+
+        A re-processed image keeps its row id (so `iter_records` order is stable)
+        and gets the new path, fields and timestamp.
+        """
+        hashes = hashes or {}
+        now = time.time()
+        rows = []
+        for image_path, extracted in dict_extracted.items():
+            fields = parse_extracted(extracted)
+            rows.append((
+                hashes.get(image_path) or file_hash(image_path),
+                image_path,
+                fields.get("candidate id"),
+                fields.get("family name"),
+                fields.get("first name"),
+                normalize_date(fields.get("date")),
+                json.dumps(fields, ensure_ascii=False),
+                now,
+            ))
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO results "
+                "(image_hash, image_path, candidate_id, family_name, first_name, test_date, fields, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(image_hash) DO UPDATE SET image_path = excluded.image_path, "
+                "candidate_id = excluded.candidate_id, family_name = excluded.family_name, "
+                "first_name = excluded.first_name, test_date = excluded.test_date, "
+                "fields = excluded.fields, created_at = excluded.created_at",
+                rows,
+            )
+        return len(rows)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._to_record(r) for r in rows]
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["fields"] = json.loads(record["fields"])
+        return record
+
+    def get_by_hash(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM results WHERE image_hash = ?", (image_hash,))
+        return rows[0] if rows else None
+
+    def find_by_candidate_id(self, candidate_id: str) -> List[Dict[str, Any]]:
+        return self._query("SELECT * FROM results WHERE candidate_id = ?", (candidate_id,))
+
+    def find_by_family_name(self, family_name: str) -> List[Dict[str, Any]]:
+        """Case-insensitive exact match (uses the NOCASE index)."""
+        return self._query("SELECT * FROM results WHERE family_name = ?", (family_name,))
+
+    def find_by_test_date(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Records with `start <= test date <= end`; bounds are ISO or certificate-style dates.
+
+        Raises ValueError for a bound that isn't a recognised date, rather than
+        silently matching nothing.
+        """
+        start = _date_bound(start, "start") if start else "0000-00-00"
+        end = _date_bound(end, "end") if end else "9999-99-99"
+        return self._query(
+            "SELECT * FROM results WHERE test_date BETWEEN ? AND ? ORDER BY test_date", (start, end)
+        )
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Stream every record in insertion order without loading the table into memory."""
+        last_id = 0
+        while True:
+            rows = self._query(
+                "SELECT * FROM results WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            )
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]["id"]
+
+    def export_json(self, filename: str = "output.json") -> None:
+        """Write the legacy `utils.save_output` format: image path -> stringified dict."""
+        out = {r["image_path"]: str(r["fields"]) for r in self.iter_records()}
+        with open(filename, "w") as f:
+            json.dump(out, f)
+
+    def export_jsonl(self, filename: str) -> None:
+        with open(filename, "w", encoding="utf-8") as f:
+            for r in self.iter_records():
+                f.write(json.dumps({"image_path": r["image_path"], "image_hash": r["image_hash"], **r["fields"]}, ensure_ascii=False))
+                f.write("\n")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def is_store_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3")
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Query or export an OCR result store")
+    p.add_argument("db", help="SQLite result store")
+    p.add_argument("--candidate-id", help="Point lookup by candidate id")
+    p.add_argument("--family-name", help="Lookup by family name (case-insensitive)")
+    p.add_argument("--hash", help="Point lookup by image hash")
+    p.add_argument("--from", dest="date_from", help="Test date range start")
+    p.add_argument("--to", dest="date_to", help="Test date range end")
+    p.add_argument("--export-json", help="Export in the legacy JSON format")
+    p.add_argument("--export-jsonl", help="Export one JSON record per line")
+    return p
+
+
+if __name__ == "__main__":
+    parser = _build_parser()
+    args = parser.parse_args()
+    with ResultStore(args.db) as store:
+        records: List[Dict[str, Any]] = []
+        if args.hash:
+            record = store.get_by_hash(args.hash)
+            records = [record] if record else []
+        elif args.candidate_id:
+            records = store.find_by_candidate_id(args.candidate_id)
+        elif args.family_name:
+            records = store.find_by_family_name(args.family_name)
+        elif args.date_from or args.date_to:
+            try:
+                records = store.find_by_test_date(args.date_from, args.date_to)
+            except ValueError as e:
+                parser.error(str(e))
+        for r in records:
+            print(json.dumps(r, ensure_ascii=False))
+        if args.export_json:
+            store.export_json(args.export_json)
+        if args.export_jsonl:
+            store.export_jsonl(args.export_jsonl)
@@ -0,0 +1,210 @@
+"""Named CPU runtime profiles for PaddleOCR and EasyOCR.
+
+A profile fixes the knobs that otherwise stay at library defaults:
+Paddle inference threads, MKL-DNN (oneDNN) and its shape cache, precision,
+and torch's intra-op thread count for EasyOCR. Every engine constructor
+takes `runtime_profile=`; when it is None the profile comes from the
+`OCR_RUNTIME_PROFILE` environment variable, then from the file written by
+calibration, else library defaults are kept.
+
+Calibrate on this machine (each profile is benchmarked in a fresh process):
+  python runtime_profiles.py --calibrate input --engine paddle --goal latency
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from typing import Any, Dict, List, Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILE = os.environ.get("OCR_RUNTIME_PROFILE_FILE", "runtime_profile.json")
+
+_CORES = os.cpu_count() or 1
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # one request at a time, as fast as possible: every core on one inference
+    "latency": {
+        "cpu_threads": _CORES,
+        "enable_mkldnn": True,
+        "mkldnn_cache_capacity": 10,
+        "precision": "fp32",
+        "torch_threads": _CORES,
+    },
+    # several engine instances / workers side by side: few threads each
+    "throughput": {
+        "cpu_threads": max(1, _CORES // 4),
+        "enable_mkldnn": True,
+        "mkldnn_cache_capacity": 20,
+        "precision": "fp32",
+        "torch_threads": max(1, _CORES // 4),
+    },
+    # small containers: no oneDNN primitive caches, two threads
+    "low-memory": {
+        "cpu_threads": min(2, _CORES),
+        "enable_mkldnn": False,
+        "mkldnn_cache_capacity": 1,
+        "precision": "fp32",
+        "torch_threads": min(2, _CORES),
+    },
+}
+
+
+def resolve_profile(name: Optional[str] = None) -> Optional[str]:
+    """Explicit name > $OCR_RUNTIME_PROFILE > calibration file > None (library defaults)."""
+    name = name or os.environ.get("OCR_RUNTIME_PROFILE")
+    if not name and os.path.exists(CALIBRATION_FILE):
+        try:
+            with open(CALIBRATION_FILE, "r", encoding="utf-8") as f:
+                name = json.load(f).get("profile")
+        except (OSError, ValueError):
+            name = None
+    if name and name not in PROFILES:
+        raise ValueError(f"Unknown runtime profile '{name}'. Use one of: {', '.join(PROFILES)}")
+    return name
+
+
+def paddle_runtime_args(name: Optional[str]) -> Dict[str, Any]:
+    """Constructor kwargs for PaddleOCR / TextDetection / TextRecognition."""
+    if not name:
+        return {}
+    p = PROFILES[name]
+    return {
+        "device": "cpu",
+        "cpu_threads": p["cpu_threads"],
+        "enable_mkldnn": p["enable_mkldnn"],
+        "mkldnn_cache_capacity": p["mkldnn_cache_capacity"],
+        "precision": p["precision"],
+    }
+
+
+def easy_runtime_args(name: Optional[str]) -> Dict[str, Any]:
+    """Constructor kwargs for `easyocr.Reader`; also applies the torch thread count."""
+    if not name:
+        return {}
+    apply_torch_threads(name)
+    return {"gpu": False}
+
+
+def apply_torch_threads(name: Optional[str]) -> None:
+    if not name:
+        return
+    import torch
+    torch.set_num_threads(PROFILES[name]["torch_threads"])
+
+
+def activate(name: Optional[str] = None, engine: str = "") -> Optional[str]:
+    """Resolve a profile and make it visible in logs and metrics; returns the resolved name."""
+    name = resolve_profile(name)
+    metrics.set_info("runtime_profile", name or "default")
+    if name:
+        logger.info("%s: using CPU runtime profile '%s' %s", engine or "engine", name, PROFILES[name])
+    else:
+        logger.info("%s: no CPU runtime profile, using library defaults", engine or "engine")
+    return name
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB; None where `resource` is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _bench_one(profile: str, engine_name: str, image_paths: List[str], repeat: int) -> Dict[str, Any]:
+    """Measure one profile in this process (called in a fresh subprocess by `calibrate`)."""
+    from engine import create_engine
+    start = time.perf_counter()
+    engine = create_engine(engine_name, runtime_profile=profile)
+    load_s = time.perf_counter() - start
+    engine.predict_multi_and_extract(image_paths[:1])  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        for p in image_paths:
+            t = time.perf_counter()
+            engine.predict_multi_and_extract([p])
+            latencies.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        engine.predict_multi_and_extract(image_paths)
+    batch_s = time.perf_counter() - t
+    return {
+        "profile": profile,
+        "load_s": load_s,
+        "latency_s": sorted(latencies)[len(latencies) // 2],
+        "images_per_sec": repeat * len(image_paths) / batch_s,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+GOALS = {
+    "latency": lambda r: r["latency_s"],
+    "throughput": lambda r: -r["images_per_sec"],
+    "memory": lambda r: r["peak_rss_mb"] if r["peak_rss_mb"] is not None else float("inf"),
+}
+
+
+def calibrate(input_folder: str, engine_name: str = "paddle", goal: str = "latency", repeat: int = 2, max_images: int = 8) -> Dict[str, Any]:
+    image_paths = [
+        os.path.join(input_folder, filename)
+        for filename in sorted(os.listdir(input_folder))
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ][:max_images]
+    if not image_paths:
+        raise ValueError(f"No images found in {input_folder}")
+
+    results = []
+    for profile in PROFILES:
+        cmd = [sys.executable, os.path.abspath(__file__), "--bench-one", profile,
+               "--engine", engine_name, "--repeat", str(repeat), *image_paths]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            logger.warning("profile %s failed: %s", profile, proc.stderr.strip()[-500:])
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.0f}MB" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{profile:>12}: load {result['load_s']:.1f}s  latency {result['latency_s'] * 1000:.0f}ms  "
+              f"{result['images_per_sec']:.2f} img/s  peak RSS {rss}")
+    if not results:
+        raise RuntimeError("Every profile failed to run")
+    if goal == "memory" and all(r["peak_rss_mb"] is None for r in results):
+        raise RuntimeError("Peak memory can't be measured on this platform; use --goal latency or throughput")
+
+    best = min(results, key=GOALS[goal])
+    choice = {"profile": best["profile"], "engine": engine_name, "goal": goal, "results": results}
+    with open(CALIBRATION_FILE, "w", encoding="utf-8") as f:
+        json.dump(choice, f, indent=2)
+    return choice
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark CPU runtime profiles and pick one for this machine")
+    p.add_argument("--calibrate", metavar="INPUT_FOLDER", help="Folder with sample images")
+    p.add_argument("--engine", default="paddle", help="Engine to calibrate (see engine.ENGINE_NAMES)")
+    p.add_argument("--goal", default="latency", choices=list(GOALS), help="What the chosen profile optimizes")
+    p.add_argument("--repeat", type=int, default=2, help="Passes over the sample images per profile")
+    p.add_argument("--bench-one", metavar="PROFILE", help=argparse.SUPPRESS)
+    p.add_argument("images", nargs="*", help=argparse.SUPPRESS)
+    return p
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = _build_parser().parse_args()
+    if args.bench_one:
+        print(json.dumps(_bench_one(args.bench_one, args.engine, args.images, args.repeat)))
+    elif args.calibrate:
+        choice = calibrate(args.calibrate, args.engine, args.goal, args.repeat)
+        print(f"Chosen profile: {choice['profile']} (goal: {args.goal}), saved to {CALIBRATION_FILE}")
+    else:
+        _build_parser().print_help()
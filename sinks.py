@@ -0,0 +1,216 @@
+"""Streaming outputs for annotated images.
+
+Instead of returning every annotated page in a list, engines hand each one to
+an `ImageSink` as soon as it is drawn. Sinks encode on a small thread pool fed
+by a bounded queue: when encoding falls behind, `submit` blocks, so at most
+`max_queue` annotated images wait in memory whatever the batch size.
+
+    with DirectorySink("output_annotated") as sink:
+        extracted = stream_annotated(Paddle(), image_paths, sink, chunk_size=16)
+"""
+import os
+import queue
+import hashlib
+import inspect
+import zipfile
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+import cv2
+import numpy as np
+from profiler import stage
+
+_STOP = object()
+
+
+def annotated_name(image_path: str, ext: str = ".png") -> str:
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return f"{stem}_annotated{ext}"
+
+
+def hashed_name(name: str, image_path: str) -> str:
+    """`name` with a short hash of the input's absolute path before the extension."""
+    root, ext = os.path.splitext(name)
+    digest = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest()[:8]
+    return f"{root}_{digest}{ext}"
+
+
+class ImageSink:
+    """Base sink: bounded queue + worker threads calling `write(image_path, img)`.
+
+    Sinks that name their outputs (`name_fn`) give each input path its own name:
+    the first path to take a name keeps it, a later path with the same name
+    (same file stem in another directory) gets `hashed_name` instead.
+    """
+
+    name_fn: Optional[Callable[[str, str], str]] = None
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, taken: Iterable[str] = ()) -> None:
+        # output name -> input path that owns it (None: already present, e.g. in an appended archive)
+        self._owners: Dict[str, Optional[str]] = dict.fromkeys(taken)
+        self._names: Dict[str, str] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._errors: List[BaseException] = []
+        self.written = 0
+        self._count_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sink-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def write(self, image_path: str, img: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _claim_name(self, image_path: str) -> None:
+        if self.name_fn is None or image_path in self._names:
+            return
+        name = self.name_fn(image_path, self.ext)
+        if self._owners.setdefault(name, image_path) != image_path:
+            name = hashed_name(name, image_path)
+            self._owners[name] = image_path
+        self._names[image_path] = name
+
+    def output_name(self, image_path: str) -> str:
+        """Name the image of `image_path` is written under (claimed in submit order)."""
+        return self._names[image_path]
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                with stage("encode"):
+                    self.write(*item)
+                with self._count_lock:
+                    self.written += 1
+            except BaseException as e:  # surfaced by close()
+                self._errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, image_path: str, img: Optional[np.ndarray]) -> None:
+        """Queue one annotated image; blocks while `max_queue` images are pending."""
+        if self._errors:
+            raise self._errors[0]
+        if img is not None:
+            # named on the submitting thread, so which duplicate keeps the plain name doesn't race
+            self._claim_name(image_path)
+            self._queue.put((image_path, img))
+
+    def close(self) -> None:
+        """Wait for pending images, stop the workers and re-raise the first write error."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def __enter__(self) -> "ImageSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class DirectorySink(ImageSink):
+    def __init__(self, out_dir: str, ext: str = ".png", name_fn: Callable[[str, str], str] = annotated_name, **kwargs) -> None:
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.ext = ext
+        self.name_fn = name_fn
+        super().__init__(**kwargs)
+
+    def write(self, image_path: str, img: np.ndarray) -> None:
+        ok, data = cv2.imencode(self.ext, img)
+        if not ok:
+            raise RuntimeError(f"Failed to encode annotated image for {image_path}")
+        data.tofile(os.path.join(self.out_dir, self.output_name(image_path)))
+
+
+class ZipSink(ImageSink):
+    """Encodes in parallel; only the archive append is serialized.
+
+    `mode="a"` appends to an existing archive (resumed runs); one left without
+    its central directory by a killed run is kept as `<zip>.partial` and a new
+    archive is started.
+    """
+
+    def __init__(self, zip_path: str, ext: str = ".jpg", name_fn: Callable[[str, str], str] = annotated_name,
+                 mode: str = "w", **kwargs) -> None:
+        self.ext = ext
+        self.name_fn = name_fn
+        try:
+            # mode "a" would silently start a new archive after the unreadable bytes
+            if mode == "a" and os.path.exists(zip_path) and os.path.getsize(zip_path) and not zipfile.is_zipfile(zip_path):
+                raise zipfile.BadZipFile(f"{zip_path} has no central directory")
+            self._zip = zipfile.ZipFile(zip_path, mode, compression=zipfile.ZIP_STORED)
+        except zipfile.BadZipFile:
+            os.replace(zip_path, zip_path + ".partial")
+            self._zip = zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED)
+        self._zip_lock = threading.Lock()
+        super().__init__(taken=self._zip.namelist(), **kwargs)
+
+    def write(self, image_path: str, img: np.ndarray) -> None:
+        ok, data = cv2.imencode(self.ext, img)
+        if not ok:
+            raise RuntimeError(f"Failed to encode annotated image for {image_path}")
+        with self._zip_lock:
+            self._zip.writestr(self.output_name(image_path), data.tobytes())
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._zip.close()
+
+
+class CallbackSink(ImageSink):
+    """Calls `callback(image_path, payload)` from a worker thread.
+
+    `payload` is the encoded bytes when `ext` is given, else the BGR image itself.
+    """
+
+    def __init__(self, callback: Callable[[str, object], None], ext: Optional[str] = None, **kwargs) -> None:
+        self.callback = callback
+        self.ext = ext
+        super().__init__(**kwargs)
+
+    def write(self, image_path: str, img: np.ndarray) -> None:
+        if self.ext is None:
+            self.callback(image_path, img)
+            return
+        ok, data = cv2.imencode(self.ext, img)
+        if not ok:
+            raise RuntimeError(f"Failed to encode annotated image for {image_path}")
+        self.callback(image_path, data.tobytes())
+
+
+def open_sink(target: str, append: bool = False, **kwargs) -> ImageSink:
+    """`.zip` path -> ZipSink, anything else -> DirectorySink; `append` keeps an existing archive."""
+    if target.lower().endswith(".zip"):
+        return ZipSink(target, mode="a" if append else "w", **kwargs)
+    return DirectorySink(target, **kwargs)
+
+
+def stream_annotated(engine, image_paths: List[str], sink: ImageSink, chunk_size: int = 16) -> Dict[str, str]:
+    """Run `engine` over `image_paths` in chunks, streaming annotated images into `sink`.
+
+    Peak memory is one chunk of decoded pages plus the sink's queue. Engines
+    with a `sink` parameter submit each page as it is drawn; others are
+    drained after each chunk.
+    """
+    takes_sink = "sink" in inspect.signature(engine.predict_multi_and_extract).parameters
+    dict_extracted: Dict[str, str] = {}
+    for start in range(0, len(image_paths), chunk_size):
+        chunk = image_paths[start:start + chunk_size]
+        if takes_sink:
+            _, extracted = engine.predict_multi_and_extract(chunk, sink=sink)
+        else:
+            images_annotated, extracted = engine.predict_multi_and_extract(chunk)
+            for p, img in zip(chunk, images_annotated):
+                sink.submit(p, img)
+            del images_annotated
+        dict_extracted.update(extracted)
+    return dict_extracted
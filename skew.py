@@ -0,0 +1,117 @@
+"""Cheap rotation / skew pre-check used to gate PaddleOCR's model-based stages.
+
+Estimates, from projection profiles of a downscaled binarized page:
+  - 90/270 degree rotation: text lines give a peaky row profile and a flat
+    column profile; a rotated page gives the opposite
+  - skew: angle that maximizes the row-profile sharpness
+  - warp: disagreement between the skew of the left and right parts of the page
+
+Upside-down pages look like clean ones to a projection profile; they are
+caught afterwards by their low recognition scores (see `Paddle.orientation_gate`).
+
+Tens of milliseconds per image on CPU, versus a classifier + UVDoc pass.
+
+Usage:
+  python skew.py input
+"""
+import os
+import sys
+from typing import NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+
+
+class SkewEstimate(NamedTuple):
+    rotation: int  # 0, or 90 for a page turned sideways (90 and 270 look alike here)
+    skew: float  # degrees to rotate (OpenCV convention) to level the text lines
+    warp: float  # degrees of skew disagreement across the page
+    needs_orientation: bool
+    needs_unwarp: bool
+
+
+def binarize(gray: np.ndarray, max_side: int = 512) -> np.ndarray:
+    """Downscale to `max_side` and return a 0/1 float32 ink mask (text = 1)."""
+    h, w = gray.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return ink.astype(np.float32)
+
+
+def _rotate(ink: np.ndarray, angle: float) -> np.ndarray:
+    if angle == 0:
+        return ink
+    h, w = ink.shape
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(ink, M, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+
+
+def profile_sharpness(ink: np.ndarray) -> float:
+    """Coefficient of variation of the row profile (higher = crisper text lines)."""
+    rows = ink.sum(axis=1)
+    mean = rows.mean()
+    return float(rows.std() / mean) if mean > 0 else 0.0
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = 15.0, step: float = 1.0) -> Tuple[float, float]:
+    """(angle, sharpness) of the best row profile; coarse search then a finer pass."""
+    best_angle, best = 0.0, profile_sharpness(ink)
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        s = profile_sharpness(_rotate(ink, float(angle)))
+        if s > best:
+            best_angle, best = float(angle), s
+    fine = step / 4
+    for angle in np.arange(best_angle - step + fine, best_angle + step, fine):
+        s = profile_sharpness(_rotate(ink, float(angle)))
+        if s > best:
+            best_angle, best = float(angle), s
+    return best_angle, best
+
+
+def check_orientation(
+    gray: np.ndarray,
+    skew_threshold: float = 5.0,
+    warp_threshold: float = 2.0,
+    rotation_ratio: float = 1.5,
+) -> SkewEstimate:
+    """Estimate rotation/skew of a grayscale page and whether the heavy stages are needed."""
+    ink = binarize(gray)
+    if ink.sum() == 0:
+        return SkewEstimate(0, 0.0, 0.0, False, False)
+
+    skew, sharp = estimate_skew(ink)
+    _, sharp_t = estimate_skew(np.ascontiguousarray(ink.T), step=3.0)
+    rotation = 0
+    if sharp_t > rotation_ratio * sharp:
+        rotation = 90
+
+    warp = 0.0
+    if rotation == 0:
+        w = ink.shape[1]
+        left, _ = estimate_skew(ink[:, : w // 2], max_angle=abs(skew) + 5)
+        right, _ = estimate_skew(ink[:, w // 2:], max_angle=abs(skew) + 5)
+        warp = abs(left - right)
+
+    return SkewEstimate(
+        rotation,
+        skew,
+        warp,
+        needs_orientation=rotation != 0,
+        needs_unwarp=rotation != 0 or abs(skew) > skew_threshold or warp > warp_threshold,
+    )
+
+
+def check_orientation_file(path: str, **kwargs) -> Optional[SkewEstimate]:
+    """Pre-check straight from disk at half resolution (JPEG decodes at reduced size)."""
+    gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if gray is None:
+        return None
+    return check_orientation(gray, **kwargs)
+
+
+if __name__ == "__main__":
+    input_folder = sys.argv[1] if len(sys.argv) > 1 else "input"
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            print(filename, check_orientation_file(os.path.join(input_folder, filename)))
@@ -1,9 +1,13 @@
 import streamlit as st
 import os
+import time
 from PIL import Image
 from typing import Dict
 import ast
 from ui import inject_css, render_header
+import metrics
+from ocr_daemon import connect_daemon
+from prefilter import check_certificate_file
 
 def parse_result_string(result_str: str) -> Dict:
     """Chuyển đổi string kết quả thành dictionary."""
@@ -14,12 +18,28 @@ def parse_result_string(result_str: str) -> Dict:
     except Exception:
         return {}
 
+# tham số readtext trước đây của app (greedy decoder, batch 16), dùng cho cả daemon lẫn engine trong process
+EASY_PARAMS = dict(
+    decoder="greedy",
+    batch_size=16,
+    blocklist='~`\'!@#$%^&*_+-={}[]|;:"<>,?\\',
+    low_text=0.3,
+    min_size=10,
+)
+
 # Lazy loading OCR engines
 @st.cache_resource
 def load_easyocr():
-    """Load EasyOCR model khi cần."""
-    import easyocr
-    return easyocr.Reader(['en'])
+    """Load EasyOCR engine khi cần (cùng engine và tham số với daemon)."""
+    from Easy import Easy
+    # profile: $OCR_RUNTIME_PROFILE hoặc runtime_profile.json (torch threads, CPU)
+    return Easy(**EASY_PARAMS)
+
+@st.cache_resource
+def load_rec_cache():
+    """Cache nhận dạng theo crop, dùng chung giữa các lần chỉnh tham số detection."""
+    from rec_cache import RecognitionCache
+    return RecognitionCache(max_entries=50000)
 
 @st.cache_resource
 def load_paddleocr(
@@ -33,14 +53,16 @@ def load_paddleocr(
     textline_orientation_batch_size: int = 8,
     text_det_box_thresh: float = 0.7,
     text_det_thresh: float = 0.3,
+    orientation_gate: bool = True,
+    use_rec_cache: bool = False,
 ):
     """Load PaddleOCR model khi cần (được cache theo tham số)."""
-    from paddleocr import PaddleOCR
-    return PaddleOCR(
+    from Paddle import Paddle
+    return Paddle(
         text_detection_model_name=text_detection_model_name,
         text_recognition_model_name=text_recognition_model_name,
-        # text_detection_model_dir=text_detection_model_name,
-        # text_recognition_model_dir=text_recognition_model_name,
+        text_detection_model_dir=None,
+        text_recognition_model_dir=None,
         text_recognition_batch_size=text_recognition_batch_size,
         use_doc_orientation_classify=use_doc_orientation_classify,
         use_doc_unwarping=use_doc_unwarping,
@@ -49,30 +71,27 @@ def load_paddleocr(
         textline_orientation_batch_size=textline_orientation_batch_size,
         text_det_box_thresh=text_det_box_thresh,
         text_det_thresh=text_det_thresh,
+        # chỉ chạy orientation/unwarp cho ảnh mà pre-check thấy bị xoay/nghiêng
+        orientation_gate=orientation_gate,
+        # tuỳ chọn: crop đã nhận dạng ở lần chạy trước (tham số det khác) được lấy lại từ cache;
+        # có cache thì Paddle tách det / rec riêng thay vì pipeline PaddleOCR mặc định
+        rec_cache=load_rec_cache() if use_rec_cache else None,
     )
 
 def process_with_easyocr(image_paths):
     """Xử lý OCR bằng EasyOCR."""
-    from utils import post_process
-    reader = load_easyocr()
-    ocr_results = {}
-    for image_path in image_paths:
-        result = reader.readtext(image_path, batch_size= 16,
-                         blocklist= '~`\'!@#$%^&*_+-={}[]|;:"<>,?\\',
-                         low_text= 0.3, min_size= 10)
-        texts = [res[1] for res in result]
-        ocr_results[image_path] = str(post_process(texts))
+    # daemon đang chạy (python ocr_daemon.py): dùng model đã nạp sẵn, app không load model;
+    # không thì cùng engine `Easy` trong process, nên kết quả không phụ thuộc daemon
+    ocr = connect_daemon("easyocr", annotate=False, **EASY_PARAMS) or load_easyocr()
+    _, ocr_results = ocr.predict_multi_and_extract(image_paths)
     return ocr_results
 
-def process_with_paddleocr(image_paths, paddle_params: Dict):
+def process_with_paddleocr(image_paths, paddle_params: Dict, use_rec_cache: bool = False):
     """Xử lý OCR bằng PaddleOCR."""
-    import numpy as np
-    from utils import post_process
-    ocr = load_paddleocr(**paddle_params)
-    results = ocr.predict(input=image_paths)
-    ocr_results = {}
-    for result in results:
-        ocr_results[result["input_path"]] = str(post_process(np.array(result['rec_texts'])))
+    # cache nhận dạng nằm trong process của app: khi bật thì không qua daemon
+    ocr = None if use_rec_cache else connect_daemon("paddle", annotate=False, **paddle_params)
+    ocr = ocr or load_paddleocr(**paddle_params, use_rec_cache=use_rec_cache)
+    _, ocr_results = ocr.predict_multi_and_extract(image_paths)
     return ocr_results
 
 # Giao diện Streamlit
@@ -101,6 +120,7 @@ with st.sidebar:
     
     # Tuỳ chọn cho PaddleOCR
     paddle_params = None
+    use_rec_cache = False
     if ocr_engine == "PaddleOCR":
         with st.expander("🔧 Tuỳ chọn PaddleOCR", expanded=False):
             det_model = st.selectbox(
@@ -120,6 +140,17 @@ with st.sidebar:
             use_doc_orientation = st.checkbox("use_doc_orientation_classify", value=False)
             use_unwarp = st.checkbox("use_doc_unwarping", value=False)
             use_textline_orient = st.checkbox("use_textline_orientation", value=False)
+            orientation_gate = st.checkbox(
+                "Chỉ bật khi ảnh bị xoay/nghiêng (pre-check)",
+                value=True,
+                help="Ước lượng nhanh góc xoay/nghiêng bằng OpenCV; ảnh scan thẳng bỏ qua các model orientation/unwarp"
+            )
+            use_rec_cache = st.checkbox(
+                "Cache nhận dạng theo crop",
+                value=False,
+                help="Khi chỉnh tham số det, crop đã nhận dạng được lấy lại từ cache. "
+                     "Chạy det / rec tách riêng thay cho pipeline PaddleOCR, nên cách cắt crop và thứ tự box có thể khác"
+            )
             det_unclip = st.number_input(
                 "text_det_unclip_ratio",
                 min_value=0.1, max_value=5.0, value=1.2, step=0.1
@@ -148,7 +179,20 @@ with st.sidebar:
                 textline_orientation_batch_size=textline_bs,
                 text_det_box_thresh=det_box_thresh,
                 text_det_thresh=det_thresh,
+                orientation_gate=orientation_gate,
             )
+            gate_images = int(metrics.get("orientation_gate.images"))
+            if gate_images:
+                st.caption(
+                    f"Pre-check: {gate_images} ảnh, bỏ qua {int(metrics.get('orientation_gate.stages_skipped'))} "
+                    f"lần chạy orientation/unwarp, {int(metrics.get('orientation_gate.fallback'))} ảnh chạy lại"
+                )
+    
+    use_prefilter = st.checkbox(
+        "Bỏ qua ảnh không phải IELTS TRF (pre-filter)",
+        value=False,
+        help="Kiểm tra nhanh bố cục/màu (vài chục ms/ảnh) trước khi OCR; selfie, trang trắng, tài liệu khác trả về ngay kèm lý do"
+    )
     
     st.markdown("---")
     
@@ -205,19 +249,42 @@ if uploaded_files:
                         f.write(uploaded_file.getbuffer())
                     image_paths.append(temp_path)
                 
+                # Pre-filter: loại ảnh không giống IELTS TRF trước khi OCR
+                rejections = {}
+                filter_seconds = 0.0
+                if use_prefilter:
+                    for p in image_paths:
+                        check = check_certificate_file(p)
+                        if check is None:
+                            continue
+                        filter_seconds += check.seconds
+                        if not check.accepted:
+                            rejections[os.path.basename(p)] = check.reason
+                ocr_paths = [p for p in image_paths if os.path.basename(p) not in rejections]
+
                 # Xử lý OCR theo batch
                 st.write(f"🔍 Đang xử lý với {ocr_engine}...")
                 
-                if ocr_engine == "PaddleOCR":
-                    raw_results = process_with_paddleocr(image_paths, paddle_params)
+                ocr_start = time.perf_counter()
+                if not ocr_paths:
+                    raw_results = {}
+                elif ocr_engine == "PaddleOCR":
+                    raw_results = process_with_paddleocr(ocr_paths, paddle_params, use_rec_cache)
                 else:
-                    raw_results = process_with_easyocr(image_paths)
+                    raw_results = process_with_easyocr(ocr_paths)
+                ocr_seconds = time.perf_counter() - ocr_start
                 
-                # Chuyển đổi kết quả từ string sang dict
+                # Chuyển đổi kết quả từ string sang dict (theo thứ tự upload)
                 results = {}
-                for file_path, result_str in raw_results.items():
+                for file_path in image_paths:
                     filename = os.path.basename(file_path)
-                    results[filename] = parse_result_string(result_str)
+                    results[filename] = parse_result_string(raw_results.get(file_path, ""))
+                
+                if use_prefilter:
+                    # thời gian tiết kiệm ước lượng theo thời gian OCR trung bình của ảnh đã chạy
+                    saved = len(rejections) * ocr_seconds / len(ocr_paths) - filter_seconds if ocr_paths else 0.0
+                    st.write(f"🧹 Pre-filter: loại {len(rejections)}/{len(image_paths)} ảnh "
+                             f"({filter_seconds * 1000 / max(len(image_paths), 1):.0f} ms/ảnh), tiết kiệm ~{max(saved, 0):.1f}s")
                 
                 status.update(label="✅ Hoàn thành!", state="complete", expanded=False)
         
@@ -272,6 +339,8 @@ if uploaded_files:
                             for idx_field, (label, value) in enumerate(display_items):
                                 with metric_cols[idx_field % 2]:
                                     st.metric(label, value)
+                        elif filename in rejections:
+                            st.error(f"❌ Ảnh không giống IELTS TRF, bỏ qua OCR ({rejections[filename]})")
                         else:
                             st.error("❌ Không trích xuất được thông tin từ ảnh này")
                     
@@ -7,6 +7,7 @@ import numpy as np
 import cv2
 import streamlit.components.v1 as components
 import base64
+from ocr_daemon import connect_daemon
 
 try:
     from Paddle import Paddle
@@ -233,13 +234,15 @@ def main():
     run = st.button("Run OCR")
 
     if run and image_paths:
-        # instantiate engine
-        if engine == "PaddleOCR":
+        # daemon đang chạy (python ocr_daemon.py): dùng model đã nạp sẵn, không load trong app
+        ocr = connect_daemon("paddle" if engine == "PaddleOCR" else "easyocr")
+        # otherwise instantiate engine in-process
+        if ocr is None and engine == "PaddleOCR":
             if Paddle is None:
                 st.error("PaddleOCR integration not available. Ensure `Paddle.py` and dependencies are present.")
                 return
             ocr = Paddle()
-        else:
+        elif ocr is None:
             if Easy is None:
                 st.error("EasyOCR integration not available. Ensure `easy.py` and dependencies are present.")
                 return
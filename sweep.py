@@ -0,0 +1,250 @@
+"""Parameter sweep over a labelled image set.
+
+Measures field accuracy and throughput for every point of a parameter grid
+and writes the Pareto frontier (accuracy vs images/sec) as ready-to-use
+`create_engine(engine, **kwargs)` configs for `Paddle` / `PaddleEasy`.
+
+Detection runs once per detection config; its boxes are reused by every
+recognition and post-processing variant.
+
+Usage:
+  python sweep.py --images input --labels labels.json --output sweep.json [--grid grid.json]
+
+`labels.json` maps image file names to the expected fields, e.g.
+  {"1.jpg": {"family name": "NGUYEN", "candidate id": "123456", ...}}
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from utils import *
+
+# Mirrors the knobs exposed in the Streamlit sidebar / PaddleEasy.__init__
+DEFAULT_GRID: Dict[str, Dict[str, List[Any]]] = {
+    "det": {
+        "model_name": ["PP-OCRv5_server_det", "PP-OCRv4_server_det"],
+        "thresh": [0.3],
+        "box_thresh": [0.6, 0.7],
+        "unclip_ratio": [1.2, 1.6, 2.1],
+    },
+    "rec_paddle": {
+        "model_name": ["PP-OCRv5_mobile_rec", "PP-OCRv4_mobile_rec"],
+        "batch_size": [8, 16],
+    },
+    "rec_easy": {
+        "decoder": ["greedy", "beamsearch"],
+        "batch_size": [8, 16],
+    },
+    "post": {
+        # only used by the EasyOCR backend (PaddleEasy groups boxes into lines)
+        "group_threshold": [9, 13],
+    },
+}
+
+
+def expand(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    if not grid:
+        return []
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def normalize_value(v: Any) -> str:
+    return " ".join(str(v).lower().split())
+
+
+def field_accuracy(extracted: Dict[str, str], expected: Dict[str, str]) -> Tuple[int, int]:
+    """(correct, total) over the labelled fields of one image."""
+    correct = sum(
+        1 for k, v in expected.items()
+        if normalize_value(extracted.get(k, "")) == normalize_value(v)
+    )
+    return correct, len(expected)
+
+
+def pareto_frontier(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Points not dominated on (accuracy, images_per_sec), sorted by accuracy descending."""
+    ranked = sorted(points, key=lambda p: (-p["accuracy"], -p["images_per_sec"]))
+    frontier = []
+    best_speed = -1.0
+    for p in ranked:
+        if p["images_per_sec"] > best_speed:
+            frontier.append(p)
+            best_speed = p["images_per_sec"]
+    return frontier
+
+
+class Sweep:
+    def __init__(self, image_paths: List[str], labels: Dict[str, Dict[str, str]], grid: Dict[str, Dict[str, List[Any]]] = None):
+        self.grid = grid or DEFAULT_GRID
+        # every image is decoded once and shared by all grid points
+        self.image_paths, self.images = [], []
+        for p in image_paths:
+            img = cv2.imread(p) if os.path.basename(p) in labels else None
+            if img is not None:
+                self.image_paths.append(p)
+                self.images.append(img)
+        self.labels = [labels[os.path.basename(p)] for p in self.image_paths]
+        self._det_models: Dict[str, Any] = {}
+        self._paddle_recognizers: Dict[str, Any] = {}
+        self._easy_reader = None
+
+    def _det_model(self, model_name: str):
+        if model_name not in self._det_models:
+            from paddleocr import TextDetection
+            self._det_models[model_name] = TextDetection(model_name=model_name, limit_side_len=64, limit_type="min")
+        return self._det_models[model_name]
+
+    def _recognizer(self, backend: str, cfg: Dict[str, Any]):
+        from recognizers import EasyCropRecognizer, PaddleCropRecognizer
+        if backend == "paddle":
+            name = cfg["model_name"]
+            if name not in self._paddle_recognizers:
+                self._paddle_recognizers[name] = PaddleCropRecognizer(model_name=name)
+            rec = self._paddle_recognizers[name]
+            rec.batch_size = cfg.get("batch_size", 8)
+            return rec
+        if self._easy_reader is None:
+            import easyocr
+            self._easy_reader = easyocr.Reader(["en"], verbose=False)
+        return EasyCropRecognizer(
+            self._easy_reader,
+            decoder=cfg.get("decoder", "greedy"),
+            batch_size=cfg.get("batch_size", 8),
+            blocklist="~`'!@#$%^&*_+-={}[]|;:\"<>,?\\",
+        )
+
+    def detect(self, det_cfg: Dict[str, Any]) -> Tuple[List[List[np.ndarray]], float]:
+        model = self._det_model(det_cfg["model_name"])
+        start = time.perf_counter()
+        results = model.predict(
+            self.images,
+            batch_size=1,
+            thresh=det_cfg["thresh"],
+            box_thresh=det_cfg["box_thresh"],
+            unclip_ratio=det_cfg["unclip_ratio"],
+        )
+        polys = [[np.array(p) for p in r["dt_polys"]] for r in results]
+        return polys, time.perf_counter() - start
+
+    def recognize(self, recognizer, polys: List[List[np.ndarray]]) -> Tuple[List[List[str]], float]:
+        start = time.perf_counter()
+        crops, owners = [], []
+        for i, (img, page) in enumerate(zip(self.images, polys)):
+            for poly in page:
+                crops.append(recognizer.crop(img, poly))
+                owners.append(i)
+        texts: List[List[str]] = [[] for _ in self.images]
+        for i, (text, _) in zip(owners, recognizer.recognize(crops)):
+            texts[i].append(text)
+        return texts, time.perf_counter() - start
+
+    def score(self, pages: List[List[str]]) -> float:
+        correct = total = 0
+        for texts, expected in zip(pages, self.labels):
+            c, t = field_accuracy(post_process(np.array(texts)), expected)
+            correct += c
+            total += t
+        return correct / total if total else 0.0
+
+    def run(self) -> List[Dict[str, Any]]:
+        points = []
+        n = len(self.images)
+        backends = [("paddle", expand(self.grid.get("rec_paddle", {}))), ("easy", expand(self.grid.get("rec_easy", {})))]
+        for det_cfg in expand(self.grid["det"]):
+            polys, det_time = self.detect(det_cfg)
+            for backend, rec_cfgs in backends:
+                for rec_cfg in rec_cfgs:
+                    recognizer = self._recognizer(backend, rec_cfg)
+                    if backend == "paddle":
+                        # Paddle reads boxes in pipeline order; no line grouping variants
+                        ordered = [[page[j] for j in sort_quads(page)] for page in polys]
+                        texts, rec_time = self.recognize(recognizer, ordered)
+                        start = time.perf_counter()
+                        accuracy = self.score(texts)
+                        elapsed = det_time + rec_time + time.perf_counter() - start
+                        points.append(self._point(backend, det_cfg, rec_cfg, {}, accuracy, n / elapsed))
+                        continue
+
+                    # PaddleEasy reads reversed det order, then groups boxes into lines
+                    boxes = [[poly_to_easyocr_box(p) for p in page][::-1] for page in polys]
+                    texts, rec_time = self.recognize(recognizer, boxes)
+                    for post_cfg in expand(self.grid.get("post", {})) or [{}]:
+                        start = time.perf_counter()
+                        grouped = [
+                            group_and_flatten_boxes_texts(b, t, threshold=post_cfg.get("group_threshold", 13))[1]
+                            for b, t in zip(boxes, texts)
+                        ]
+                        accuracy = self.score(grouped)
+                        elapsed = det_time + rec_time + time.perf_counter() - start
+                        points.append(self._point(backend, det_cfg, rec_cfg, post_cfg, accuracy, n / elapsed))
+        return points
+
+    @staticmethod
+    def _point(backend, det_cfg, rec_cfg, post_cfg, accuracy, images_per_sec) -> Dict[str, Any]:
+        if backend == "paddle":
+            engine = "paddle"
+            kwargs = dict(
+                text_detection_model_name=det_cfg["model_name"],
+                text_detection_model_dir=None,
+                text_recognition_model_name=rec_cfg["model_name"],
+                text_recognition_model_dir=None,
+                text_det_thresh=det_cfg["thresh"],
+                text_det_box_thresh=det_cfg["box_thresh"],
+                text_det_unclip_ratio=det_cfg["unclip_ratio"],
+                text_recognition_batch_size=rec_cfg.get("batch_size", 8),
+            )
+        else:
+            engine = "paddleeasy"
+            kwargs = dict(
+                det_model_dir=det_cfg["model_name"],
+                thresh=det_cfg["thresh"],
+                box_thresh=det_cfg["box_thresh"],
+                unclip_ratio=det_cfg["unclip_ratio"],
+                decoder=rec_cfg.get("decoder", "greedy"),
+                batch_size=rec_cfg.get("batch_size", 8),
+                group_threshold=post_cfg.get("group_threshold", 13),
+            )
+        return {"accuracy": accuracy, "images_per_sec": images_per_sec, "engine": engine, "kwargs": kwargs}
+
+
+def load_config(sweep_path: str, rank: int = 0) -> Tuple[str, Dict[str, Any]]:
+    """Return `(engine, kwargs)` of the `rank`-th Pareto point (0 = most accurate)."""
+    with open(sweep_path, "r", encoding="utf-8") as f:
+        point = json.load(f)["pareto"][rank]
+    return point["engine"], point["kwargs"]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Sweep OCR parameters and report the accuracy/throughput Pareto frontier")
+    p.add_argument("--images", required=True, help="Folder with labelled images")
+    p.add_argument("--labels", required=True, help="JSON file: image file name -> expected fields")
+    p.add_argument("--grid", required=False, help="JSON file overriding the default parameter grid")
+    p.add_argument("--output", default="sweep.json", help="Where to write all points and the Pareto frontier")
+    return p
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    grid = None
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+    image_paths = [
+        os.path.join(args.images, filename)
+        for filename in sorted(os.listdir(args.images))
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+
+    points = Sweep(image_paths, labels, grid).run()
+    frontier = pareto_frontier(points)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"points": points, "pareto": frontier}, f, indent=2)
+    for p in frontier:
+        print(f"{p['accuracy']:.3f} acc  {p['images_per_sec']:.2f} img/s  {p['engine']} {p['kwargs']}")
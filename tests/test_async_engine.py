@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from async_engine import AsyncEngine
+
+
+class StubEngine:
+    """Blocking engine stub: `gate` holds inference, `fail` paths raise."""
+
+    def __init__(self, gate=None, delay=0.0, fail=()):
+        self.gate = gate
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if self.gate is not None:
+                self.gate.wait(5)
+            time.sleep(self.delay)
+            self.calls.extend(image_paths)
+            if image_paths[0] in self.fail:
+                raise RuntimeError(f"boom {image_paths[0]}")
+            return [np.zeros((2, 2, 3), np.uint8)], {image_paths[0]: str({"band": image_paths[0]})}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_predict_returns_image_and_extraction():
+    async def main():
+        async with AsyncEngine(StubEngine()) as ocr:
+            return await ocr.predict("a.jpg")
+
+    img, extracted = asyncio.run(main())
+    assert img.shape == (2, 2, 3)
+    assert extracted == str({"band": "a.jpg"})
+
+
+def test_each_engine_serves_one_call_at_a_time():
+    engines = [StubEngine(delay=0.02), StubEngine(delay=0.02)]
+
+    async def main():
+        async with AsyncEngine(engines) as ocr:
+            return await ocr.predict_many([f"{i}.jpg" for i in range(8)])
+
+    results = asyncio.run(main())
+    assert len(results) == 8
+    assert all(e.max_running == 1 for e in engines)
+    assert sum(len(e.calls) for e in engines) == 8
+
+
+def test_timeout_frees_slot_but_engine_returns_only_when_done():
+    gate = threading.Event()
+    engine = StubEngine(gate=gate)
+
+    async def main():
+        async with AsyncEngine(engine, max_pending=1) as ocr:
+            with pytest.raises(asyncio.TimeoutError):
+                await ocr.predict("slow.jpg", timeout=0.05)
+            # the admission slot is free again, the engine is still busy
+            assert not ocr._pending.locked()
+            assert ocr._idle.empty()
+            gate.set()
+            img, extracted = await ocr.predict("next.jpg", timeout=5)
+            assert ocr._idle.qsize() == 1
+            return extracted
+
+    assert asyncio.run(main()) == str({"band": "next.jpg"})
+    # the timed-out inference still ran to completion in its thread
+    assert engine.calls == ["slow.jpg", "next.jpg"]
+
+
+def test_cancelled_call_does_not_leak_the_engine():
+    gate = threading.Event()
+    engine = StubEngine(gate=gate)
+
+    async def main():
+        async with AsyncEngine(engine) as ocr:
+            task = asyncio.ensure_future(ocr.predict("slow.jpg"))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert ocr._idle.empty()
+            gate.set()
+            return await ocr.predict("next.jpg", timeout=5)
+
+    _, extracted = asyncio.run(main())
+    assert extracted == str({"band": "next.jpg"})
+
+
+def test_predict_many_returns_failures_as_values():
+    async def main():
+        async with AsyncEngine(StubEngine(fail={"bad.jpg"})) as ocr:
+            return await ocr.predict_many(["ok.jpg", "bad.jpg"])
+
+    results = asyncio.run(main())
+    assert results["ok.jpg"][1] == str({"band": "ok.jpg"})
+    assert isinstance(results["bad.jpg"], RuntimeError)
+
+
+def test_iter_results_keeps_at_most_window_tasks():
+    consumed = []
+
+    def paths():
+        for i in range(20):
+            consumed.append(i)
+            yield f"{i}.jpg"
+
+    async def main():
+        seen = []
+        async with AsyncEngine(StubEngine(delay=0.005, fail={"3.jpg"})) as ocr:
+            async for path, img, extracted in ocr.iter_results(paths(), window=3):
+                # results done so far plus the at most `window` tasks in flight
+                assert len(consumed) <= len(seen) + 1 + 3
+                seen.append((path, extracted))
+        return seen
+
+    seen = asyncio.run(main())
+    assert sorted(p for p, _ in seen) == sorted(f"{i}.jpg" for i in range(20))
+    failed = dict(seen)["3.jpg"]
+    assert isinstance(failed, RuntimeError)
+
+
+def test_iter_results_cancels_in_flight_tasks_on_early_exit():
+    gate = threading.Event()
+    engine = StubEngine(gate=gate)
+
+    async def main():
+        async with AsyncEngine(engine) as ocr:
+            gate.set()
+            agen = ocr.iter_results([f"{i}.jpg" for i in range(10)], window=4)
+            first = await agen.__anext__()
+            await agen.aclose()
+            return first
+
+    path, _, extracted = asyncio.run(main())
+    assert extracted == str({"band": path})
+    # the other queued requests were cancelled before reaching the engine
+    assert len(engine.calls) <= 4
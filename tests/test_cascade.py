@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import pytest
+
+from Cascade import Cascade, looks_valid
+
+GOOD = {"family name": "NGUYEN", "first name": "VAN A", "candidate id": "012345",
+        "date of birth": "01/01/2000", "band": "7.5"}
+
+
+class StubTier:
+    """Tier stub: `answers[path]` is `(fields, confidences)`; records what it was asked and given."""
+
+    def __init__(self, answers, decode_max_side=None):
+        self.answers = answers
+        self.decode_max_side = decode_max_side
+        self.seen = []
+        self.buffers = []
+        self.last_confidences = {}
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        self.seen.append(list(image_paths))
+        self.buffers.append(list(buffers))
+        extracted, annotated = {}, []
+        self.last_confidences = {}
+        for p in image_paths:
+            fields, conf = self.answers.get(p, ({}, {}))
+            extracted[p] = str(fields)
+            self.last_confidences[p] = conf
+            annotated.append(np.zeros((1, 1, 3), np.uint8) if fields else None)
+        return annotated, extracted
+
+
+@pytest.fixture
+def pages(tmp_path):
+    paths = []
+    for name in ("clean", "unsure", "blank"):
+        path = str(tmp_path / f"{name}.png")
+        cv2.imwrite(path, np.full((40, 60, 3), 255, np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_looks_valid():
+    assert looks_valid("band", "7.5")
+    assert not looks_valid("band", "75")
+    assert not looks_valid("band", "abc")
+    assert not looks_valid("candidate id", "ABCDEF")
+    assert looks_valid("family name", "NGUYEN")
+    assert not looks_valid("family name", "  ")
+
+
+def test_only_unconfident_pages_reach_the_next_tier(pages):
+    clean, unsure, blank = pages
+    fast = StubTier({
+        clean: (GOOD, {"band": 0.9}),
+        unsure: (dict(GOOD, band="7.0"), {"band": 0.2}),
+    })
+    slow = StubTier({unsure: (dict(GOOD, band="7.5"), {"band": 0.95})})
+    cascade = Cascade([fast, slow])
+
+    annotated, extracted = cascade.predict_multi_and_extract(pages)
+
+    assert fast.seen == [pages]
+    assert slow.seen == [[unsure, blank]]
+    assert eval(extracted[clean]) == GOOD
+    assert eval(extracted[unsure])["band"] == "7.5"
+    assert cascade.last_confidences[unsure]["band"] == 0.95
+    assert cascade.tier_counts == [3, 2]
+    assert cascade.tier_resolved == [1, 2]
+    assert cascade.tier_usage() == [1.0, pytest.approx(2 / 3)]
+
+
+def test_blank_page_runs_every_tier_and_keeps_empty_result(pages):
+    # a page nobody reads is sent through the whole cascade once, then given up on
+    blank = pages[2]
+    tiers = [StubTier({}), StubTier({}), StubTier({})]
+    cascade = Cascade(tiers)
+
+    annotated, extracted = cascade.predict_multi_and_extract([blank])
+
+    assert [t.seen for t in tiers] == [[[blank]]] * 3
+    assert annotated == [None]
+    assert extracted == {blank: "{}"}
+    assert cascade.tier_resolved == [0, 0, 1]
+
+
+def test_later_tier_keeps_earlier_fields_it_misses(pages):
+    unsure = pages[1]
+    fast = StubTier({unsure: (dict(GOOD, band="x"), {})})
+    slow = StubTier({unsure: ({"band": "6.5", "family name": ""}, {"band": 0.8, "family name": 0.99})})
+
+    _, extracted = Cascade([fast, slow]).predict_multi_and_extract([unsure])
+
+    fields = eval(extracted[unsure])
+    assert fields["band"] == "6.5"
+    # an implausible later reading doesn't overwrite a plausible earlier one
+    assert fields["family name"] == "NGUYEN"
+    assert fields["candidate id"] == "012345"
+
+
+def test_decode_once_and_share_buffers(pages):
+    fast, slow = StubTier({}, decode_max_side=800), StubTier({}, decode_max_side=1600)
+    cascade = Cascade([fast, slow])
+    assert cascade.decode_max_side == 1600
+    assert Cascade([fast, StubTier({})]).decode_max_side is None
+
+    cascade.predict_multi_and_extract(pages)
+    assert all(b.shared for b in fast.buffers[0])
+    assert [id(b) for b in slow.buffers[0]] == [id(b) for b in fast.buffers[0]]
+
+
+def test_custom_accept_and_min_confidence(pages):
+    clean = pages[0]
+    fast = StubTier({clean: (GOOD, {"band": 0.6})})
+    slow = StubTier({})
+    Cascade([fast, slow], min_confidence=0.7).predict_multi_and_extract([clean])
+    assert slow.seen == [[clean]]
+
+    fast, slow = StubTier({clean: (GOOD, {})}), StubTier({})
+    Cascade([fast, slow], accept=lambda p, f, c: False).predict_multi_and_extract([clean])
+    assert slow.seen == [[clean]]
+
+
+def test_needs_a_tier():
+    with pytest.raises(ValueError):
+        Cascade([])
@@ -0,0 +1,49 @@
+import numpy as np
+
+from dedup import Deduplicator
+from image_buffer import ImageBuffer
+
+
+def page(seed):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 255, (64, 48), np.uint8)
+    return np.dstack([img] * 3)
+
+
+class ScriptedEngine:
+    """Returns the queued results in order; paths listed in `fail` go to `last_failures`."""
+
+    def __init__(self, results, fail=()):
+        self.results = list(results)
+        self.fail = set(fail)
+        self.calls = []
+        self.last_failures = {}
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        self.calls.append(list(image_paths))
+        self.last_failures = {p: "timeout" for p in image_paths if p in self.fail}
+        return [None] * len(image_paths), {p: self.results.pop(0) for p in image_paths}
+
+
+def test_empty_and_failed_results_are_not_reused():
+    img = page(0)
+    engine = ScriptedEngine(["", "{}", "{'Band': '7.5'}", "unused"])
+    dedup = Deduplicator(engine)
+    for expected in ("", "{}", "{'Band': '7.5'}", "{'Band': '7.5'}"):
+        _, extracted = dedup.predict_multi_and_extract(["a.jpg"], buffers=[ImageBuffer("a.jpg", img.copy())])
+        assert extracted == {"a.jpg": expected}
+    assert len(engine.calls) == 3
+
+
+def test_engine_failures_are_not_cached_and_reach_duplicates():
+    img = page(1)
+    engine = ScriptedEngine(["{'Band': '6'}", "{'Band': '7'}"], fail={"a.jpg"})
+    dedup = Deduplicator(engine)
+    bufs = [ImageBuffer("a.jpg", img.copy()), ImageBuffer("b.jpg", img.copy())]
+    _, extracted = dedup.predict_multi_and_extract(["a.jpg", "b.jpg"], buffers=bufs)
+    assert engine.calls == [["a.jpg"]]
+    assert dedup.last_failures == {"a.jpg": "timeout", "b.jpg": "timeout"}
+    engine.fail = set()
+    _, extracted = dedup.predict_multi_and_extract(["c.jpg"], buffers=[ImageBuffer("c.jpg", img.copy())])
+    assert extracted == {"c.jpg": "{'Band': '7'}"}
+    assert dedup.last_failures == {}
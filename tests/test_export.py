@@ -0,0 +1,82 @@
+import csv
+from datetime import date
+
+import pytest
+
+from export import COLUMNS, export_records, to_row
+
+EXTRACTED = {
+    "date": "12/03/2024",
+    "family name": "NGUYEN",
+    "first name": "VAN A",
+    "candidate id": "012345",
+    "date of birth": "01 Jan 2000",
+    "sex (m/f)": "M",
+    "band": "7.5",
+    "date end": "not a date",
+}
+RECORDS = [
+    ("input/1.jpg", str(EXTRACTED), {"band": 0.91, "family name": 0.8}, 1.25),
+    ("input/2.jpg", "", None, None),
+]
+
+
+def test_to_row_types():
+    row = to_row(*RECORDS[0])
+    assert row["date"] == date(2024, 3, 12)
+    assert row["date_of_birth"] == date(2000, 1, 1)
+    assert row["date_end"] is None
+    assert row["band"] == 7.5
+    assert row["candidate_id"] == "012345"
+    assert row["conf_band"] == 0.91
+    assert row["conf_date"] is None
+    assert row["seconds"] == 1.25
+
+
+def test_csv_round_trip(tmp_path):
+    out = tmp_path / "results.csv"
+    assert export_records(RECORDS, str(out)) == 2
+
+    with open(out, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    names = [name for name, _ in COLUMNS]
+    assert rows[0] == names
+    assert names[0] == "image_path" and names[-1] == "seconds"
+    assert names.index("conf_date") == names.index("date_end") + 1
+
+    first = dict(zip(names, rows[1]))
+    assert first["image_path"] == "input/1.jpg"
+    assert first["date"] == "2024-03-12"
+    assert first["date_of_birth"] == "2000-01-01"
+    assert first["date_end"] == ""
+    assert first["band"] == "7.5"
+    assert first["candidate_id"] == "012345"
+    assert first["conf_band"] == "0.91"
+    assert first["conf_family_name"] == "0.8"
+    assert first["conf_date"] == ""
+    assert first["seconds"] == "1.25"
+
+    empty = dict(zip(names, rows[2]))
+    assert empty["image_path"] == "input/2.jpg"
+    assert all(v == "" for k, v in empty.items() if k != "image_path")
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    out = tmp_path / "results.parquet"
+    assert export_records(RECORDS * 3, str(out), row_group_size=4) == 6
+
+    f = pq.ParquetFile(str(out))
+    assert f.num_row_groups == 2
+    table = f.read()
+    assert table.column_names == [name for name, _ in COLUMNS]
+    assert str(table.schema.field("date").type) == "date32[day]"
+    assert str(table.schema.field("band").type) == "double"
+    rows = table.to_pylist()
+    assert rows[0]["date"] == date(2024, 3, 12)
+    assert rows[0]["band"] == 7.5
+    assert rows[0]["conf_band"] == 0.91
+    assert rows[0]["seconds"] == 1.25
+    assert rows[1]["band"] is None and rows[1]["seconds"] is None
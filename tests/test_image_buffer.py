@@ -0,0 +1,19 @@
+import pytest
+
+from image_buffer import buffer_chunks
+
+
+def test_buffer_chunks_slices_aligned():
+    paths = ["a", "b", "c", "d", "e"]
+    bufs = [None, "B", None, "D", "E"]
+    chunks = list(buffer_chunks(paths, bufs, 2))
+    assert chunks == [(["a", "b"], [None, "B"]), (["c", "d"], [None, "D"]), (["e"], ["E"])]
+    assert list(buffer_chunks(paths, None, None)) == [(paths, None)]
+    assert list(buffer_chunks([], None, 3)) == []
+
+
+def test_buffer_chunks_rejects_misaligned_and_bad_size():
+    with pytest.raises(ValueError):
+        list(buffer_chunks(["a", "b"], [None]))
+    with pytest.raises(ValueError):
+        list(buffer_chunks(["a"], None, 0))
@@ -0,0 +1,49 @@
+from linker import extract_fields, link_fields
+
+
+def box(x0, y0, x1, y1):
+    """PaddleEasy-style [x_min, x_max, y_min, y_max] box."""
+    return [x0, x1, y0, y1]
+
+
+def test_two_column_row():
+    # "Family Name NGUYEN   First Name AN" on one line, detected column by column
+    boxes = [box(0, 0, 120, 20), box(400, 0, 500, 20), box(130, 0, 220, 20), box(510, 0, 560, 20)]
+    texts = ["Family Name", "First Name", "NGUYEN", "AN"]
+    fields, conf = link_fields(boxes, texts, [0.9, 0.9, 0.8, 0.7])
+    assert fields == {"family name": "NGUYEN", "first name": "AN"}
+    assert conf == {"family name": 0.8, "first name": 0.7}
+
+
+def test_value_below_label():
+    boxes = [box(0, 0, 120, 20), box(0, 30, 100, 50)]
+    fields, _ = link_fields(boxes, ["Candidate ID", "012345"])
+    assert fields["candidate id"] == "012345"
+
+
+def test_missing_value_does_not_take_next_label():
+    # "Family Name" has nothing to its right; the box below it is another label
+    boxes = [box(0, 0, 120, 20), box(0, 30, 120, 50), box(200, 30, 260, 50)]
+    fields, _ = link_fields(boxes, ["Family Name", "First Name", "AN"])
+    assert "family name" not in fields
+    assert fields["first name"] == "AN"
+
+
+def test_falls_back_to_sequential_for_unlinked_fields():
+    # "Band" has no box near it, so the spatial linker can't link it; the sequential
+    # reading (next text in order) fills it in, linked fields keep the spatial value
+    boxes = [box(0, 0, 80, 20), box(90, 0, 160, 20), box(0, 500, 60, 520), box(900, 900, 940, 920)]
+    texts = ["Family Name", "NGUYEN", "Band", "7.5"]
+    spatial, _ = link_fields(boxes, texts)
+    assert "band" not in spatial
+    fields, conf = extract_fields(boxes, texts, [1.0, 1.0, 1.0, 0.6])
+    assert fields == {"family name": "NGUYEN", "band": "7.5"}
+    assert conf["band"] == 0.6
+
+
+def test_sequential_linker_is_the_old_reading():
+    boxes = [box(0, 0, 120, 20), box(400, 0, 500, 20), box(130, 0, 220, 20), box(510, 0, 560, 20)]
+    texts = ["Family Name", "First Name", "NGUYEN", "AN"]
+    fields, _ = extract_fields(boxes, texts, linker="sequential")
+    assert fields["family name"] == "First Name"
+    assert extract_fields(boxes, texts)[0] == {"family name": "NGUYEN", "first name": "AN"}
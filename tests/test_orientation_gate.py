@@ -0,0 +1,87 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("paddleocr")
+from image_buffer import ImageBuffer
+from Paddle import Paddle
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "input", "1.jpg")
+ALL_ON = {"use_doc_orientation_classify": True, "use_doc_unwarping": True, "use_textline_orientation": False}
+
+
+class FakePipeline:
+    """PaddleOCR stand-in: upside-down pages read badly unless every stage runs."""
+
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.calls = []
+
+    def predict(self, input, **overrides):
+        names = [self.kinds[id(img)] for img in input]
+        self.calls.append((names, overrides))
+        out = []
+        for name in names:
+            if name == "blank":
+                out.append({"rec_polys": [], "rec_texts": [], "rec_scores": []})
+            else:
+                score = 0.2 if name == "flipped" and overrides != ALL_ON else 0.9
+                out.append({"rec_polys": [np.zeros((4, 2))], "rec_texts": [name], "rec_scores": [score]})
+        return out
+
+
+def gated_paddle(bufs, fallback=0.5):
+    paddle = Paddle.__new__(Paddle)
+    paddle.heavy_stages = dict(ALL_ON)
+    paddle.gate_fallback_score = fallback
+    paddle.gate_stats = {"images": 0, "stages_skipped": 0, "fallback": 0}
+    paddle.ocr = FakePipeline({id(b.bgr): b.path for b in bufs})
+    return paddle
+
+
+@pytest.fixture
+def bufs():
+    page = cv2.imread(SAMPLE, cv2.IMREAD_REDUCED_COLOR_2)
+    return [
+        ImageBuffer("upright", page),
+        ImageBuffer("sideways", cv2.rotate(page, cv2.ROTATE_90_CLOCKWISE)),
+        ImageBuffer("flipped", cv2.rotate(page, cv2.ROTATE_180)),
+        ImageBuffer("blank", np.full_like(page, 255)),
+    ]
+
+
+def test_gate_runs_heavy_stages_only_where_needed(bufs):
+    paddle = gated_paddle(bufs)
+    results = paddle._predict_gated(bufs)
+
+    first_pass = {tuple(names): overrides for names, overrides in paddle.ocr.calls[:2]}
+    assert first_pass[("upright", "flipped", "blank")] == dict.fromkeys(ALL_ON, False)
+    assert first_pass[("sideways",)] == ALL_ON
+    assert paddle.last_gate["sideways"].needs_orientation
+    # 180 degrees looks clean to the pre-check
+    assert not paddle.last_gate["flipped"].needs_unwarp
+    assert [r["rec_texts"] for r in results] == [["upright"], ["sideways"], ["flipped"], []]
+
+
+def test_low_scores_and_blank_pages_rerun_with_every_stage(bufs):
+    paddle = gated_paddle(bufs)
+    results = paddle._predict_gated(bufs)
+
+    # the cheap pass read the upside-down page badly: it is run again with everything on;
+    # a blank page (mean score 0) is retried the same way, once
+    assert paddle.ocr.calls[2] == (["flipped", "blank"], ALL_ON)
+    assert len(paddle.ocr.calls) == 3
+    assert results[2]["rec_scores"] == [0.9]
+    # 2 enabled stages skipped on upright/flipped/blank, minus the 2 reruns
+    assert paddle.gate_stats == {"images": 4, "stages_skipped": 2, "fallback": 2}
+
+
+def test_no_rerun_without_fallback_score(bufs):
+    paddle = gated_paddle(bufs, fallback=None)
+    results = paddle._predict_gated(bufs)
+
+    assert len(paddle.ocr.calls) == 2
+    assert results[2]["rec_scores"] == [0.2]
+    assert paddle.gate_stats == {"images": 4, "stages_skipped": 6, "fallback": 0}
@@ -0,0 +1,78 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from prefilter import Prefilter, check_certificate, check_certificate_file
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(__file__)), "input", "*.jpg")))
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+def test_sample_certificates_pass(path):
+    check = check_certificate_file(path)
+    assert check.accepted, check.reason
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+@pytest.mark.parametrize("degrade", ["blur", "small"])
+def test_degraded_certificates_pass(path, degrade):
+    img = cv2.imread(path)
+    if degrade == "blur":
+        img = cv2.GaussianBlur(img, (0, 0), 6)
+    else:
+        img = cv2.resize(img, None, fx=0.15, fy=0.15, interpolation=cv2.INTER_AREA)
+    check = check_certificate(img)
+    assert check.accepted, check.reason
+
+
+def selfie():
+    img = np.full((640, 480, 3), (90, 140, 60), np.uint8)
+    cv2.ellipse(img, (240, 300), (140, 190), 0, 0, 360, (120, 160, 215), -1)
+    for x in (190, 290):
+        cv2.circle(img, (x, 260), 15, (40, 40, 40), -1)
+    return img
+
+
+def letter():
+    img = np.full((1400, 1000, 3), 250, np.uint8)
+    for y in range(100, 1300, 40):
+        cv2.putText(img, "Dear Sir or Madam, lorem ipsum dolor sit amet", (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (20, 20, 20), 2)
+    return img
+
+
+@pytest.mark.parametrize("make, reason", [
+    (lambda: np.full((1400, 1000, 3), 250, np.uint8), "blank"),
+    (lambda: np.random.default_rng(0).integers(0, 256, (1400, 1000, 3), dtype=np.uint8), "not_paper"),
+    (selfie, "not_paper"),
+    (lambda: np.full((480, 1400, 3), 250, np.uint8), "aspect"),
+    (letter, "no_form"),
+])
+def test_non_certificates_rejected(make, reason):
+    check = check_certificate(make())
+    assert not check.accepted
+    assert check.reason.split(":")[0] == reason
+
+
+class PathEngine:
+    def __init__(self):
+        self.calls = []
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        self.calls.append(list(image_paths))
+        return [None] * len(image_paths), {p: "{'band': '7'}" for p in image_paths}
+
+
+@pytest.mark.skipif(not SAMPLES, reason="no sample images")
+def test_prefilter_skips_rejected_images(tmp_path):
+    blank = str(tmp_path / "blank.jpg")
+    cv2.imwrite(blank, np.full((1400, 1000, 3), 250, np.uint8))
+    engine = PathEngine()
+    gate = Prefilter(engine)
+    _, extracted = gate.predict_multi_and_extract([SAMPLES[0], blank])
+    assert engine.calls == [[SAMPLES[0]]]
+    assert extracted == {SAMPLES[0]: "{'band': '7'}", blank: ""}
+    assert gate.last_rejections[blank].startswith("blank")
+    assert gate.stats()["rejected"] == 1
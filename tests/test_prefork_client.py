@@ -0,0 +1,109 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from prefork_server import PreforkClient
+from wire import recv_msg, send_msg
+
+
+class ToyServer:
+    """Accepts connections and runs `handle(conn, request_no)` for every request received."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.address = "127.0.0.1:%d" % self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._conn, args=(conn,), daemon=True).start()
+
+    def _conn(self, conn):
+        with conn:
+            while True:
+                try:
+                    header, _ = recv_msg(conn)
+                except (ConnectionError, OSError):
+                    return
+                self.requests.append(header["op"])
+                if not self.handle(conn, len(self.requests)):
+                    return
+
+    def close(self):
+        self.sock.close()
+
+
+def reply(conn, n):
+    send_msg(conn, {"ok": True, "n": n})
+    return True
+
+
+def one_per_connection(conn, n):
+    # worker restarted between requests: the kept connection is closed behind the client
+    reply(conn, n)
+    return False
+
+
+def test_closed_keep_alive_connection_is_replaced():
+    server = ToyServer(one_per_connection)
+    client = PreforkClient(server.address, timeout=2)
+    try:
+        assert client._request({"op": "ping"})[0]["n"] == 1
+        time.sleep(0.05)
+        assert client._request({"op": "ping"})[0]["n"] == 2
+    finally:
+        client.close()
+        server.close()
+    assert server.requests == ["ping", "ping"]
+    assert server.connections == 2
+
+
+def test_kept_connection_is_reused():
+    server = ToyServer(reply)
+    client = PreforkClient(server.address, timeout=2)
+    try:
+        assert client.ping() and client.ping()
+    finally:
+        client.close()
+        server.close()
+    assert server.connections == 1
+
+
+def test_read_timeout_after_send_is_not_retried():
+    server = ToyServer(lambda conn, n: reply(conn, n) if n == 1 else time.sleep(1))
+    client = PreforkClient(server.address, timeout=0.2)
+    try:
+        client._request({"op": "ping"})
+        with pytest.raises(socket.timeout):
+            client._request({"op": "predict"})
+        assert client._sock is None
+    finally:
+        client.close()
+        server.close()
+    assert server.requests == ["ping", "predict"]
+
+
+def test_worker_dying_on_the_request_is_not_retried():
+    server = ToyServer(lambda conn, n: reply(conn, n) if n == 1 else False)
+    client = PreforkClient(server.address, timeout=2)
+    try:
+        client._request({"op": "ping"})
+        with pytest.raises(ConnectionError):
+            client._request({"op": "predict"})
+    finally:
+        client.close()
+        server.close()
+    assert server.requests == ["ping", "predict"]
+    assert server.connections == 1
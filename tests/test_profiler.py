@@ -0,0 +1,84 @@
+import argparse
+import threading
+import time
+
+import profiler
+from profiler import SamplingProfiler, add_profile_argument, profiled, stage
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def worker():
+    with stage("ocr"):
+        with stage("recognize"):
+            busy_loop(0.15)
+        busy_loop(0.05)
+
+
+def test_stage_is_a_no_op_outside_a_profile():
+    before = dict(profiler._stages)
+    with stage("detect"):
+        assert profiler._stages == before
+
+
+def test_profiled_none_does_nothing(tmp_path):
+    with profiled(None) as prof:
+        assert prof is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_samples_are_tagged_by_stage_and_idle_threads_skipped(tmp_path):
+    idle = threading.Event()
+    sleeper = threading.Thread(target=idle.wait, name="idle-worker")
+    sleeper.start()
+    try:
+        with profiled(str(tmp_path / "prof" / "run"), interval=0.002) as prof:
+            t = threading.Thread(target=worker, name="ocr-worker")
+            t.start()
+            t.join()
+    finally:
+        idle.set()
+        sleeper.join()
+
+    assert not profiler._active
+    assert prof.ticks > 10 and prof.wall >= 0.2
+    threads = {thread for thread, _, _ in prof.samples}
+    assert "ocr-worker" in threads
+    assert "idle-worker" not in threads
+
+    tags = {tag for thread, tag, _ in prof.samples if thread == "ocr-worker"}
+    assert "ocr/recognize" in tags and "ocr" in tags
+
+    collapsed = (tmp_path / "prof" / "run.collapsed").read_text(encoding="utf-8").splitlines()
+    hot = [line for line in collapsed if line.startswith("ocr-worker;[ocr/recognize];")]
+    assert any("busy_loop (test_profiler.py:" in line for line in hot)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+
+    summary = (tmp_path / "prof" / "run.txt").read_text(encoding="utf-8")
+    assert "samples by stage:" in summary
+    assert "ocr/recognize" in summary
+    assert "busy_loop (test_profiler.py:" in summary.split("top functions (self):")[1]
+
+
+def test_summary_counts_recursion_once():
+    prof = SamplingProfiler()
+    code = busy_loop.__code__
+    prof.samples[("main", "-", (code, code))] = 3
+    summary = prof.summary()
+    total = summary.split("top functions (total):")[1]
+    assert "       3  100.0%  busy_loop" in total
+
+
+def test_profile_arguments():
+    parser = argparse.ArgumentParser()
+    add_profile_argument(parser)
+    assert parser.parse_args([]).profile is None
+    assert parser.parse_args(["--profile"]).profile == "profile"
+    args = parser.parse_args(["--profile", "run1", "--profile-interval", "0.01"])
+    assert (args.profile, args.profile_interval) == ("run1", 0.01)
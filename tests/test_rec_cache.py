@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+
+from rec_cache import CachedRecognizer, RecognitionCache, crop_key
+
+
+def render(text, height=48):
+    img = np.full((height, 12 + 22 * len(text)), 255, np.uint8)
+    cv2.putText(img, text, (6, height - 12), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    return img
+
+
+class CountingRecognizer:
+    def __init__(self):
+        self.calls = 0
+
+    def config_key(self):
+        return "stub"
+
+    def recognize(self, crops):
+        self.calls += len(crops)
+        return [(f"t{crop.sum()}", 0.9) for crop in crops]
+
+
+def test_similar_digit_crops_get_different_keys():
+    a, b = render("0012070"), render("0012078")
+    assert a.shape == b.shape
+    assert crop_key(a, "cfg") != crop_key(b, "cfg")
+
+
+def test_single_pixel_changes_key():
+    a = render("7.5")
+    b = a.copy()
+    b[0, 0] -= 1
+    assert crop_key(a, "cfg") != crop_key(b, "cfg")
+
+
+def test_same_crop_same_key_config_sensitive():
+    a = render("IELTS")
+    assert crop_key(a, "cfg") == crop_key(a.copy(), "cfg")
+    assert crop_key(a, "cfg") != crop_key(a, "other")
+    assert crop_key(a, "cfg") != crop_key(a.reshape(a.shape[1], a.shape[0]), "cfg")
+
+
+def test_cached_recognizer_only_recognizes_misses():
+    rec = CountingRecognizer()
+    cached = CachedRecognizer(rec, RecognitionCache(max_entries=10))
+    a, b = render("0012070"), render("0012078")
+    first = cached.recognize([a, b, None])
+    assert rec.calls == 2 and first[2] == ("", 0.0)
+    second = cached.recognize([b, a])
+    assert rec.calls == 2
+    assert second == [first[1], first[0]]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from image_buffer import ImageBuffer
+from linker import extract_fields
+from recognizers import rerecognize_low_confidence
+from replay import XXYY, Replay, ReplayRecorder
+from utils import group_reading_order
+
+
+def quad(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+# detection order Q, P, R: grouped once -> P Q | R; grouping that output again
+# merges the lines (P R Q), so replay must group the raw polygons, not the engine's output
+POLYS = [quad(200, 101, 240, 111), quad(0, 95, 40, 105), quad(100, 107, 140, 117)]
+TEXTS = ["x", "Band", "7.5"]
+SCORES = [0.3, 0.95, 0.9]
+REREAD = {(200, 240, 101, 111): ("6.5", 0.9)}
+
+
+class FakeRecognizer:
+    def crop(self, img, box, scale=1.0):
+        return tuple(box)
+
+    def recognize(self, crops):
+        return [REREAD.get(c, ("", 0.0)) for c in crops]
+
+
+class FakeDetector:
+    def predict(self, batch, batch_size=1):
+        return [{"dt_polys": [np.array(p) for p in POLYS[::-1]]} for _ in batch]
+
+
+class FixedRecognizer(FakeRecognizer):
+    def recognize(self, crops):
+        by_box = {tuple([p[0][0], p[1][0], p[0][1], p[2][1]]): (t, s) for p, t, s in zip(POLYS, TEXTS, SCORES)}
+        return [by_box[c] for c in crops]
+
+
+def live_run(rerec_threshold):
+    boxes, order = group_reading_order(POLYS, 9.0)
+    texts, scores = [TEXTS[j] for j in order], [SCORES[j] for j in order]
+    readings = []
+    rerecognize_low_confidence(FakeRecognizer(), [(np.zeros(1), boxes, texts, scores)], rerec_threshold,
+                               readings_out=readings)
+    fields, _ = extract_fields(boxes, texts, scores, "sequential")
+    return str(fields), {order[j]: r for j, r in readings[0].items()}
+
+
+def test_raw_record_replays_to_live_extraction(tmp_path):
+    expected, rerec = live_run(0.5)
+    assert expected == str({"band": "6.5"})
+    recorder = ReplayRecorder(str(tmp_path / "a"), "paddleeasy")
+    recorder.add("a.jpg", XXYY, POLYS, TEXTS, SCORES, (200, 300, 3), rerec=rerec, rerec_threshold=0.5, group_threshold=9.0)
+    recorder.close()
+    replay = Replay(str(tmp_path / "a"), field_linker="sequential")
+    assert replay.predict_multi_and_extract(["a.jpg"])[1] == {"a.jpg": expected}
+    # lowering the threshold at replay time drops the re-reading
+    replay = Replay(str(tmp_path / "a"), field_linker="sequential", rerec_threshold=0.2)
+    assert replay.predict_multi_and_extract(["a.jpg"])[1] == {"a.jpg": str({"band": "x"})}
+
+
+def test_paddleeasy_recording_replays_identically(tmp_path):
+    pytest.importorskip("paddleocr")
+    pytest.importorskip("easyocr")
+    from PaddleEasy import PaddleEasy
+
+    engine = PaddleEasy.__new__(PaddleEasy)
+    engine.__dict__.update(
+        det_model=FakeDetector(), recognizer=FixedRecognizer(), rerecognizer=FakeRecognizer(),
+        tile_size=None, det_batch_size=4, group_threshold=9.0, rerec_threshold=0.5, rerec_scale=1.0,
+        field_linker="sequential", decode_max_side=None, stream_chunk_size=8, result_store=None,
+        recorder=ReplayRecorder(str(tmp_path / "a"), "paddleeasy"), last_confidences={}, last_rerecognized=0,
+    )
+    buf = ImageBuffer("a.jpg", np.zeros((200, 300, 3), np.uint8))
+    _, live = engine.predict_multi_and_extract(["a.jpg"], buffers=[buf])
+    engine.recorder.close()
+    assert live == {"a.jpg": str({"band": "6.5"})}
+    replay = Replay(str(tmp_path / "a"), field_linker="sequential")
+    assert replay.predict_multi_and_extract(["a.jpg"])[1] == live
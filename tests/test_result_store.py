@@ -0,0 +1,33 @@
+import pytest
+
+from result_store import ResultStore
+
+
+def record(date, name="NGUYEN"):
+    return str({"family name": name, "candidate id": "123456", "date": date})
+
+
+def test_upsert_keeps_row_id_and_updates_fields(tmp_path):
+    with ResultStore(str(tmp_path / "r.db")) as store:
+        store.add_many({"a.jpg": record("01/02/2024"), "b.jpg": record("05/03/2024")}, hashes={"a.jpg": "ha", "b.jpg": "hb"})
+        first_id = store.get_by_hash("ha")["id"]
+        store.add_many({"a2.jpg": record("01/02/2024", "TRAN")}, hashes={"a2.jpg": "ha"})
+        row = store.get_by_hash("ha")
+        assert len(store) == 2
+        assert row["id"] == first_id
+        assert row["image_path"] == "a2.jpg" and row["family_name"] == "TRAN"
+        assert [r["image_hash"] for r in store.iter_records()] == ["ha", "hb"]
+
+
+def test_date_range_accepts_certificate_formats(tmp_path):
+    with ResultStore(str(tmp_path / "r.db")) as store:
+        store.add_many({"a.jpg": record("01/02/2024"), "b.jpg": record("05/03/2024")}, hashes={"a.jpg": "ha", "b.jpg": "hb"})
+        assert [r["image_hash"] for r in store.find_by_test_date("2024-02-01", "10/02/2024")] == ["ha"]
+        assert [r["image_hash"] for r in store.find_by_test_date(end="2024-12-31")] == ["ha", "hb"]
+
+
+@pytest.mark.parametrize("bounds", [("2024-13-01", None), (None, "last week"), ("31/02/2024", "2024-12-31")])
+def test_unparseable_date_bound_raises(tmp_path, bounds):
+    with ResultStore(str(tmp_path / "r.db")) as store:
+        with pytest.raises(ValueError):
+            store.find_by_test_date(*bounds)
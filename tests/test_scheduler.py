@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+from image_buffer import ImageBuffer
+from Scheduler import Scheduler
+
+
+class StubEngine:
+    """Reads like a real engine: a None buffer means the input is unreadable."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.last_confidences = {}
+        self.calls = []
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        self.calls.append((list(image_paths), buffers))
+        if self.fail:
+            raise RuntimeError("engine down")
+        time.sleep(self.delay)
+        if buffers is None:
+            buffers = [ImageBuffer(p, np.zeros((4, 4, 3), np.uint8)) for p in image_paths]
+        extracted = {p: ("{'ok': 1}" if b is not None else "") for p, b in zip(image_paths, buffers)}
+        self.last_confidences = {p: {"ok": 1.0} for p, b in zip(image_paths, buffers) if b is not None}
+        return [None] * len(image_paths), extracted
+
+
+def test_paths_only_reach_engine_without_buffers():
+    engine = StubEngine()
+    paths = ["a.jpg", "b.jpg", "c.jpg"]
+    direct = engine.predict_multi_and_extract(paths)[1]
+    with Scheduler([engine], size_weights=False) as scheduler:
+        _, extracted = scheduler.predict_multi_and_extract(paths)
+    assert extracted == direct == {p: "{'ok': 1}" for p in paths}
+    assert scheduler.last_confidences == {p: {"ok": 1.0} for p in paths}
+    assert all(buffers is None for _, buffers in engine.calls[1:])
+
+
+def test_given_buffers_are_passed_through():
+    engine = StubEngine()
+    bufs = [ImageBuffer("a.jpg", np.zeros((4, 4, 3), np.uint8)), None]
+    with Scheduler([engine], size_weights=False, max_batch=1) as scheduler:
+        _, extracted = scheduler.predict_multi_and_extract(["a.jpg", "b.jpg"], buffers=bufs)
+    assert extracted == {"a.jpg": "{'ok': 1}", "b.jpg": "{'ok': 1}"}
+    assert engine.calls[0][1] == [bufs[0]]
+
+
+def test_failing_lane_keeps_no_latency():
+    broken, healthy = StubEngine(fail=True), StubEngine(delay=0.01)
+    with Scheduler([broken, healthy], names=["broken", "healthy"], size_weights=False, max_batch=1) as scheduler:
+        futures = [scheduler.submit(f"{i}.jpg") for i in range(6)]
+        errors = 0
+        for fut in futures:
+            try:
+                fut.result()
+            except RuntimeError:
+                errors += 1
+        stats = {row["name"]: row for row in scheduler.stats()}
+    assert errors >= 1
+    assert stats["broken"]["latency"] is None
+    assert stats["healthy"]["latency"] == pytest.approx(0.01, abs=0.05)
@@ -0,0 +1,143 @@
+import os
+import threading
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from sinks import (CallbackSink, DirectorySink, ImageSink, ZipSink, annotated_name, hashed_name, open_sink,
+                   stream_annotated)
+
+
+def page(value=0):
+    return np.full((8, 8, 3), value, np.uint8)
+
+
+def test_annotated_name():
+    assert annotated_name("in/a/scan.1.jpg") == "scan.1_annotated.png"
+    assert annotated_name("scan.jpg", ".jpg") == "scan_annotated.jpg"
+    assert hashed_name("scan_annotated.png", "in/b/scan.jpg").startswith("scan_annotated_")
+    assert hashed_name("x.png", "in/b/scan.jpg") != hashed_name("x.png", "in/a/scan.jpg")
+
+
+def test_directory_sink_keeps_same_stem_inputs_apart(tmp_path):
+    out = tmp_path / "out"
+    with DirectorySink(str(out)) as sink:
+        sink.submit("in/a/scan.jpg", page(10))
+        sink.submit("in/b/scan.jpg", page(200))
+        sink.submit("in/a/scan.jpg", page(20))  # retried input: same name again
+        sink.submit("in/a/none.jpg", None)
+    assert sink.written == 3
+
+    first = sink.output_name("in/a/scan.jpg")
+    second = sink.output_name("in/b/scan.jpg")
+    assert first == "scan_annotated.png"
+    assert second == hashed_name("scan_annotated.png", "in/b/scan.jpg")
+    assert sorted(os.listdir(out)) == sorted([first, second])
+    assert cv2.imread(str(out / first))[0, 0, 0] == 20
+    assert cv2.imread(str(out / second))[0, 0, 0] == 200
+
+
+def test_zip_sink_append_does_not_reuse_archived_names(tmp_path):
+    path = str(tmp_path / "annotated.zip")
+    with open_sink(path) as sink:
+        sink.submit("in/a/scan.jpg", page())
+    with open_sink(path, append=True) as sink:
+        sink.submit("in/b/scan.jpg", page())
+        sink.submit("in/c/other.jpg", page())
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+    assert names == ["scan_annotated.jpg", hashed_name("scan_annotated.jpg", "in/b/scan.jpg"), "other_annotated.jpg"]
+
+
+def test_zip_sink_restarts_a_truncated_archive(tmp_path):
+    path = tmp_path / "annotated.zip"
+    # a killed run: entries written, central directory never
+    with zipfile.ZipFile(str(path), "w") as zf:
+        zf.writestr("old_annotated.jpg", b"x" * 100)
+    truncated = path.read_bytes()[:60]
+    path.write_bytes(truncated)
+    with ZipSink(str(path), mode="a") as sink:
+        sink.submit("a.jpg", page())
+    assert (tmp_path / "annotated.zip.partial").read_bytes() == truncated
+    with zipfile.ZipFile(str(path)) as zf:
+        assert zf.namelist() == ["a_annotated.jpg"]
+
+
+def test_callback_sink_payloads():
+    got = {}
+    with CallbackSink(lambda p, payload: got.__setitem__(p, payload), ext=".png") as sink:
+        sink.submit("a.jpg", page())
+    assert got["a.jpg"].startswith(b"\x89PNG")
+
+    with CallbackSink(lambda p, payload: got.__setitem__(p, payload)) as sink:
+        sink.submit("b.jpg", page(5))
+    assert got["b.jpg"].shape == (8, 8, 3)
+
+
+class BlockingSink(ImageSink):
+    def __init__(self, gate, **kwargs):
+        self.gate = gate
+        super().__init__(**kwargs)
+
+    def write(self, image_path, img):
+        self.gate.wait(5)
+        if image_path == "bad.jpg":
+            raise ValueError("cannot encode")
+
+
+def test_submit_blocks_when_the_queue_is_full():
+    gate = threading.Event()
+    sink = BlockingSink(gate, workers=1, max_queue=2)
+    sink.submit("0.jpg", page())  # taken by the worker
+    sink.submit("1.jpg", page())
+    sink.submit("2.jpg", page())
+    blocked = threading.Thread(target=sink.submit, args=("3.jpg", page()))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    gate.set()
+    blocked.join(5)
+    sink.close()
+    assert sink.written == 4
+
+
+def test_write_errors_surface_on_submit_and_close():
+    gate = threading.Event()
+    gate.set()
+    sink = BlockingSink(gate, workers=1)
+    sink.submit("bad.jpg", page())
+    sink._queue.join()
+    with pytest.raises(ValueError):
+        sink.submit("next.jpg", page())
+    with pytest.raises(ValueError):
+        sink.close()
+
+
+class ListEngine:
+    def __init__(self):
+        self.chunks = []
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        self.chunks.append(list(image_paths))
+        return [page() for _ in image_paths], {p: str({"band": p}) for p in image_paths}
+
+
+class StreamingEngine(ListEngine):
+    def predict_multi_and_extract(self, image_paths, buffers=None, sink=None):
+        self.chunks.append(list(image_paths))
+        for p in image_paths:
+            sink.submit(p, page())
+        return [None] * len(image_paths), {p: str({"band": p}) for p in image_paths}
+
+
+@pytest.mark.parametrize("engine_cls", [ListEngine, StreamingEngine])
+def test_stream_annotated_chunks(tmp_path, engine_cls):
+    engine = engine_cls()
+    paths = [f"in/{i}.jpg" for i in range(5)]
+    with DirectorySink(str(tmp_path)) as sink:
+        extracted = stream_annotated(engine, paths, sink, chunk_size=2)
+    assert engine.chunks == [paths[:2], paths[2:4], paths[4:]]
+    assert set(extracted) == set(paths)
+    assert sink.written == 5
@@ -0,0 +1,89 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from skew import check_orientation, check_orientation_file
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(__file__)), "input", "*.jpg")))
+
+
+def gray(path):
+    return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+
+
+def rotate(img, angle):
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img, m, (w, h), borderValue=255)
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+def test_upright_sample_skips_heavy_stages(path):
+    est = check_orientation(gray(path))
+    assert est.rotation == 0
+    assert abs(est.skew) < 1.0
+    assert not est.needs_orientation
+    assert not est.needs_unwarp
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+@pytest.mark.parametrize("turn", [cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE])
+def test_sideways_sample_needs_orientation(path, turn):
+    est = check_orientation(cv2.rotate(gray(path), turn))
+    assert est.rotation == 90
+    assert est.needs_orientation
+    assert est.needs_unwarp
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+def test_upside_down_sample_is_not_detected(path):
+    # Documented limitation: a projection profile can't tell 180 from 0, the
+    # orientation gate catches these afterwards from the recognition scores.
+    est = check_orientation(cv2.rotate(gray(path), cv2.ROTATE_180))
+    assert est.rotation == 0
+    assert not est.needs_orientation
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+@pytest.mark.parametrize("angle", [-3, 3])
+def test_slight_skew_stays_below_threshold(path, angle):
+    est = check_orientation(rotate(gray(path), angle))
+    assert est.skew == pytest.approx(-angle, abs=0.5)
+    assert not est.needs_orientation
+    assert not est.needs_unwarp
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+@pytest.mark.parametrize("angle", [-10, -8, 8, 10])
+def test_strong_skew_needs_unwarp(path, angle):
+    est = check_orientation(rotate(gray(path), angle))
+    assert est.skew == pytest.approx(-angle, abs=0.5)
+    assert not est.needs_orientation
+    assert est.needs_unwarp
+
+
+@pytest.mark.parametrize("path", SAMPLES)
+def test_bent_page_needs_unwarp(path):
+    # Left and right halves skewed in opposite directions, like a curled page:
+    # the overall skew stays small but the halves disagree.
+    img = gray(path)
+    w = img.shape[1]
+    bent = np.hstack([rotate(img, 3)[:, : w // 2], rotate(img, -3)[:, w // 2:]])
+    est = check_orientation(bent)
+    assert abs(est.skew) < 5.0
+    assert est.warp > 2.0
+    assert est.needs_unwarp
+
+
+def test_blank_page_is_a_no_op():
+    est = check_orientation(np.full((800, 600), 255, np.uint8))
+    assert tuple(est) == (0, 0.0, 0.0, False, False)
+
+
+def test_file_helper(tmp_path):
+    assert check_orientation_file(str(tmp_path / "missing.jpg")) is None
+    est = check_orientation_file(SAMPLES[0])
+    assert not est.needs_unwarp
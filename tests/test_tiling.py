@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from tiling import check_tile_params, make_tiles, merge_tiled_polys
+
+
+def quad(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def test_tiles_cover_page_at_full_size():
+    tiles = make_tiles(2000, 1500, tile_size=960, overlap=128)
+    assert {(x1 - x0, y1 - y0) for x0, y0, x1, y1 in tiles} == {(960, 960)}
+    assert max(x1 for _, _, x1, _ in tiles) == 1500
+    assert max(y1 for _, _, _, y1 in tiles) == 2000
+    assert make_tiles(500, 400, tile_size=960, overlap=128) == [(0, 0, 400, 500)]
+
+
+@pytest.mark.parametrize("tile_size, overlap", [(960, 960), (960, 1200), (960, -1), (0, 0)])
+def test_bad_overlap_raises(tile_size, overlap):
+    with pytest.raises(ValueError):
+        make_tiles(2000, 1500, tile_size, overlap)
+
+
+def test_bad_tile_batch_raises():
+    with pytest.raises(ValueError):
+        check_tile_params(960, 128, tile_batch=0)
+
+
+def aabb(q):
+    q = np.asarray(q)
+    return [int(q[:, 0].min()), int(q[:, 1].min()), int(q[:, 0].max()), int(q[:, 1].max())]
+
+
+TILES = [(0, 0, 100, 100), (60, 0, 160, 100)]  # overlap band x 60..100
+
+
+def test_duplicate_word_next_to_other_word_is_not_chained():
+    polys = [
+        quad(62, 40, 80, 50), quad(80, 40, 95, 50),  # tile 0: word, adjacent word
+        quad(63, 40, 81, 50), quad(81, 40, 96, 50),  # tile 1: the same two words
+    ]
+    merged = merge_tiled_polys(polys, [0, 0, 1, 1], TILES)
+    assert len(merged) == 2
+    for got, want in zip(sorted(aabb(q) for q in merged), [[62, 40, 81, 50], [80, 40, 96, 50]]):
+        assert got == pytest.approx(want, abs=1)
+
+
+def test_line_cut_by_seam_is_joined():
+    polys = [quad(30, 40, 100, 50), quad(60, 40, 140, 50)]
+    merged = merge_tiled_polys(polys, [0, 1], TILES)
+    assert len(merged) == 1
+    assert aabb(merged[0]) == pytest.approx([30, 40, 140, 50], abs=1)
+
+
+def test_boxes_outside_overlap_are_kept():
+    # touching across the band edge, but the left box never enters the overlap
+    polys = [quad(20, 40, 60, 50), quad(60, 40, 90, 50)]
+    assert len(merge_tiled_polys(polys, [0, 1], TILES)) == 2
@@ -0,0 +1,86 @@
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import pytest
+
+import metrics
+import Watchdog as watchdog_module
+from image_buffer import ImageBuffer
+from Watchdog import Watchdog, rss_mb
+
+pytestmark = pytest.mark.skipif("fork" not in mp.get_all_start_methods(), reason="needs fork")
+
+
+class FakeEngine:
+    """Behaviour by file name: slow / hog (only at full size), crash, boom; anything else is quick."""
+
+    def __init__(self, hog_mb=300):
+        self.hog_mb = hog_mb
+        self.last_confidences = {}
+
+    def predict_multi_and_extract(self, image_paths, buffers=None):
+        path, buf = image_paths[0], buffers[0]
+        full = buf.bgr.shape[0] > 40
+        if "slow" in path and full:
+            time.sleep(30)
+        if "hog" in path and full:
+            block = np.ones(self.hog_mb * 2 ** 20 // 8)
+            time.sleep(30)
+            del block
+        if "crash" in path:
+            os._exit(3)
+        if "boom" in path:
+            raise RuntimeError("bad page")
+        self.last_confidences = {path: {"band": 0.9}}
+        return [None], {path: f"{{'side': {buf.bgr.shape[0]}}}"}
+
+
+@pytest.fixture(autouse=True)
+def fake_engine(monkeypatch):
+    monkeypatch.setattr(watchdog_module, "create_engine", lambda name, **kwargs: FakeEngine(**kwargs))
+
+
+def run(watchdog, paths):
+    bufs = [ImageBuffer(p, np.zeros((64, 64, 3), np.uint8)) for p in paths]
+    return watchdog.predict_multi_and_extract(paths, buffers=bufs)[1]
+
+
+def test_timeout_is_reported_and_pool_recovers():
+    with Watchdog("fake", timeout=0.5, tick=0.02, annotate=False) as watchdog:
+        extracted = run(watchdog, ["a.jpg", "slow.jpg", "b.jpg"])
+        assert extracted == {"a.jpg": "{'side': 64}", "slow.jpg": "", "b.jpg": "{'side': 64}"}
+        assert watchdog.last_failures == {"slow.jpg": "timeout after 0.5s"}
+        assert watchdog.last_confidences["a.jpg"] == {"band": 0.9}
+        assert watchdog.stats()[0]["restarts"] == 1
+        # the restarted worker serves the next batch
+        assert run(watchdog, ["c.jpg"]) == {"c.jpg": "{'side': 64}"}
+        assert watchdog.last_failures == {}
+
+
+def test_retry_at_reduced_size():
+    before = metrics.get("watchdog.reduced_retries")
+    with Watchdog("fake", timeout=0.5, retry_max_side=32, tick=0.02, annotate=False) as watchdog:
+        extracted = run(watchdog, ["slow.jpg", "crash.jpg"])
+    # a timed-out page is tried once more at 32 px; a crash is not retried
+    assert extracted["slow.jpg"] == "{'side': 32}"
+    assert watchdog.last_failures == {"crash.jpg": "worker died (exit code 3)"}
+    assert metrics.get("watchdog.reduced_retries") == before + 1
+
+
+@pytest.mark.skipif(rss_mb(os.getpid()) is None, reason="needs /proc")
+def test_memory_limit_kills_worker():
+    with Watchdog("fake", timeout=20, memory_mb=rss_mb(os.getpid()) + 150, tick=0.02, annotate=False) as watchdog:
+        extracted = run(watchdog, ["hog.jpg", "a.jpg"])
+        assert extracted["a.jpg"] == "{'side': 64}"
+        assert watchdog.last_failures["hog.jpg"].startswith("memory ")
+        assert watchdog.stats()[0]["restarts"] == 1
+
+
+def test_engine_error_keeps_worker():
+    with Watchdog("fake", workers=2, timeout=5, tick=0.02, annotate=False) as watchdog:
+        extracted = run(watchdog, ["boom.jpg", "a.jpg", "b.jpg"])
+        assert extracted["boom.jpg"] == "" and extracted["b.jpg"] == "{'side': 64}"
+        assert watchdog.last_failures == {"boom.jpg": "RuntimeError: bad page"}
+        assert all(row["restarts"] == 0 for row in watchdog.stats())
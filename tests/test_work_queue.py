@@ -0,0 +1,115 @@
+import sqlite3
+
+import pytest
+
+import work_queue
+from work_queue import WorkQueue, config_fingerprint
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        p = tmp_path / name
+        p.write_bytes(b"x")
+        paths.append(str(p))
+    return paths
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(work_queue.time, "time", lambda: now[0])
+    return now
+
+
+def test_claim_complete(tmp_path, images, clock):
+    with WorkQueue(str(tmp_path / "q.db")) as wq:
+        assert wq.add(images) == 3
+        assert wq.add(images) == 0
+        claimed = wq.claim(2)
+        assert claimed == images[:2]
+        assert wq.counts() == {"in_flight": 2, "pending": 1}
+        wq.complete({p: "{'band': '7.0'}" for p in claimed}, {images[0]: {"band": 0.9}}, 0.5)
+        assert wq.counts() == {"done": 2, "pending": 1}
+        assert wq.results(images) == {images[0]: "{'band': '7.0'}", images[1]: "{'band': '7.0'}", images[2]: ""}
+        assert list(wq.iter_done())[0] == (images[0], "{'band': '7.0'}", {"band": 0.9}, 0.5)
+
+
+def test_fail_backs_off_then_fails_for_good(tmp_path, images, clock):
+    with WorkQueue(str(tmp_path / "q.db"), max_attempts=3, backoff=2.0) as wq:
+        wq.add(images[:1])
+        for attempt, delay in ((1, 2.0), (2, 4.0)):
+            assert wq.claim(4) == images[:1]
+            wq.fail(images[:1], "boom")
+            assert wq.counts() == {"pending": 1}
+            assert wq.next_due() == pytest.approx(delay)
+            assert wq.claim(4) == []  # not due yet
+            clock[0] += delay
+        assert wq.claim(4) == images[:1]
+        wq.fail(images[:1], "boom")
+        assert wq.counts() == {"failed": 1}
+        assert wq.failures() == {images[0]: "boom"}
+        assert wq.next_due() is None
+
+
+def test_retry_is_claimed_alone(tmp_path, images, clock):
+    with WorkQueue(str(tmp_path / "q.db")) as wq:
+        wq.add(images[:1])
+        wq.claim(1)
+        wq.fail(images[:1], "boom")
+        wq.add(images[1:])
+        clock[0] += 10
+        assert wq.claim(4) == images[1:]  # fresh images first, without the retry
+        assert wq.claim(4) == images[:1]
+
+
+def test_recover_requeues_in_flight(tmp_path, images, clock):
+    path = str(tmp_path / "q.db")
+    with WorkQueue(path, max_attempts=2) as wq:
+        wq.add(images)
+        wq.claim(3)
+    # the process died with everything in flight
+    with WorkQueue(path, max_attempts=2) as wq:
+        assert wq.recover() == 3
+        assert wq.counts() == {"pending": 3}
+        # retries are claimed one at a time
+        assert [len(wq.claim(3)) for _ in range(3)] == [1, 1, 1]
+    with WorkQueue(path, max_attempts=2) as wq:
+        # second interruption uses up the attempts
+        assert wq.recover() == 0
+        assert wq.counts() == {"failed": 3}
+        assert wq.recover(retry_failed=True) == 3
+        assert wq.counts() == {"pending": 3}
+
+
+def test_changed_file_is_requeued(tmp_path, images, clock):
+    with WorkQueue(str(tmp_path / "q.db")) as wq:
+        wq.add(images[:1])
+        wq.complete({p: "old" for p in wq.claim(1)})
+        with open(images[0], "wb") as f:
+            f.write(b"changed")
+        assert wq.add(images[:1]) == 1
+        assert wq.counts() == {"pending": 1}
+
+
+def test_config_mismatch_raises(tmp_path, images):
+    path = str(tmp_path / "q.db")
+    paddle = config_fingerprint(engine="paddle", prefilter=False)
+    with WorkQueue(path, config=paddle) as wq:
+        wq.add(images)
+        wq.complete({p: "paddle" for p in wq.claim(3)})
+    with WorkQueue(path, config=paddle) as wq:
+        assert wq.results(images) == {p: "paddle" for p in images}
+    with pytest.raises(ValueError, match="--restart"):
+        WorkQueue(path, config=config_fingerprint(engine="easyocr", prefilter=False))
+
+
+def test_legacy_queue_adopts_config(tmp_path, images):
+    path = str(tmp_path / "q.db")
+    with WorkQueue(path) as wq:
+        wq.add(images)
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0
+    with WorkQueue(path, config="x") as wq:
+        assert wq.config == "x"
@@ -0,0 +1,143 @@
+"""Tiled text detection for very large scans.
+
+The page is split into overlapping tiles no larger than the detector's
+working resolution, so nothing gets downscaled (small text such as candidate
+IDs survives) and memory is bounded by `tile_batch` tiles at a time. Boxes
+that were detected twice in an overlap, or cut in two by a seam, are merged
+with one vectorized pairwise pass.
+"""
+from typing import List, Sequence, Tuple
+import numpy as np
+from utils import to_quad
+
+Tile = Tuple[int, int, int, int]  # x0, y0, x1, y1
+
+
+def check_tile_params(tile_size: int, overlap: int, tile_batch: int = 1) -> None:
+    """Raise ValueError unless `0 <= overlap < tile_size` and `tile_batch >= 1`.
+
+    With `overlap >= tile_size` the stride is zero (a bare `range` error) or
+    negative (only the last tile, most of the page never detected).
+    """
+    if tile_size < 1:
+        raise ValueError(f"tile_size must be >= 1, got {tile_size}")
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"tile overlap must be in [0, tile_size={tile_size}), got {overlap}")
+    if tile_batch < 1:
+        raise ValueError(f"tile_batch must be >= 1, got {tile_batch}")
+
+
+def make_tiles(h: int, w: int, tile_size: int = 960, overlap: int = 128) -> List[Tile]:
+    """Overlapping tiles covering an `h x w` page; edge tiles are shifted inwards to keep full size."""
+    check_tile_params(tile_size, overlap)
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = tile_size - overlap
+        out = list(range(0, length - tile_size, stride))
+        out.append(length - tile_size)
+        return out
+
+    return [
+        (x, y, min(x + tile_size, w), min(y + tile_size, h))
+        for y in starts(h)
+        for x in starts(w)
+    ]
+
+
+def _aabbs(polys: Sequence[np.ndarray]) -> np.ndarray:
+    pts = np.stack([to_quad(p) for p in polys])  # n x 4 x 2
+    return np.concatenate([pts.min(axis=1), pts.max(axis=1)], axis=1)  # n x [x0, y0, x1, y1]
+
+
+def merge_tiled_polys(
+    polys: Sequence[np.ndarray],
+    tile_ids: Sequence[int],
+    tiles: Sequence[Tile],
+    same_line: float = 0.6,
+    duplicate: float = 0.5,
+) -> List[np.ndarray]:
+    """Merge boxes that come from different tiles and describe the same text.
+
+    Only pairs from two overlapping tiles that both reach into the overlap of
+    those tiles are candidates. They are joined when they share a text line
+    (vertical overlap >= `same_line` of the shorter box) and really overlap:
+    one mostly covers the other (intersection >= `duplicate` of the smaller
+    area: the same text seen twice, or a piece cut at a tile edge), or both
+    span at least `duplicate` of the overlap's width (a long line cut by the
+    seam, seen in part by each tile). Boxes that merely touch are different
+    words and are never joined. Joined groups become the minimum-area quad
+    around all their points.
+    """
+    n = len(polys)
+    if n < 2:
+        return [to_quad(p) for p in polys]
+    b = _aabbs(polys)
+    t = np.asarray(tiles, dtype=np.float32)[np.asarray(tile_ids)]  # tile rect of each box
+    tile_ids = np.asarray(tile_ids)
+
+    ix = np.minimum(b[:, None, 2], b[None, :, 2]) - np.maximum(b[:, None, 0], b[None, :, 0])
+    iy = np.minimum(b[:, None, 3], b[None, :, 3]) - np.maximum(b[:, None, 1], b[None, :, 1])
+    heights = b[:, 3] - b[:, 1]
+    areas = (b[:, 2] - b[:, 0]) * heights
+    min_h = np.maximum(np.minimum(heights[:, None], heights[None, :]), 1e-6)
+    min_area = np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-6)
+
+    # overlap region of the two boxes' tiles (empty for tiles that don't overlap)
+    bx0 = np.maximum(t[:, None, 0], t[None, :, 0])
+    by0 = np.maximum(t[:, None, 1], t[None, :, 1])
+    bx1 = np.minimum(t[:, None, 2], t[None, :, 2])
+    by1 = np.minimum(t[:, None, 3], t[None, :, 3])
+
+    def reaches(k: np.ndarray) -> np.ndarray:
+        """Whether each box reaches into the pair's overlap region; `k` broadcasts as rows or columns."""
+        return ((np.minimum(k[..., 2], bx1) > np.maximum(k[..., 0], bx0))
+                & (np.minimum(k[..., 3], by1) > np.maximum(k[..., 1], by0)))
+
+    in_band = (bx1 > bx0) & (by1 > by0) & reaches(b[:, None, :]) & reaches(b[None, :, :])
+    line = np.clip(iy, 0, None) / min_h >= same_line
+    covered = np.clip(ix, 0, None) * np.clip(iy, 0, None) / min_area >= duplicate
+    spans_seam = ix >= duplicate * np.maximum(bx1 - bx0, 1.0)
+    link = (tile_ids[:, None] != tile_ids[None, :]) & in_band & line & (covered | spans_seam)
+    link = np.triu(link, k=1)
+
+    # connected components with a small union-find over the linked pairs
+    parent = np.arange(n)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(link)):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    merged = []
+    for root in sorted(groups):
+        members = groups[root]
+        if len(members) == 1:
+            merged.append(to_quad(polys[members[0]]))
+        else:
+            merged.append(to_quad(np.concatenate([to_quad(polys[i]) for i in members])))
+    return merged
+
+
+def detect_tiled(det_model, img: np.ndarray, tile_size: int = 960, overlap: int = 128, tile_batch: int = 4) -> List[np.ndarray]:
+    """Run `TextDetection` over overlapping tiles of `img`; returns page-coordinate quads."""
+    h, w = img.shape[:2]
+    tiles = make_tiles(h, w, tile_size, overlap)
+    polys, tile_ids = [], []
+    for start in range(0, len(tiles), tile_batch):
+        chunk = tiles[start:start + tile_batch]
+        crops = [np.ascontiguousarray(img[y0:y1, x0:x1]) for x0, y0, x1, y1 in chunk]
+        for k, ((x0, y0, _, _), det) in enumerate(zip(chunk, det_model.predict(crops, batch_size=len(crops)))):
+            for p in det["dt_polys"]:
+                polys.append(np.asarray(p, dtype=np.float32) + (x0, y0))
+                tile_ids.append(start + k)
+    return merge_tiled_polys(polys, tile_ids, tiles)
@@ -1,8 +1,12 @@
 import numpy as np
 from json import dump
+import ast
 import re
 import cv2
-from typing import List, Any, Tuple
+from typing import List, Any, Tuple, Dict
+
+# Fields extracted from an IELTS Test Report Form, in reading order
+FIELDS = ['date', 'family name', 'first name', 'candidate id', 'date of birth', 'sex (m/f)', 'band', 'date end']
 
 def pre(text: str):
     text = text.strip().lower()
@@ -11,9 +15,20 @@ def pre(text: str):
     return text
 
 def post_process(texts):    
-    key = ['date', 'family name', 'first name', 'candidate id', 'date of birth', 'sex (m/f)', 'band', 'date end']
+    out, _ = post_process_with_scores(texts)
+    return out
+
+
+def post_process_with_scores(texts, scores=None) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Same as `post_process`, also returning the recognition confidence of each value box.
+
+    `scores` is aligned with `texts`; when omitted every confidence is 1.0.
+    """
+    if scores is None:
+        scores = [1.0] * len(texts)
     out = {}
-    for k in key:
+    conf = {}
+    for k in FIELDS:
         for ind in range(len(texts)):
             # print(pre(texts[ind]))
             # print(pre(k))
@@ -22,19 +37,38 @@ def post_process(texts):
             if abs(len(text) - len(key)) >= 10:
                 continue
             if key in text or is_equivalent(key, text):
+                if ind + 1 >= len(texts):
+                    # label is the last box: no value to read
+                    break
                 # print(texts[ind+1])
                 out[k] = str(texts[ind+1])
+                conf[k] = float(scores[ind+1])
                 break
             
     for ind in range(len(texts) - 1, -1, -1):
-        if 'date' in pre(texts[ind]):
+        if 'date' in pre(texts[ind]) and ind + 1 < len(texts):
             out['date end'] = str(texts[ind+1])
+            conf['date end'] = float(scores[ind+1])
             break
-    return out
+    return out, conf
 
 def save_output(out, filename="output.json"):
     with open(filename, "w") as f:
         dump(out, f)
+
+
+def parse_extracted(result_str) -> Dict[str, str]:
+    """Turn the stringified dict stored per image by the engines back into a dict."""
+    if isinstance(result_str, dict):
+        return result_str
+    if not result_str:
+        return {}
+    try:
+        parsed = ast.literal_eval(result_str)
+    except (ValueError, SyntaxError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
 def similarity_ratio(s1: str, s2: str):
     if len(s1) != len(s2):
         return 0.0
@@ -66,6 +100,59 @@ def poly_to_easyocr_box(poly):
     return [x_min, x_max, y_min, y_max]
 
 
+def to_quad(box) -> np.ndarray:
+    """Return a 4x2 float32 quad for a polygon or an `[x_min, x_max, y_min, y_max]` box."""
+    arr = np.array(box, dtype=np.float32)
+    if arr.ndim == 1:
+        x_min, x_max, y_min, y_max = arr[:4]
+        return np.array([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], dtype=np.float32)
+    if len(arr) != 4:
+        # order minAreaRect corners clockwise from top-left like the detectors do
+        rect = cv2.boxPoints(cv2.minAreaRect(arr))
+        start = int(np.argmin(rect.sum(axis=1)))
+        arr = np.roll(rect, -start, axis=0)
+    return arr
+
+
+def crop_quad(img, box, margin: float = 0.0):
+    """Perspective-crop a text line (polygon or xxyy box) into an upright image.
+
+    `margin` pads the quad by that fraction of its height on every side. Vertical
+    crops (height >= 1.5 * width) are rotated like PaddleOCR's rotate-crop step.
+    """
+    pts = to_quad(box)
+    w = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+    h = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+    if w < 1 or h < 1:
+        return None
+    pad = margin * h
+    dst = np.array([[pad, pad], [w + pad, pad], [w + pad, h + pad], [pad, h + pad]], dtype=np.float32)
+    out_w, out_h = int(round(w + 2 * pad)), int(round(h + 2 * pad))
+    M = cv2.getPerspectiveTransform(pts, dst)
+    crop = cv2.warpPerspective(img, M, (out_w, out_h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    if out_h >= 1.5 * out_w:
+        crop = np.rot90(crop)
+    return crop
+
+
+def sort_quads(polys, y_tol: float = 10.0) -> List[int]:
+    """Reading order (top-to-bottom, left-to-right) of detected quads, as indices.
+
+    Same rule as PaddleOCR's pipeline: sort by the first point's (y, x), then
+    swap neighbours that sit on the same line (|dy| < y_tol) but are out of x order.
+    """
+    firsts = [(float(p[0][1]), float(p[0][0])) for p in polys]
+    order = sorted(range(len(polys)), key=lambda i: firsts[i])
+    for i in range(len(order) - 1):
+        for j in range(i, -1, -1):
+            a, b = firsts[order[j]], firsts[order[j + 1]]
+            if abs(b[0] - a[0]) < y_tol and b[1] < a[1]:
+                order[j], order[j + 1] = order[j + 1], order[j]
+            else:
+                break
+    return order
+
+
 def draw_paddle_poly_with_easy_label(img, poly, text, color=(0, 255, 0)):
     """Draw PaddleOCR polygon and put EasyOCR text label on image (in-place).
 
@@ -190,6 +277,16 @@ def group_and_flatten_boxes_texts(boxes: List[List[float]], texts: List[str], th
     return flat_boxes, flat_texts
 
 
+def group_reading_order(polys, threshold: float = 9.0) -> Tuple[List[List[int]], List[int]]:
+    """PaddleEasy reading order: polygons -> EasyOCR xxyy boxes grouped into lines.
+
+    Returns the grouped boxes and, per position, the index of its source polygon,
+    so texts / scores recorded in detection order can follow.
+    """
+    boxes = [poly_to_easyocr_box(p) for p in polys]
+    return group_and_flatten_boxes_texts(boxes, list(range(len(boxes))), threshold=threshold, sort_within_line=True)
+
+
 def flatten_grouped_boxes(grouped: List[List[Any]]) -> List[Any]:
     """Flatten grouped boxes (list of lists) into a single list preserving group order.
 
@@ -0,0 +1,79 @@
+"""Length-prefixed wire protocol shared by the OCR server(s) and their clients.
+
+A message is:
+  4 bytes   big-endian length of the JSON header
+  N bytes   UTF-8 JSON header (includes "payload_len")
+  M bytes   raw payload (concatenated image files / encoded annotations)
+
+Requests:  {"op": "predict", "images": [{"path": str, "size": int}, ...], "annotate": bool}
+             an image may instead be {"path", "size": 0, "shm": name, "shape": [h, w, 3]}
+             (raw BGR in a shared-memory block, same host only); the local daemon
+             also reads "engine" and "engine_kwargs"
+           {"op": "ping"}
+Responses: {"ok": true, "extracted": {path: str}, "confidences": {...},
+            "annotated": [size or null, ...], "worker": pid}
+           {"ok": false, "error": str}
+"""
+import json
+import socket
+import struct
+from typing import Any, Dict, List, Tuple, Union
+
+_LEN = struct.Struct(">I")
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Tuple[int, Address]:
+    """`unix:/path/to.sock` or `host:port` -> (socket family, address)."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def connect(address: str, timeout: float = None) -> socket.socket:
+    family, addr = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(addr)
+    return sock
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("peer closed the connection")
+        got += k
+    return bytes(buf)
+
+
+def send_msg(sock: socket.socket, header: Dict[str, Any], payload: bytes = b"") -> None:
+    header = dict(header, payload_len=len(payload))
+    raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_LEN.pack(len(raw)) + raw)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_msg(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, n).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("payload_len", 0)) if header.get("payload_len") else b""
+    return header, payload
+
+
+def split_payload(payload: bytes, sizes: List[Any]) -> List[bytes]:
+    """Cut a concatenated payload back into parts; None sizes give None parts."""
+    parts, offset = [], 0
+    for size in sizes:
+        if size is None:
+            parts.append(None)
+            continue
+        parts.append(payload[offset:offset + size])
+        offset += size
+    return parts
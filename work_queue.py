@@ -0,0 +1,268 @@
+"""Persistent, file-backed work queue for resumable batch runs.
+
+Every image of a job is one row in a small SQLite file with its state:
+pending -> in_flight -> done | failed (with the error). Results are committed
+per chunk, so a run that dies (OOM, bad image, killed pod) loses at most the
+chunk it was working on; running the same command again picks up where it
+stopped and never re-runs images that are done.
+
+- images left `in_flight` by a dead run go back to `pending` (`recover`)
+- an image is retried with exponential backoff until `max_attempts`, then `failed`
+- retried images are claimed one at a time, so one image that crashes the
+  engine doesn't take its chunk down with it again
+- an image whose file changed (size / mtime) since it was queued is redone
+- the queue remembers the settings it was filled with (`config`, e.g. engine
+  and pre-filter); opening it with different ones raises instead of handing
+  back results computed another way
+
+Usage:
+  python work_queue.py output.json.queue.db            # counts per state
+  python work_queue.py output.json.queue.db --failed   # failed images and their errors
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+PENDING, IN_FLIGHT, DONE, FAILED = "pending", "in_flight", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    image_path TEXT NOT NULL UNIQUE,
+    stamp TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    confidences TEXT,
+    seconds REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, next_attempt);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def file_stamp(path: str) -> str:
+    """Cheap change marker: size and mtime, no read of the contents."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def queue_path_for(output_filepath: str) -> str:
+    return output_filepath + ".queue.db"
+
+
+def config_fingerprint(**settings) -> str:
+    """Canonical string of the settings that shape results (engine, profile, ...)."""
+    return json.dumps(settings, sort_keys=True, default=str)
+
+
+class WorkQueue:
+    """`config`: fingerprint of the run's settings (`config_fingerprint`). Stored on
+    first use; a queue filled under another config raises ValueError, since its
+    done rows would be returned as results of this one."""
+
+    def __init__(self, path: str, max_attempts: int = 3, backoff: float = 2.0, config: Optional[str] = None) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # queue files from before confidences / timing were kept
+        have = {r[1] for r in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("confidences", "TEXT"), ("seconds", "REAL")):
+            if column not in have:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.commit()
+        if config is not None:
+            self._check_config(config)
+
+    def _check_config(self, config: str) -> None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is not None and row[0] != config:
+            self._db.close()
+            raise ValueError(
+                f"{self.path} was filled with other settings ({row[0]}, now {config}); "
+                "its results would not match. Use --restart (restart=True) or another --queue file."
+            )
+        if row is None:
+            # new queue, or one from before configs were kept: adopt the current settings
+            with self._db:
+                self._db.execute("INSERT INTO meta (key, value) VALUES ('config', ?)", (config,))
+
+    @property
+    def config(self) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        return row[0] if row else None
+
+    def add(self, image_paths: Sequence[str]) -> int:
+        """Queue new images (and requeue changed ones); returns how many are new or changed."""
+        now = time.time()
+        stamps = [(p, file_stamp(p)) for p in image_paths]
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT INTO jobs (image_path, stamp, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(image_path) DO UPDATE SET stamp = excluded.stamp, state = 'pending', "
+                "attempts = 0, next_attempt = 0, error = NULL, result = NULL, updated_at = excluded.updated_at "
+                "WHERE jobs.stamp != excluded.stamp",
+                [(p, s, now) for p, s in stamps],
+            )
+            return self._db.total_changes - before
+
+    def recover(self, retry_failed: bool = False) -> int:
+        """Requeue what a dead run left in flight (and, if asked, images that failed for good)."""
+        now = time.time()
+        with self._lock, self._db:
+            requeued = 0
+            if retry_failed:
+                requeued += self._db.execute(
+                    "UPDATE jobs SET state = 'pending', attempts = 0, next_attempt = 0, updated_at = ? WHERE state = 'failed'",
+                    (now,),
+                ).rowcount
+            # an image that keeps dying with the process runs out of attempts like any other failure
+            self._db.execute(
+                "UPDATE jobs SET state = 'failed', error = 'interrupted ' || attempts || ' times', updated_at = ? "
+                "WHERE state = 'in_flight' AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            requeued += self._db.execute(
+                "UPDATE jobs SET state = 'pending', error = 'interrupted', updated_at = ? WHERE state = 'in_flight'",
+                (now,),
+            ).rowcount
+            return requeued
+
+    def claim(self, limit: int) -> List[str]:
+        """Mark up to `limit` due images in flight; a retry is always claimed alone."""
+        now = time.time()
+        with self._lock, self._db:
+            rows = self._db.execute(
+                "SELECT id, attempts FROM jobs WHERE state = 'pending' AND next_attempt <= ? "
+                "ORDER BY attempts, id LIMIT ?",
+                (now, max(1, limit)),
+            ).fetchall()
+            rows = [r for r in rows if r["attempts"] == 0] or rows[:1]
+            ids = [r["id"] for r in rows]
+            if not ids:
+                return []
+            marks = ",".join("?" * len(ids))
+            self._db.execute(
+                f"UPDATE jobs SET state = 'in_flight', attempts = attempts + 1, updated_at = ? WHERE id IN ({marks})",
+                (now, *ids),
+            )
+            return [r[0] for r in self._db.execute(f"SELECT image_path FROM jobs WHERE id IN ({marks}) ORDER BY id", ids)]
+
+    def complete(self, results: Dict[str, str], confidences: Optional[Dict[str, Dict[str, float]]] = None,
+                 seconds: Optional[float] = None) -> None:
+        """Store results (with per-field confidences and per-image seconds) and mark them done, in one transaction."""
+        now = time.time()
+        confidences = confidences or {}
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE jobs SET state = 'done', result = ?, confidences = ?, seconds = ?, error = NULL, updated_at = ? "
+                "WHERE image_path = ?",
+                [(r, json.dumps(confidences[p]) if p in confidences else None, seconds, now, p) for p, r in results.items()],
+            )
+
+    def fail(self, image_paths: Sequence[str], error: str) -> None:
+        """Back off and retry, or mark failed once `max_attempts` is used up."""
+        now = time.time()
+        with self._lock, self._db:
+            rows = self._db.execute(
+                f"SELECT image_path, attempts FROM jobs WHERE image_path IN ({','.join('?' * len(image_paths))})",
+                list(image_paths),
+            ).fetchall()
+            updates = []
+            for r in rows:
+                final = r["attempts"] >= self.max_attempts
+                delay = self.backoff * 2 ** (r["attempts"] - 1)
+                updates.append((FAILED if final else PENDING, now + delay, error, now, r["image_path"]))
+            self._db.executemany(
+                "UPDATE jobs SET state = ?, next_attempt = ?, error = ?, updated_at = ? WHERE image_path = ?",
+                updates,
+            )
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next pending image may run; None when nothing is pending."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM jobs WHERE state = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def results(self, image_paths: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """Path -> stored result for done images ("" for the others), in `image_paths` order."""
+        with self._lock:
+            rows = self._db.execute("SELECT image_path, result FROM jobs WHERE state = 'done'").fetchall()
+        done = {r["image_path"]: r["result"] for r in rows}
+        if image_paths is None:
+            return done
+        return {p: done.get(p, "") for p in image_paths}
+
+    def iter_done(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, Optional[Dict[str, float]], Optional[float]]]:
+        """Stream `(image_path, result, confidences, seconds)` of done images, in queue order."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, image_path, result, confidences, seconds FROM jobs "
+                    "WHERE state = 'done' AND id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield r["image_path"], r["result"], json.loads(r["confidences"]) if r["confidences"] else None, r["seconds"]
+            last_id = rows[-1]["id"]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: n for state, n in rows}
+
+    def failures(self) -> Dict[str, str]:
+        with self._lock:
+            rows = self._db.execute("SELECT image_path, error FROM jobs WHERE state = 'failed' ORDER BY id").fetchall()
+        return {r["image_path"]: r["error"] for r in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Inspect a resumable OCR work queue")
+    p.add_argument("queue", help="Queue file (default name: <output>.queue.db)")
+    p.add_argument("--failed", action="store_true", help="List failed images and their errors")
+    return p
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
+    with WorkQueue(args.queue) as wq:
+        print(wq.config)
+        print(wq.counts())
+        if args.failed:
+            for path, error in wq.failures().items():
+                print(f"{path}\t{error}")